@@ -0,0 +1,544 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+import tracemalloc
+import numpy as np
+
+from graph import graph_from_arrays
+from search_algorithms import bfs_path, dfs_path, iddfs_path, astar_path
+from routing import bidirectional_search, haversine_heuristic, haversine_km
+from landmarks import build_landmarks
+from contraction import build_ch
+
+BENCH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "outputs", "bench")
+# tamanhos padrão (rápido) e completo (10^2 a 10^6 nós)
+QUICK_SIZES = (100, 1_000, 10_000)
+FULL_SIZES = (100, 1_000, 10_000, 100_000, 1_000_000)
+# acima destes tamanhos o algoritmo fica fora de escala (pré-processamento ou busca)
+MAX_NODES = {
+    "bfs": 1_000_000,
+    "dfs": 1_000_000,
+    "astar": 100_000,
+    "astar_bidir": 1_000_000,
+    "dijkstra_bidir": 1_000_000,
+    "alt": 1_000_000,
+    "alt_numpy": 100_000,
+    "ch": 10_000,  # pré-processamento ~100 s em scale-free 10k
+}
+# p90 novo / p90 antigo acima disso conta como regressão no compare
+REGRESSION_RATIO = 1.2
+# módulos de entrada medidos no benchmark de inicialização ("python" = interpretador vazio)
+STARTUP_TARGETS = ("python", "main", "gui", "service")
+
+
+# ---------------- grafos sintéticos ----------------
+def chain_graph(n):
+    """Caminho 0-1-2-...-(n-1): profundidade máxima para a DFS."""
+    u = np.arange(n - 1)
+    ones = np.ones(n - 1)
+    lat = -23.55 + np.arange(n) * 1e-4
+    lon = np.full(n, -46.63)
+    return graph_from_arrays([f"c{i}" for i in range(n)], lat, lon, u, u + 1,
+                             {"dist_km": ones * 0.011, "time_min": ones})
+
+
+def grid_graph(w, h, seed=None):
+    """Grade w x h com ruas a cada ~200 m.
+
+    seed=None: todas as arestas com 1 min; com seed, pesos de rua sorteados
+    (desvio e velocidade), como nos outros geradores.
+    """
+    idx = np.arange(w * h).reshape(h, w)
+    u = np.concatenate([idx[:, :-1].ravel(), idx[:-1, :].ravel()])
+    v = np.concatenate([idx[:, 1:].ravel(), idx[1:, :].ravel()])
+    lat = -23.55 + np.repeat(np.arange(h), w) * 0.0018
+    lon = -46.63 + np.tile(np.arange(w), h) * 0.0018
+    names = [f"g{i}" for i in range(w * h)]
+    if seed is None:
+        ones = np.ones(len(u))
+        return graph_from_arrays(names, lat, lon, u, v, {"dist_km": ones * 0.2, "time_min": ones})
+    return graph_from_arrays(names, lat, lon, u, v, _street_weights(lat, lon, u, v, np.random.default_rng(seed)))
+
+
+def _street_weights(lat, lon, u, v, rng):
+    # distância real = linha reta x desvio; tempo pela velocidade da via (15-60 km/h)
+    km = haversine_km(lat[u], lon[u], lat[v], lon[v])
+    dist = np.maximum(km * rng.uniform(1.0, 1.3, len(u)), 0.01)
+    return {"dist_km": dist, "time_min": dist / rng.uniform(15, 60, len(u)) * 60}
+
+
+def _scatter(n, rng):
+    # pontos numa área quadrada com ~300 m entre vizinhos, centrada em SP
+    side_km = np.sqrt(n) * 0.3
+    lat = -23.55 + rng.random(n) * side_km / 111.32
+    lon = -46.63 + rng.random(n) * side_km / (111.32 * np.cos(np.radians(23.55)))
+    return lat, lon
+
+
+def random_geometric_graph(n, k=4, seed=0):
+    """Grafo geométrico aleatório: cada ponto liga aos k vizinhos mais próximos."""
+    from sklearn.neighbors import KDTree
+
+    rng = np.random.default_rng(seed)
+    lat, lon = _scatter(n, rng)
+    xy = np.column_stack([lat * 111.32, lon * 111.32 * np.cos(np.radians(23.55))])
+    _, nb = KDTree(xy).query(xy, k=min(k + 1, n))
+    u = np.repeat(np.arange(n), nb.shape[1] - 1)
+    v = nb[:, 1:].ravel()
+    return graph_from_arrays([f"r{i}" for i in range(n)], lat, lon, u, v, _street_weights(lat, lon, u, v, rng))
+
+
+def scale_free_graph(n, m=2, seed=0):
+    """Ligação preferencial (Barabási-Albert) com geometria de rede viária.
+
+    Cada nó novo liga a m nós escolhidos com probabilidade proporcional ao
+    grau e nasce perto do primeiro deles: poucos "eixos" muito conectados,
+    arestas curtas e custos coerentes com a distância (heurísticas valem).
+    """
+    rng = np.random.default_rng(seed)
+    m = max(1, min(m, n - 1))
+    lat = np.empty(n)
+    lon = np.empty(n)
+    lat[:m + 1], lon[:m + 1] = _scatter(m + 1, rng)
+    # núcleo inicial completo
+    core = [(i, j) for i in range(m + 1) for j in range(i + 1, m + 1)]
+    u = np.empty(len(core) + (n - m - 1) * m, dtype=np.int64)
+    v = np.empty_like(u)
+    u[:len(core)], v[:len(core)] = zip(*core) if core else ((), ())
+    # "urna" de extremidades: sortear dela = sortear proporcional ao grau
+    urn = np.empty(2 * len(u), dtype=np.int64)
+    urn[:2 * len(core)] = np.ravel(core)
+    size = 2 * len(core)
+    e = len(core)
+    picks = rng.random((n, m))
+    step = 0.3 / 111.32
+    jitter = rng.normal(0.0, step, (n, 2))
+    for i in range(m + 1, n):
+        chosen = set()
+        for r in picks[i]:
+            chosen.add(int(urn[int(r * size)]))
+        for j in chosen:
+            u[e], v[e] = i, j
+            urn[size], urn[size + 1] = i, j
+            size += 2
+            e += 1
+        first = next(iter(chosen))
+        lat[i] = lat[first] + jitter[i, 0]
+        lon[i] = lon[first] + jitter[i, 1]
+    u, v = u[:e], v[:e]
+    return graph_from_arrays([f"s{i}" for i in range(n)], lat, lon, u, v, _street_weights(lat, lon, u, v, rng))
+
+
+def make_graph(family, n, seed=0):
+    if family == "grid":
+        side = max(2, int(round(np.sqrt(n))))
+        return grid_graph(side, side, seed=seed)
+    if family == "rgg":
+        return random_geometric_graph(n, seed=seed)
+    if family == "scalefree":
+        return scale_free_graph(n, seed=seed)
+    raise ValueError(f"família de grafo desconhecida: {family}")
+
+
+FAMILIES = ("grid", "rgg", "scalefree")
+
+
+# ---------------- DFS recursiva x iterativa ----------------
+def dfs_path_recursive(G, start, goal):
+    """Versão recursiva original do dfs_path (referência do benchmark)."""
+    visited = set()
+    parent = {start: None}
+    expanded = 0
+    found = False
+
+    def rec(u):
+        nonlocal expanded, found
+        visited.add(u)
+        expanded += 1
+        if u == goal:
+            found = True
+            return
+        for v in G.neighbors(u):
+            if v not in visited and not found:
+                parent[v] = u
+                rec(v)
+
+    rec(start)
+
+    if not found:
+        return None, expanded
+
+    path = []
+    cur = goal
+    while cur is not None:
+        path.append(cur)
+        cur = parent[cur]
+    return list(reversed(path)), expanded
+
+
+def _time(fn, *args, repeats=3):
+    best = None
+    out = None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        try:
+            out = fn(*args)
+        except RecursionError:
+            return "RecursionError", None
+        dt = (time.perf_counter() - t0) * 1000
+        best = dt if best is None else min(best, dt)
+    return out, best
+
+
+def bench_dfs(sizes=(500, 5_000, 50_000), grid_sides=(30, 100, 300)):
+    """Compara dfs_path (pilha) com a DFS recursiva e a IDDFS."""
+    cases = []
+    for n in sizes:
+        cases.append((f"cadeia n={n}", chain_graph(n), "c0", f"c{n - 1}"))
+    for s in grid_sides:
+        cases.append((f"grade {s}x{s}", grid_graph(s, s), "g0", f"g{s * s - 1}"))
+
+    rows = []
+    for label, G, a, b in cases:
+        row = {"caso": label}
+        for name, fn in (("recursiva", dfs_path_recursive), ("pilha", dfs_path), ("iddfs", iddfs_path)):
+            if name == "iddfs" and G.number_of_nodes() > 1_000:
+                row[name] = "-"  # O(profundidade x n): fora de escala
+                continue
+            out, ms = _time(fn, G, a, b)
+            row[name] = out if ms is None else f"{ms:.1f} ms ({out[1]} exp.)"
+        rows.append(row)
+    return rows
+
+
+# ---------------- suíte de algoritmos ----------------
+def _names(fn):
+    # algoritmos que recebem nomes de nós (interface networkx)
+    def run(g, pre, s, t):
+        return fn(g, g.names[s], g.names[t])[1]
+    return run
+
+
+def _bidir(heuristic):
+    def run(g, pre, s, t):
+        return bidirectional_search(g, s, t, "time_min", heuristic(g, pre))[1]
+    return run
+
+
+def _ch_query(g, ch, s, t):
+    return ch.query(s, t)[1]
+
+
+class NumpyLandmarkBounds:
+    """Heurística ALT antiga: ufuncs NumPy no vetor de k landmarks a cada chamada.
+
+    Fica só como referência na suíte ("alt_numpy" x "alt"): o custo fixo das
+    ufuncs em arrays de 8 posições anulava a economia de nós expandidos.
+    """
+
+    def __init__(self, lm):
+        self.table = lm.table
+
+    def to(self, t):
+        table = self.table
+        dt = table[t]
+        memo = {}
+
+        def h(v):
+            r = memo.get(v)
+            if r is None:
+                with np.errstate(invalid="ignore"):
+                    diff = np.abs(dt - table[v])
+                r = float(np.nanmax(diff)) if not np.isnan(diff).all() else 0.0
+                memo[v] = r
+            return r
+
+        return h
+
+    def bounds(self, s, t):
+        return self.to(t), self.to(s)
+
+
+# nome -> (pré-processamento(g) | None, consulta(g, pré, s, t) -> nós expandidos)
+ENGINES = {
+    "bfs": (None, _names(bfs_path)),
+    "dfs": (None, _names(dfs_path)),
+    "astar": (None, _names(astar_path)),
+    "astar_bidir": (lambda g: haversine_heuristic(g, "time_min"), _bidir(lambda g, pre: pre)),
+    "dijkstra_bidir": (None, _bidir(lambda g, pre: None)),
+    "alt": (lambda g: build_landmarks(g, weight="time_min"), _bidir(lambda g, pre: pre)),
+    "alt_numpy": (lambda g: NumpyLandmarkBounds(build_landmarks(g, weight="time_min")), _bidir(lambda g, pre: pre)),
+    "ch": (lambda g: build_ch(g, "time_min"), _ch_query),
+}
+
+
+def _component_labels(g):
+    """Componente conexa de cada nó: BFS por fronteira direto no CSR (vetorizado por nível)."""
+    indptr = np.asarray(g.indptr, dtype=np.int64)
+    indices = np.asarray(g.indices, dtype=np.int64)
+    deg = np.diff(indptr)
+    labels = np.full(len(g.names), -1, dtype=np.int64)
+    comp = 0
+    for root in range(len(labels)):
+        if labels[root] >= 0:
+            continue
+        labels[root] = comp
+        frontier = np.array([root])
+        while len(frontier):
+            counts = deg[frontier]
+            # posições dos arcos de todos os nós da fronteira, concatenadas
+            arcs = np.repeat(indptr[frontier] - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+            nxt = np.unique(indices[arcs])
+            frontier = nxt[labels[nxt] < 0]
+            labels[frontier] = comp
+        comp += 1
+    return labels
+
+
+def query_pairs(g, n_queries, seed=0):
+    """Pares (origem, destino) sorteados dentro da maior componente conexa."""
+    labels = _component_labels(g)
+    giant = np.flatnonzero(labels == np.bincount(labels).argmax())
+    rng = np.random.default_rng(seed)
+    pairs = rng.choice(giant, size=(n_queries, 2))
+    return [(int(a), int(b)) for a, b in pairs]
+
+
+def _percentiles(ns):
+    ms = np.asarray(ns, dtype=np.float64) / 1e6
+    p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+    return {"p50_ms": p50, "p90_ms": p90, "p99_ms": p99, "media_ms": float(ms.mean()), "min_ms": float(ms.min())}
+
+
+def bench_engine(g, name, pairs, warmup=1, repeats=3):
+    """Mede um algoritmo num grafo: pré-processamento, latência por consulta,
+    nós expandidos e pico de memória (tracemalloc, numa passada separada para
+    não distorcer os tempos)."""
+    prep, query = ENGINES[name]
+    t0 = time.perf_counter_ns()
+    pre = prep(g) if prep else None
+    prep_ns = time.perf_counter_ns() - t0
+
+    for _ in range(warmup):
+        for s, t in pairs:
+            query(g, pre, s, t)
+
+    lat_ns = []
+    expanded = []
+    for r in range(repeats):
+        for s, t in pairs:
+            t0 = time.perf_counter_ns()
+            ex = query(g, pre, s, t)
+            lat_ns.append(time.perf_counter_ns() - t0)
+            if r == 0:
+                expanded.append(ex)
+
+    tracemalloc.start()
+    peak = 0
+    try:
+        for s, t in pairs:
+            tracemalloc.reset_peak()
+            query(g, pre, s, t)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "algoritmo": name,
+        "preprocess_ms": prep_ns / 1e6,
+        "consultas": len(pairs),
+        "repeticoes": repeats,
+        **_percentiles(lat_ns),
+        "expandidos_media": float(np.mean(expanded)),
+        "expandidos_max": int(np.max(expanded)),
+        "pico_memoria_kb": peak / 1024,
+    }
+
+
+def run_suite(families=FAMILIES, sizes=QUICK_SIZES, algorithms=tuple(ENGINES), n_queries=20,
+              warmup=1, repeats=3, seed=0, log=print):
+    """Roda todos os algoritmos em todos os grafos; devolve dict pronto para JSON."""
+    results = []
+    for family in families:
+        for n in sizes:
+            t0 = time.perf_counter_ns()
+            g = make_graph(family, n, seed)
+            build_ms = (time.perf_counter_ns() - t0) / 1e6
+            pairs = query_pairs(g, n_queries, seed)
+            graph_info = {"familia": family, "n": len(g.names), "arestas": g.number_of_edges(),
+                          "construcao_ms": build_ms}
+            for name in algorithms:
+                if len(g.names) > MAX_NODES.get(name, np.inf):
+                    continue
+                row = {**graph_info, **bench_engine(g, name, pairs, warmup, repeats)}
+                results.append(row)
+                if log:
+                    log(f"{family:<9} n={row['n']:>8} {name:<15} p50={row['p50_ms']:9.3f} ms "
+                        f"p99={row['p99_ms']:9.3f} ms exp={row['expandidos_media']:>10.0f} "
+                        f"mem={row['pico_memoria_kb']:9.1f} KB prep={row['preprocess_ms']:9.1f} ms")
+    return {"meta": _meta(seed, n_queries, warmup, repeats), "resultados": results}
+
+
+# ---------------- inicialização (custo de import) ----------------
+def _import_breakdown(stderr):
+    """{pacote de topo: ms} somando o tempo próprio de cada módulo (python -X importtime)."""
+    out = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        own, _, name = line[len("import time:"):].split("|")
+        try:
+            own_us = int(own)
+        except ValueError:
+            continue  # cabeçalho
+        top = name.strip().split(".")[0]
+        out[top] = out.get(top, 0.0) + own_us / 1000
+    return out
+
+
+def bench_startup(targets=STARTUP_TARGETS, repeats=5, top=8, log=print):
+    """Tempo de um `import <módulo>` num interpretador novo (como no cron).
+
+    Cada alvo roda `repeats` vezes em subprocesso (latência p50/p90 do
+    processo inteiro) e uma vez com -X importtime para quebrar o custo por
+    pacote (os `top` mais caros).
+    """
+    src = os.path.dirname(os.path.abspath(__file__))
+    rows = []
+    for target in targets:
+        code = "pass" if target == "python" else f"import {target}"
+        cmd = [sys.executable, "-c", code]
+        lat_ns = []
+        for _ in range(repeats):
+            t0 = time.perf_counter_ns()
+            p = subprocess.run(cmd, cwd=src, capture_output=True, text=True)
+            lat_ns.append(time.perf_counter_ns() - t0)
+            if p.returncode:
+                raise RuntimeError(f"falha ao importar {target}: {p.stderr.strip()[-500:]}")
+        p = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=src, capture_output=True, text=True)
+        packages = _import_breakdown(p.stderr)
+        heavy = dict(sorted(packages.items(), key=lambda kv: -kv[1])[:top])
+        row = {"alvo": target, "repeticoes": repeats, **_percentiles(lat_ns),
+               "import_ms": sum(packages.values()), "pacotes_ms": heavy}
+        rows.append(row)
+        if log:
+            pk = ", ".join(f"{k} {v:.0f}" for k, v in heavy.items())
+            log(f"{target:<8} p50={row['p50_ms']:8.1f} ms p90={row['p90_ms']:8.1f} ms "
+                f"import={row['import_ms']:8.1f} ms | {pk}")
+    return {"meta": _meta(None, 0, 0, repeats), "inicializacao": rows}
+
+
+def _meta(seed, n_queries, warmup, repeats):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "plataforma": platform.platform(),
+        "seed": seed, "consultas": n_queries, "aquecimento": warmup, "repeticoes": repeats,
+    }
+
+
+def save_results(data, out=None):
+    if out is None:
+        os.makedirs(BENCH_DIR, exist_ok=True)
+        stamp = time.strftime("%Y%m%d_%H%M%S")
+        kind = "startup" if "inicializacao" in data else "bench"
+        out = os.path.join(BENCH_DIR, f"{kind}_{stamp}_{data['meta']['commit'] or 'sem-git'}.json")
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    return out
+
+
+def compare(old_path, new_path, ratio=REGRESSION_RATIO):
+    """Compara dois JSON da suíte (mesmo grafo/algoritmo) ou da inicialização
+    (mesmo alvo); devolve linhas e regressões."""
+    with open(old_path, encoding="utf-8") as f:
+        old_data = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new_data = json.load(f)
+    old = {(r["familia"], r["n"], r["algoritmo"]): r for r in old_data.get("resultados", [])}
+    new = new_data.get("resultados", [])
+    rows, regressions = [], []
+    old_start = {r["alvo"]: r for r in old_data.get("inicializacao", [])}
+    for r in new_data.get("inicializacao", []):
+        o = old_start.get(r["alvo"])
+        if o is None:
+            continue
+        row = {
+            "caso": f"inicialização {r['alvo']}",
+            "p90_antes": o["p90_ms"], "p90_depois": r["p90_ms"],
+            "razao": r["p90_ms"] / o["p90_ms"] if o["p90_ms"] else np.inf,
+        }
+        rows.append(row)
+        # o interpretador vazio é só referência (ruído da máquina), não conta como regressão
+        if row["razao"] > ratio and r["alvo"] != "python":
+            regressions.append(row)
+    for r in new:
+        key = (r["familia"], r["n"], r["algoritmo"])
+        if key not in old:
+            continue
+        o = old[key]
+        row = {
+            "caso": f"{key[0]} n={key[1]} {key[2]}",
+            "p90_antes": o["p90_ms"], "p90_depois": r["p90_ms"],
+            "razao": r["p90_ms"] / o["p90_ms"] if o["p90_ms"] else np.inf,
+            "expandidos_antes": o["expandidos_media"], "expandidos_depois": r["expandidos_media"],
+        }
+        rows.append(row)
+        if row["razao"] > ratio:
+            regressions.append(row)
+    return rows, regressions
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmarks de roteamento")
+    sub = ap.add_subparsers(dest="cmd")
+    sub.add_parser("dfs", help="DFS recursiva x pilha x IDDFS")
+    sp = sub.add_parser("suite", help="todos os algoritmos em grafos sintéticos")
+    sp.add_argument("--families", nargs="+", default=list(FAMILIES), choices=FAMILIES)
+    sp.add_argument("--sizes", nargs="+", type=int, default=None)
+    sp.add_argument("--full", action="store_true", help="tamanhos de 10^2 a 10^6 nós")
+    sp.add_argument("--algorithms", nargs="+", default=list(ENGINES), choices=list(ENGINES))
+    sp.add_argument("--queries", type=int, default=20)
+    sp.add_argument("--warmup", type=int, default=1)
+    sp.add_argument("--repeats", type=int, default=3)
+    sp.add_argument("--seed", type=int, default=0)
+    sp.add_argument("--out", default=None, help="arquivo JSON (padrão: outputs/bench/)")
+    st = sub.add_parser("startup", help="custo de import de main/gui/service num interpretador novo")
+    st.add_argument("--targets", nargs="+", default=list(STARTUP_TARGETS))
+    st.add_argument("--repeats", type=int, default=5)
+    st.add_argument("--out", default=None, help="arquivo JSON (padrão: outputs/bench/)")
+    cp = sub.add_parser("compare", help="compara dois resultados da suíte ou da inicialização")
+    cp.add_argument("old")
+    cp.add_argument("new")
+    cp.add_argument("--ratio", type=float, default=REGRESSION_RATIO)
+    args = ap.parse_args(sys.argv[1:] or ["dfs"])
+
+    if args.cmd == "dfs":
+        print(f"limite de recursão do Python: {sys.getrecursionlimit()}")
+        for r in bench_dfs():
+            print(f"{r['caso']:<18} | recursiva: {r['recursiva']:<24} | pilha: {r['pilha']:<24} | iddfs: {r['iddfs']}")
+    elif args.cmd == "suite":
+        sizes = args.sizes or (FULL_SIZES if args.full else QUICK_SIZES)
+        data = run_suite(args.families, sizes, args.algorithms, args.queries, args.warmup, args.repeats, args.seed)
+        print(f"resultados em {save_results(data, args.out)}")
+    elif args.cmd == "startup":
+        data = bench_startup(args.targets, args.repeats)
+        print(f"resultados em {save_results(data, args.out)}")
+    elif args.cmd == "compare":
+        rows, regressions = compare(args.old, args.new, args.ratio)
+        for r in rows:
+            flag = "  <-- regressão" if r in regressions else ""
+            print(f"{r['caso']:<36} p90 {r['p90_antes']:9.3f} -> {r['p90_depois']:9.3f} ms "
+                  f"(x{r['razao']:.2f}){flag}")
+        sys.exit(1 if regressions else 0)
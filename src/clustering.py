@@ -1,8 +1,21 @@
+import os
+import numpy as np
 import pandas as pd
-from sklearn.cluster import KMeans
 
-def kmeans_clusters(deliveries_csv: str, k: int, out_csv: str):
-    df = pd.read_csv(deliveries_csv)
+# scikit-learn (~1 s de import) só é carregado quando algum clustering roda
+
+def _read_deliveries(deliveries):
+    # aceita o caminho do CSV ou um DataFrame já carregado; do DataFrame, cópia
+    # rasa: a coluna "cluster" nova não vaza para o original e as demais
+    # colunas não são duplicadas (pedidos de um dia inteiro)
+    if isinstance(deliveries, pd.DataFrame):
+        return deliveries.copy(deep=False)
+    return pd.read_csv(deliveries)
+
+def kmeans_clusters(deliveries_csv, k: int, out_csv: str):
+    from sklearn.cluster import KMeans
+
+    df = _read_deliveries(deliveries_csv)
     X = df[["lat", "lon"]].to_numpy()
 
     km = KMeans(n_clusters=k, random_state=42, n_init="auto")
@@ -10,3 +23,240 @@ def kmeans_clusters(deliveries_csv: str, k: int, out_csv: str):
 
     df.to_csv(out_csv, index=False)
     return df
+
+def capacitated_assign(cost, capacity):
+    """Atribui cada linha de cost (n x k) a uma coluna respeitando capacity[k].
+
+    Guloso por arrependimento, em rodadas vetorizadas: cada pedido livre
+    escolhe o cluster aberto mais barato; cada cluster aceita, até a vaga que
+    sobra, quem mais perderia indo para a segunda opção. No máximo k rodadas.
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    n, k = cost.shape
+    remaining = np.broadcast_to(np.asarray(capacity, dtype=np.int64), (k,)).copy()
+    if remaining.sum() < n:
+        raise ValueError(f"Capacidade total ({remaining.sum()}) menor que o número de pedidos ({n}).")
+
+    assigned = np.full(n, -1, dtype=np.int64)
+    free = np.arange(n)
+    while len(free):
+        C = cost[free].copy()
+        C[:, remaining <= 0] = np.inf
+        best = np.argmin(C, axis=1)
+        best_cost = C[np.arange(len(free)), best]
+        if k > 1:
+            second = np.partition(C, 1, axis=1)[:, 1]
+            regret = np.where(np.isinf(second), np.inf, second - best_cost)
+        else:
+            regret = np.zeros(len(free))
+
+        # agrupa por cluster escolhido, maior arrependimento primeiro
+        order = np.lexsort((-regret, best))
+        b_sorted = best[order]
+        starts = np.searchsorted(b_sorted, np.arange(k))
+        rank = np.arange(len(order)) - starts[b_sorted]
+        ok = rank < remaining[b_sorted]
+
+        take = free[order[ok]]
+        assigned[take] = b_sorted[ok]
+        remaining -= np.bincount(b_sorted[ok], minlength=k)
+        free = free[order[~ok]]
+        free.sort()
+    return assigned
+
+def _planar_km(lat, lon, lat0=None):
+    # projeção equiretangular local: distâncias em km, boas para uma cidade
+    lat0 = np.radians(np.nanmean(lat) if lat0 is None else lat0)
+    return np.column_stack([lat * 111.32, lon * 111.32 * np.cos(lat0)])
+
+def balanced_clusters(deliveries_csv, k: int, out_csv: str, capacity=None, graph=None,
+                      weight="time_min", max_iter=20, random_state=42, workers=None):
+    """K-Means com capacidade por entregador.
+
+    - capacity: pedidos por entregador (int ou lista); None = ceil(n / k), ou seja,
+      clusters equilibrados;
+    - graph: CompactGraph opcional; se vier, o custo é o tempo de rede (weight)
+      entre o centro do cluster (um nó da rede) e o nó do pedido, em vez da
+      distância em linha reta;
+    - workers: processos da matriz de tempos (matrix.distance_matrix; 1 = serial).
+
+    deliveries_csv pode ser o caminho do CSV ou um DataFrame; out_csv=None
+    não grava arquivo. Sem pedidos, devolve o DataFrame vazio com a coluna
+    "cluster".
+    """
+    if k < 1:
+        raise ValueError(f"Número de entregadores inválido: k={k} (mínimo 1).")
+    df = _read_deliveries(deliveries_csv)
+    n = len(df)
+    if n == 0:
+        df["cluster"] = np.empty(0, dtype=np.int64)
+        if out_csv:
+            df.to_csv(out_csv, index=False)
+        return df
+
+    from sklearn.cluster import KMeans
+
+    k = min(k, n)
+    if capacity is None:
+        capacity = -(-n // k)
+
+    X = _planar_km(df["lat"].to_numpy(dtype=np.float64), df["lon"].to_numpy(dtype=np.float64))
+    init = KMeans(n_clusters=k, random_state=random_state, n_init="auto").fit(X).cluster_centers_
+
+    if graph is None:
+        labels = _capacitated_kmeans(X, init, capacity, max_iter)
+    else:
+        labels = _capacitated_kmedoids(df, X, init, capacity, graph, weight, max_iter, workers)
+
+    df["cluster"] = labels
+    if out_csv:
+        df.to_csv(out_csv, index=False)
+    return df
+
+def _capacitated_kmeans(X, centers, capacity, max_iter):
+    labels = None
+    for _ in range(max_iter):
+        cost = ((X[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        new = capacitated_assign(cost, capacity)
+        if labels is not None and np.array_equal(new, labels):
+            break
+        labels = new
+        sums = np.zeros_like(centers)
+        np.add.at(sums, labels, X)
+        counts = np.bincount(labels, minlength=len(centers))[:, None]
+        centers = np.where(counts > 0, sums / np.maximum(counts, 1), centers)
+    return labels
+
+def _capacitated_kmedoids(df, X, centers, capacity, graph, weight, max_iter, workers=None):
+    from matrix import distance_matrix
+
+    # tempos de rede entre os nós distintos dos pedidos (matriz em cache)
+    uniq, node_pos = np.unique(df["node"].to_numpy(dtype=str), return_inverse=True)
+    M = distance_matrix(graph, uniq.tolist(), uniq.tolist(), weight, workers=workers)
+    M = np.where(np.isinf(M), np.nanmax(M[np.isfinite(M)], initial=0.0) * 10 + 1, M)
+
+    # centros iniciais: o nó de pedido mais perto de cada centro do K-Means
+    Xu = np.zeros((len(uniq), 2))
+    Xu[node_pos] = X
+    d0 = ((Xu[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+    medoids = np.argmin(d0, axis=0)
+
+    labels = None
+    for _ in range(max_iter):
+        cost = M[medoids][:, node_pos].T
+        new = capacitated_assign(cost, capacity)
+        if labels is not None and np.array_equal(new, labels):
+            break
+        labels = new
+        # novo centro: nó do cluster com menor soma de tempos até os pedidos dele
+        for c in range(len(medoids)):
+            members = node_pos[labels == c]
+            if len(members):
+                cand = np.unique(members)
+                medoids[c] = cand[np.argmin(M[np.ix_(cand, members)].sum(axis=1))]
+    return labels
+
+class StreamingClusterer:
+    """Clustering incremental para pedidos que chegam continuamente.
+
+    Cada lote novo é atribuído aos centros atuais e depois atualiza os centros
+    com MiniBatchKMeans.partial_fit (custo O(lote)). Quando algum centro se
+    desloca mais que drift_km desde o último ajuste completo, refaz o K-Means
+    só sobre a janela de pedidos recentes, partindo dos centros atuais (os
+    números dos clusters se mantêm). As atribuições são anexadas a out_csv.
+    """
+
+    def __init__(self, k, out_csv=None, drift_km=0.5, window=5000, batch_size=256, random_state=42):
+        self.k = k
+        self.out_csv = out_csv
+        self.drift_km = drift_km
+        self.window = window
+        self.batch_size = batch_size
+        self.random_state = random_state
+        self.model = self._new_model()
+        self.lat0 = None
+        self.fitted = False
+        self.ref_centers = None
+        self.refits = 0
+        self.n_seen = 0
+        self._recent = np.empty((0, 2))
+        self._pending = []
+
+    def add_orders(self, orders: pd.DataFrame) -> pd.DataFrame:
+        """Atribui um lote de pedidos (colunas lat/lon) e devolve com "cluster".
+
+        Enquanto não há k pedidos para o primeiro ajuste, os pedidos ficam
+        guardados e voltam sem cluster (-1). O lote que completa o primeiro
+        ajuste devolve todos os pedidos guardados até ali (os anteriores
+        também), já com cluster.
+        """
+        df = orders.copy()
+        if self.lat0 is None and len(df):
+            self.lat0 = float(df["lat"].mean())
+        X = _planar_km(df["lat"].to_numpy(), df["lon"].to_numpy(), self.lat0)
+        self.n_seen += len(df)
+        self._remember(X)
+
+        if not self.fitted:
+            self._pending.append(df)
+            buffered = pd.concat(self._pending, ignore_index=True)
+            if len(buffered) < self.k:
+                df["cluster"] = -1
+                return df
+            # primeiro ajuste: todos os pedidos guardados de uma vez
+            Xb = _planar_km(buffered["lat"].to_numpy(), buffered["lon"].to_numpy(), self.lat0)
+            self.model.partial_fit(Xb)
+            self.ref_centers = self.model.cluster_centers_.copy()
+            self.fitted = True
+            self._pending = []
+            buffered["cluster"] = self.model.predict(Xb)
+            self._append(buffered)
+            return buffered
+
+        df["cluster"] = self.model.predict(X)
+        self.model.partial_fit(X)
+        if self.drift() > self.drift_km:
+            self.refit()
+        self._append(df)
+        return df
+
+    def drift(self):
+        """Maior deslocamento (km) de um centro desde o último ajuste completo."""
+        if not self.fitted:
+            return 0.0
+        return float(np.linalg.norm(self.model.cluster_centers_ - self.ref_centers, axis=1).max())
+
+    def _new_model(self, init="k-means++"):
+        from sklearn.cluster import MiniBatchKMeans
+
+        return MiniBatchKMeans(n_clusters=self.k, init=init, batch_size=self.batch_size,
+                               random_state=self.random_state, n_init=1)
+
+    def refit(self):
+        """K-Means completo só sobre a janela recente, a partir dos centros atuais.
+
+        O modelo incremental recomeça desses centros (init) com um partial_fit
+        na janela: as contagens por centro passam a ser as da janela, em vez
+        de centros novos com as contagens do modelo antigo.
+        """
+        from sklearn.cluster import KMeans
+
+        km = KMeans(n_clusters=self.k, init=self.model.cluster_centers_, n_init=1,
+                    random_state=self.random_state).fit(self._recent)
+        self.model = self._new_model(init=km.cluster_centers_)
+        self.model.partial_fit(self._recent)
+        self.ref_centers = self.model.cluster_centers_.copy()
+        self.refits += 1
+
+    @property
+    def centers_latlon(self):
+        c = self.model.cluster_centers_
+        return np.column_stack([c[:, 0] / 111.32, c[:, 1] / (111.32 * np.cos(np.radians(self.lat0)))])
+
+    def _remember(self, X):
+        self._recent = np.vstack([self._recent, X])[-self.window:]
+
+    def _append(self, df):
+        if not self.out_csv:
+            return
+        df.to_csv(self.out_csv, mode="a", header=not os.path.exists(self.out_csv), index=False)
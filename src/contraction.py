@@ -0,0 +1,317 @@
+import os
+import json
+import math
+import time
+import heapq
+import weakref
+import numpy as np
+
+from graph import CompactGraph
+
+# limite de nós assentados por busca de testemunha (troca qualidade por tempo)
+WITNESS_SETTLE_LIMIT = 60
+
+_CH = weakref.WeakKeyDictionary()
+
+
+class ContractionHierarchy:
+    """Grafo "para cima" da Contraction Hierarchy, em CSR.
+
+    Para cada nó v, a linha de v guarda as arestas para nós de rank maior
+    (originais + atalhos). up_mid[e] é o nó contraído que o atalho pula
+    (-1 para aresta original), usado para desempacotar o caminho.
+    """
+
+    def __init__(self, names, rank, up_indptr, up_indices, up_weight, up_mid,
+                 weight="time_min", source_hash=None, preprocess_s=0.0, version=0):
+        self.names = list(names)
+        self.index = {n: i for i, n in enumerate(self.names)}
+        self.rank = rank
+        self.up_indptr = up_indptr
+        self.up_indices = up_indices
+        self.up_weight = up_weight
+        self.up_mid = up_mid
+        self.weight = weight
+        self.source_hash = source_hash
+        self.preprocess_s = preprocess_s
+        # versão do grafo usada no pré-processamento
+        self.version = version
+
+    @property
+    def n_shortcuts(self):
+        return int(np.count_nonzero(self.up_mid >= 0))
+
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.rank, self.up_indptr, self.up_indices, self.up_weight, self.up_mid))
+
+    def stats(self):
+        return {
+            "nos": len(self.names),
+            "arestas_up": int(len(self.up_indices)),
+            "atalhos": self.n_shortcuts,
+            "preprocess_ms": self.preprocess_s * 1000,
+            "memoria_kb": self.nbytes() / 1024,
+        }
+
+    # ---------------- consulta ----------------
+    def query(self, s: int, t: int):
+        """Dijkstra bidirecional só subindo no rank.
+
+        Retorna (caminho em índices | None, nós expandidos, custo | None).
+        """
+        if s == t:
+            return [s], 1, 0.0
+
+        indptr, indices, wts = self.up_indptr, self.up_indices, self.up_weight
+        inf = math.inf
+        dist = ({s: 0.0}, {t: 0.0})
+        parent = ({s: -1}, {t: -1})
+        heaps = ([(0.0, s)], [(0.0, t)])
+        done = [False, False]
+        mu = inf
+        meet = -1
+        expanded = 0
+        side = 0
+
+        while not (done[0] and done[1]):
+            if done[side]:
+                side = 1 - side
+            heap = heaps[side]
+            if not heap or heap[0][0] >= mu:
+                done[side] = True
+                side = 1 - side
+                continue
+            du, u = heapq.heappop(heap)
+            d = dist[side]
+            if du > d[u]:
+                continue
+            expanded += 1
+            dv = dist[1 - side].get(u)
+            if dv is not None and du + dv < mu:
+                mu = du + dv
+                meet = u
+            par = parent[side]
+            a, b = indptr[u], indptr[u + 1]
+            for v, w in zip(indices[a:b].tolist(), wts[a:b].tolist()):
+                nd = du + w
+                if nd < d.get(v, inf):
+                    d[v] = nd
+                    par[v] = u
+                    heapq.heappush(heap, (nd, v))
+            side = 1 - side
+
+        if meet < 0:
+            return None, expanded, None
+
+        up = []
+        cur = meet
+        while cur != -1:
+            up.append(cur)
+            cur = parent[0][cur]
+        up.reverse()
+        cur = parent[1][meet]
+        while cur != -1:
+            up.append(cur)
+            cur = parent[1][cur]
+        return self.unpack(up), expanded, mu
+
+    def _mid(self, x, y):
+        lo, hi = (x, y) if self.rank[x] < self.rank[y] else (y, x)
+        a, b = self.up_indptr[lo], self.up_indptr[lo + 1]
+        row = self.up_indices[a:b]
+        hit = np.flatnonzero(row == hi)
+        # atalhos paralelos não existem: cada par tem uma aresta "para cima"
+        return int(self.up_mid[a + hit[0]])
+
+    def unpack(self, up_path):
+        """Troca cada atalho pelos nós originais que ele representa."""
+        out = [up_path[0]]
+        for x, y in zip(up_path[:-1], up_path[1:]):
+            stack = [(x, y)]
+            while stack:
+                a, b = stack.pop()
+                m = self._mid(a, b)
+                if m < 0:
+                    out.append(b)
+                else:
+                    stack.append((m, b))
+                    stack.append((a, m))
+        return out
+
+
+def build_ch(g: CompactGraph, weight="time_min", settle_limit=WITNESS_SETTLE_LIMIT) -> ContractionHierarchy:
+    """Pré-processamento: ordem por diferença de arestas (com atualização
+    preguiçosa), busca de testemunha limitada e inserção de atalhos."""
+    t0 = time.perf_counter()
+    n = len(g.names)
+    w = np.asarray(g.weights[weight], dtype=np.float64)
+
+    # adjacência mutável: adj[u][v] = (peso, nó do meio | -1)
+    adj = [dict() for _ in range(n)]
+    src = g.sources().tolist()
+    for u, v, c in zip(src, np.asarray(g.indices).tolist(), w.tolist()):
+        if u != v and (v not in adj[u] or c < adj[u][v][0]):
+            adj[u][v] = (c, -1)
+
+    deleted = [0] * n
+    heap = [(_priority(adj, v, deleted, settle_limit), v) for v in range(n)]
+    heapq.heapify(heap)
+    rank = np.empty(n, dtype=np.int64)
+    contracted = [False] * n
+    up_rows = [None] * n
+    order = 0
+
+    while heap:
+        _, v = heapq.heappop(heap)
+        if contracted[v]:
+            continue
+        # atualização preguiçosa: se a prioridade piorou, volta pra fila
+        pr = _priority(adj, v, deleted, settle_limit)
+        if heap and pr > heap[0][0]:
+            heapq.heappush(heap, (pr, v))
+            continue
+
+        for a, b, c in _shortcuts(adj, v, settle_limit):
+            if b not in adj[a] or c < adj[a][b][0]:
+                adj[a][b] = (c, v)
+                adj[b][a] = (c, v)
+
+        up_rows[v] = list(adj[v].items())
+        for u in adj[v]:
+            del adj[u][v]
+            deleted[u] += 1
+        adj[v] = {}
+        contracted[v] = True
+        rank[v] = order
+        order += 1
+
+    counts = np.array([len(r) for r in up_rows], dtype=np.int64)
+    up_indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(counts, out=up_indptr[1:])
+    flat = [e for r in up_rows for e in r]
+    up_indices = np.array([u for u, _ in flat], dtype=np.int64)
+    up_weight = np.array([c for _, (c, _) in flat], dtype=np.float64)
+    up_mid = np.array([m for _, (_, m) in flat], dtype=np.int64)
+
+    return ContractionHierarchy(
+        g.names, rank, up_indptr, up_indices, up_weight, up_mid,
+        weight=weight, source_hash=g.source_hash, preprocess_s=time.perf_counter() - t0,
+        version=g.version,
+    )
+
+
+def _witness(adj, src, skip, targets, limit, settle_limit):
+    """Dijkstra limitado a partir de src sem passar por skip; para cedo quando
+    todos os alvos já foram assentados."""
+    dist = {src: 0.0}
+    heap = [(0.0, src)]
+    settled = 0
+    pending = set(targets)
+    while heap:
+        d, u = heapq.heappop(heap)
+        if d > dist[u]:
+            continue
+        if d > limit or settled >= settle_limit:
+            break
+        settled += 1
+        pending.discard(u)
+        if not pending:
+            break
+        for v, (c, _) in adj[u].items():
+            if v == skip:
+                continue
+            nd = d + c
+            if nd < dist.get(v, math.inf):
+                dist[v] = nd
+                heapq.heappush(heap, (nd, v))
+    return dist
+
+
+def _shortcuts(adj, v, settle_limit):
+    """Atalhos necessários ao contrair v: par (a, b) sem testemunha <= a-v-b."""
+    nbrs = list(adj[v].items())
+    out = []
+    for i, (a, (ca, _)) in enumerate(nbrs[:-1]):
+        rest = nbrs[i + 1:]
+        limit = ca + max(c for _, (c, _) in rest)
+        dist = _witness(adj, a, v, [b for b, _ in rest], limit, settle_limit)
+        for b, (cb, _) in rest:
+            if dist.get(b, math.inf) > ca + cb:
+                out.append((a, b, ca + cb))
+    return out
+
+
+def _priority(adj, v, deleted, settle_limit):
+    # diferença de arestas + vizinhos já contraídos (espalha a contração)
+    return len(_shortcuts(adj, v, settle_limit)) - len(adj[v]) + deleted[v]
+
+
+# ---------------- persistência / cache ----------------
+def ch_file(g: CompactGraph, weight="time_min"):
+    return os.path.join(g.snapshot_dir, f"ch_{weight}.npz") if g.snapshot_dir else None
+
+
+def save_ch(ch: ContractionHierarchy, path: str):
+    meta = {"weight": ch.weight, "source_hash": ch.source_hash, "preprocess_s": ch.preprocess_s}
+    tmp = f"{path}.tmp{os.getpid()}.npz"
+    np.savez(
+        tmp, rank=ch.rank, up_indptr=ch.up_indptr, up_indices=ch.up_indices,
+        up_weight=ch.up_weight, up_mid=ch.up_mid, meta=np.array(json.dumps(meta)),
+    )
+    os.replace(tmp, path)
+
+
+def load_ch(path: str, names) -> ContractionHierarchy:
+    with np.load(path) as z:
+        meta = json.loads(str(z["meta"]))
+        return ContractionHierarchy(
+            names, z["rank"], z["up_indptr"], z["up_indices"], z["up_weight"], z["up_mid"],
+            weight=meta["weight"], source_hash=meta["source_hash"], preprocess_s=meta["preprocess_s"],
+        )
+
+
+def has_ch(g: CompactGraph, weight="time_min") -> bool:
+    """True se get_ch não precisa pré-processar (CH em memória ou salva com o grafo)."""
+    ch = _CH.get(g, {}).get(weight)
+    if ch is not None and g.is_current(ch.version, weight):
+        return True
+    path = ch_file(g, weight)
+    return bool(path) and os.path.exists(path) and g.is_current(0, weight)
+
+
+def get_ch(g: CompactGraph, weight="time_min") -> ContractionHierarchy:
+    """CH do grafo: memória -> arquivo ao lado do snapshot -> pré-processa.
+
+    Os atalhos guardam custos exatos, então qualquer mudança no peso desde o
+    pré-processamento invalida a CH; a nova só vai para o arquivo se o grafo
+    ainda tiver os pesos dos CSVs.
+    """
+    per_graph = _CH.setdefault(g, {})
+    ch = per_graph.get(weight)
+    if ch is not None and g.is_current(ch.version, weight):
+        return ch
+    ch = None
+    path = ch_file(g, weight)
+    if path and os.path.exists(path) and g.is_current(0, weight):
+        try:
+            ch = load_ch(path, g.names)
+            if ch.source_hash != g.source_hash or len(ch.rank) != len(g.names):
+                ch = None
+        except (OSError, ValueError, KeyError):
+            ch = None
+    if ch is None:
+        ch = build_ch(g, weight)
+        if path and g.is_current(0, weight):
+            save_ch(ch, path)
+    per_graph[weight] = ch
+    return ch
+
+
+def ch_path(G, start, goal, weight="time_min", ch=None):
+    """Consulta na Contraction Hierarchy: (caminho, nós expandidos, custo)."""
+    if ch is None or not G.is_current(ch.version, weight):
+        ch = get_ch(G, weight)
+    path, expanded, cost = ch.query(ch.index[start], ch.index[goal])
+    if path is None:
+        return None, expanded, None
+    return [ch.names[i] for i in path], expanded, cost
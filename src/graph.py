@@ -1,25 +1,479 @@
+import os
+import json
+import shutil
+import uuid
+import hashlib
+import threading
+from collections import deque
+import numpy as np
 import pandas as pd
-import networkx as nx
 
-def build_graph(nodes_csv: str, edges_csv: str) -> nx.Graph:
-    nodes = pd.read_csv(nodes_csv)
-    edges = pd.read_csv(edges_csv)
+WEIGHT_COLUMNS = ("dist_km", "time_min")
+SNAPSHOT_FORMAT = 1
+# quantos lotes de atualização de pesos ficam no histórico do grafo
+UPDATE_LOG_SIZE = 4096
 
-    G = nx.Graph()
 
-    for _, r in nodes.iterrows():
-        G.add_node(
-            r["node"],
-            lat=float(r["lat"]),
-            lon=float(r["lon"]),
-            pos=(float(r["lon"]), float(r["lat"]))
-        )
+class CompactGraph:
+    """Grafo não-direcionado em formato CSR (arrays NumPy).
+
+    - names / index: mapeamento nome do nó <-> índice inteiro
+    - lat / lon: coordenadas por índice
+    - indptr / indices: adjacência CSR (cada aresta aparece nos dois sentidos)
+    - weights: {"dist_km": array, "time_min": array}, alinhados com `indices`
+    - edge_ids: id da aresta não-direcionada de cada arco (ordem de inserção)
+
+    Expõe `neighbors`, `nodes[...]` e `edges[u, v]` como o nx.Graph, então as
+    funções de `search_algorithms` e `metrics` rodam direto nele.
+    """
+
+    def __init__(self, names, lat, lon, indptr, indices, weights, edge_ids):
+        self.names = list(names)
+        self.index = {n: i for i, n in enumerate(self.names)}
+        self.lat = lat
+        self.lon = lon
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = dict(weights)
+        self.edge_ids = edge_ids
+        # preenchidos por load_graph / load_snapshot
+        self.source_hash = None
+        self.snapshot_dir = None
+        # incrementada a cada mudança de pesos (invalida caches derivados)
+        self.version = 0
+        # identidade dos pesos nos caches (ver cache_token): sem CSV de origem,
+        # vale a instância; cada lote de atualização entra no digest
+        self._instance_id = uuid.uuid4().hex
+        self._weights_digest = ""
+        self._updates = deque(maxlen=UPDATE_LOG_SIZE)
+        self._listeners = []
+        self._arc_keys = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # vai para processos worker só com os dados (sem lock/ouvintes)
+        state = self.__dict__.copy()
+        state.update(_updates=deque(maxlen=UPDATE_LOG_SIZE), _listeners=[], _arc_keys=None, _lock=None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def cache_token(self):
+        """Identidade do conteúdo dos pesos, para caches compartilhados entre instâncias.
+
+        (hash dos CSVs, digest encadeado das atualizações): cargas dos mesmos
+        arquivos com as mesmas atualizações, na mesma ordem, dividem entradas
+        (um run novo reaproveita as rotas do anterior); pesos divergentes nunca.
+        """
+        return (self.source_hash or self._instance_id, self._weights_digest)
+
+    # ---------------- interface estilo networkx ----------------
+    @property
+    def nodes(self):
+        return _NodeView(self)
+
+    @property
+    def edges(self):
+        return _EdgeView(self)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, n):
+        return n in self.index
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def number_of_nodes(self):
+        return len(self.names)
+
+    def number_of_edges(self):
+        return int(self.edge_ids.max()) + 1 if len(self.edge_ids) else 0
+
+    def sources(self):
+        """Nó de origem de cada arco (expande o indptr)."""
+        return np.repeat(np.arange(len(self.names)), np.diff(self.indptr))
+
+    def neighbors(self, n):
+        i = self.index[n]
+        names = self.names
+        return iter([names[j] for j in self.indices[self.indptr[i]:self.indptr[i + 1]]])
+
+    def degree(self, n):
+        i = self.index[n]
+        return int(self.indptr[i + 1] - self.indptr[i])
+
+    # ---------------- interface por índice ----------------
+    def row(self, i):
+        """Fatia CSR do nó i: (vizinhos, posições das arestas)."""
+        a, b = self.indptr[i], self.indptr[i + 1]
+        return self.indices[a:b], range(a, b)
+
+    def edge_pos(self, i, j):
+        """Posição da aresta i->j nos arrays CSR (ou -1)."""
+        a = self.indptr[i]
+        hit = np.flatnonzero(self.indices[a:self.indptr[i + 1]] == j)
+        return int(a + hit[0]) if len(hit) else -1
+
+    def arc_positions(self, u, v):
+        """Posições CSR dos arcos u->v (arrays de índices); -1 onde não existe."""
+        n = len(self.names)
+        if self._arc_keys is None:
+            keys = self.sources().astype(np.int64) * n + np.asarray(self.indices, dtype=np.int64)
+            order = np.argsort(keys, kind="stable")
+            self._arc_keys = (keys[order], order)
+        keys, order = self._arc_keys
+        q = np.asarray(u, dtype=np.int64) * n + np.asarray(v, dtype=np.int64)
+        i = np.minimum(np.searchsorted(keys, q), len(keys) - 1)
+        return np.where(keys[i] == q, order[i], -1) if len(keys) else np.full(len(q), -1)
 
-    for _, e in edges.iterrows():
-        G.add_edge(
-            e["u"], e["v"],
-            dist_km=float(e["dist_km"]),
-            time_min=float(e["time_min"])
+    # ---------------- atualização de pesos ao vivo ----------------
+    def subscribe(self, callback):
+        """callback(grafo, update) é chamado depois de cada lote de atualização."""
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def update_edge_weights(self, u, v, values, weight="time_min"):
+        """Troca o peso das arestas (u[i], v[i]) por values[i], no lugar.
+
+        u e v podem ser nomes ou índices. Os dois sentidos de cada aresta são
+        atualizados, a versão do grafo sobe e os ouvintes recebem um dict
+        {"version", "weight", "edges", "increased_only", "previous_token",
+        "token"} para invalidarem só o que depende das arestas alteradas.
+        """
+        ui = self._as_index(u)
+        vi = self._as_index(v)
+        values = np.asarray(values, dtype=np.float64)
+        fwd = self.arc_positions(ui, vi)
+        if (fwd < 0).any():
+            bad = np.flatnonzero(fwd < 0)[:5]
+            raise KeyError(f"arestas inexistentes: {[(self.names[ui[i]], self.names[vi[i]]) for i in bad]}")
+        rev = self.arc_positions(vi, ui)
+
+        with self._lock:
+            w = self.weights[weight]
+            if not w.flags.writeable:
+                # snapshot mapeado é somente leitura: copia na primeira escrita
+                w = np.array(w)
+                self.weights[weight] = w
+            old = w[fwd].astype(np.float64)
+            changed = old != values
+            w[fwd] = values
+            w[rev] = values
+            update = self._record_update(weight, self.edge_ids[fwd[changed]],
+                                         bool((values[changed] >= old[changed]).all()),
+                                         fwd.tobytes() + values.tobytes())
+
+        self._notify(update)
+        return update
+
+    def set_weights(self, weight, values):
+        """Troca (ou cria) o peso `weight` inteiro; values alinhado com os arcos.
+
+        Mesmo caminho do update_edge_weights (lock, versão, ouvintes): quem
+        leu o array antigo continua com ele inteiro, e os caches do peso
+        são invalidados só nas arestas que mudaram.
+        """
+        with self._lock:
+            old = self.weights.get(weight)
+            dtype = np.float64 if old is None else old.dtype
+            values = np.array(values, dtype=dtype)
+            if values.shape != self.indices.shape:
+                raise ValueError(f"peso {weight}: esperados {len(self.indices)} arcos, recebidos {values.shape}")
+            if old is None:
+                changed = np.ones(len(values), dtype=bool)
+                increased_only = False
+            else:
+                old = np.asarray(old)
+                changed = old != values
+                increased_only = bool((values[changed] >= old[changed]).all())
+            self.weights[weight] = values
+            update = self._record_update(weight, self.edge_ids[changed], increased_only, b"*" + values.tobytes())
+
+        self._notify(update)
+        return update
+
+    def _record_update(self, weight, edges, increased_only, payload):
+        # chamado com o lock: sobe a versão, encadeia o digest e guarda o lote no histórico
+        previous = self.cache_token
+        self.version += 1
+        self._weights_digest = hashlib.sha1(
+            f"{self._weights_digest}|{weight}|".encode() + payload).hexdigest()[:20]
+        update = {
+            "version": self.version,
+            "weight": weight,
+            "edges": np.unique(edges),
+            "increased_only": increased_only,
+            "previous_token": previous,
+            "token": self.cache_token,
+        }
+        self._updates.append(update)
+        return update
+
+    def _notify(self, update):
+        for cb in list(self._listeners):
+            cb(self, update)
+
+    def changed_since(self, version, weight):
+        """O que mudou em `weight` depois de `version`: (mudou?, só aumentos?, ids das arestas).
+
+        Se o histórico já descartou essa versão, responde de forma conservadora.
+        """
+        if version == self.version:
+            return False, True, np.empty(0, dtype=np.int64)
+        ups = [u for u in self._updates if u["version"] > version]
+        if len(ups) < self.version - version:
+            return True, False, None  # histórico incompleto
+        ups = [u for u in ups if u["weight"] == weight and len(u["edges"])]
+        if not ups:
+            return False, True, np.empty(0, dtype=np.int64)
+        edges = np.unique(np.concatenate([u["edges"] for u in ups]))
+        return True, all(u["increased_only"] for u in ups), edges
+
+    def is_current(self, version, weight, bounds_only=False):
+        """Algo calculado na versão `version` ainda vale para `weight`?
+
+        Limites inferiores (heurísticas, landmarks) continuam admissíveis se
+        os pesos só aumentaram; resultados exatos exigem que nada tenha mudado.
+        """
+        changed, increased_only, _ = self.changed_since(version, weight)
+        return not changed or (bounds_only and increased_only)
+
+    def path_edge_ids(self, path):
+        """Ids das arestas de um caminho dado por nomes."""
+        idx = [self.index[n] for n in path]
+        return self.edge_ids[self.arc_positions(idx[:-1], idx[1:])]
+
+    def _as_index(self, nodes):
+        arr = np.asarray(nodes)
+        if arr.dtype.kind in "iu":
+            return arr.astype(np.int64)
+        return np.array([self.index[n] for n in arr.tolist()], dtype=np.int64)
+
+    def to_networkx(self) -> "nx.Graph":
+        import networkx as nx
+
+        G = nx.Graph()
+        G.add_nodes_from(
+            (n, {"lat": float(la), "lon": float(lo), "pos": (float(lo), float(la))})
+            if not (np.isnan(la) or np.isnan(lo)) else (n, {})
+            for n, la, lo in zip(self.names, self.lat, self.lon)
+        )
+        # um arco por aresta, na ordem de inserção original (mantém a ordem dos vizinhos)
+        src = self.sources()
+        keep = np.flatnonzero(src <= self.indices)
+        keep = keep[np.argsort(self.edge_ids[keep], kind="stable")]
+        cols = {k: np.asarray(w)[keep].tolist() for k, w in self.weights.items()}
+        names = self.names
+        G.add_edges_from(
+            (names[u], names[v], {k: cols[k][t] for k in cols})
+            for t, (u, v) in enumerate(zip(src[keep].tolist(), np.asarray(self.indices)[keep].tolist()))
         )
+        return G
+
+
+class _NodeView:
+    def __init__(self, g):
+        self._g = g
+
+    def __getitem__(self, n):
+        i = self._g.index[n]
+        la, lo = float(self._g.lat[i]), float(self._g.lon[i])
+        return {"lat": la, "lon": lo, "pos": (lo, la)}
+
+    def __iter__(self):
+        return iter(self._g.names)
+
+    def __len__(self):
+        return len(self._g.names)
+
+    def __contains__(self, n):
+        return n in self._g.index
+
+
+class _EdgeView:
+    def __init__(self, g):
+        self._g = g
+
+    def __getitem__(self, uv):
+        u, v = uv
+        g = self._g
+        k = g.edge_pos(g.index[u], g.index[v])
+        if k < 0:
+            raise KeyError(f"aresta inexistente: {u!r} -> {v!r}")
+        return {name: float(w[k]) for name, w in g.weights.items()}
+
+    def __len__(self):
+        return self._g.number_of_edges()
+
+
+def load_compact_graph(nodes_csv: str, edges_csv: str, weight_dtype=np.float64) -> CompactGraph:
+    """Lê os CSVs em bloco e monta o grafo em CSR, sem iterrows()."""
+    nodes = pd.read_csv(nodes_csv, dtype={"node": str, "lat": np.float64, "lon": np.float64})
+    edges = pd.read_csv(
+        edges_csv,
+        dtype={"u": str, "v": str, "dist_km": weight_dtype, "time_min": weight_dtype},
+    )
+
+    # nós repetidos: mantém a primeira posição com os últimos valores (como o nx)
+    nodes = nodes.groupby("node", sort=False)[["lat", "lon"]].last()
+
+    # nós citados só em edges.csv entram no fim, na ordem em que aparecem
+    uv = np.empty(2 * len(edges), dtype=object)
+    uv[0::2] = edges["u"].to_numpy()
+    uv[1::2] = edges["v"].to_numpy()
+    extra = pd.Index(pd.unique(uv)).difference(nodes.index, sort=False)
+    names = nodes.index.append(extra)
+
+    n = len(names)
+    lat = np.full(n, np.nan)
+    lon = np.full(n, np.nan)
+    lat[:len(nodes)] = nodes["lat"].to_numpy()
+    lon[:len(nodes)] = nodes["lon"].to_numpy()
+
+    u = names.get_indexer(edges["u"]).astype(np.int64)
+    v = names.get_indexer(edges["v"]).astype(np.int64)
+    w = {k: edges[k].to_numpy(dtype=weight_dtype) for k in WEIGHT_COLUMNS}
+
+    indptr, indices, weights, edge_ids = _build_csr(n, u, v, w)
+    return CompactGraph(names.tolist(), lat, lon, indptr, indices, weights, edge_ids)
+
+
+def graph_from_arrays(names, lat, lon, u, v, weights) -> CompactGraph:
+    """Monta o CompactGraph direto de arrays de arestas (índices u, v)."""
+    n = len(names)
+    u = np.asarray(u, dtype=np.int64)
+    v = np.asarray(v, dtype=np.int64)
+    w = {k: np.asarray(col) for k, col in weights.items()}
+    indptr, indices, wts, edge_ids = _build_csr(n, u, v, w)
+    return CompactGraph(names, np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64),
+                        indptr, indices, wts, edge_ids)
+
+
+def _build_csr(n, u, v, w):
+    """Monta o CSR simétrico preservando a ordem de inserção das arestas.
+
+    Aresta repetida fica na posição da primeira ocorrência com os pesos da
+    última (mesmo comportamento do nx.Graph.add_edge).
+    """
+    a, b = np.minimum(u, v), np.maximum(u, v)
+    key = a * n + b
+    _, first = np.unique(key, return_index=True)
+    _, last_rev = np.unique(key[::-1], return_index=True)
+    last = len(key) - 1 - last_rev
+    order = np.argsort(first, kind="stable")
+    first, last = first[order], last[order]
+
+    eu, ev = u[first], v[first]
+    ew = {k: col[last] for k, col in w.items()}
+
+    # cada aresta vira dois arcos intercalados (u->v, v->u); laço só uma vez
+    src = np.empty(2 * len(eu), dtype=np.int64)
+    dst = np.empty(2 * len(eu), dtype=np.int64)
+    src[0::2], src[1::2] = eu, ev
+    dst[0::2], dst[1::2] = ev, eu
+    keep = np.ones(len(src), dtype=bool)
+    keep[1::2] = eu != ev
+    src, dst = src[keep], dst[keep]
+
+    perm = np.argsort(src, kind="stable")
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+    indices = dst[perm].astype(np.int32 if n < 2**31 else np.int64)
+    weights = {k: np.repeat(col, 2)[keep][perm] for k, col in ew.items()}
+    edge_ids = np.repeat(np.arange(len(eu), dtype=indices.dtype), 2)[keep][perm]
+    return indptr, indices, weights, edge_ids
+
+
+def build_graph(nodes_csv: str, edges_csv: str) -> "nx.Graph":
+    return load_compact_graph(nodes_csv, edges_csv).to_networkx()
+
+
+# ---------------- snapshot binário (mmap) ----------------
+def source_hash(*paths) -> str:
+    """SHA-256 do conteúdo dos CSVs de origem."""
+    h = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def save_snapshot(g: CompactGraph, snap_dir: str, src_hash: str):
+    """Grava o grafo como arrays .npy crus + meta.json (troca atômica do diretório)."""
+    parent = os.path.dirname(os.path.abspath(snap_dir))
+    os.makedirs(parent, exist_ok=True)
+    tmp = f"{snap_dir}.tmp{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    arrays = {"lat": g.lat, "lon": g.lon, "indptr": g.indptr, "indices": g.indices, "edge_ids": g.edge_ids}
+    arrays.update({f"w_{k}": w for k, w in g.weights.items()})
+    for name, arr in arrays.items():
+        np.save(os.path.join(tmp, f"{name}.npy"), np.ascontiguousarray(arr))
+
+    meta = {
+        "format": SNAPSHOT_FORMAT,
+        "source_hash": src_hash,
+        "weights": list(g.weights),
+        "names": g.names,
+    }
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    old = f"{snap_dir}.old{os.getpid()}"
+    if os.path.exists(snap_dir):
+        os.replace(snap_dir, old)
+    os.replace(tmp, snap_dir)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def read_snapshot_meta(snap_dir: str):
+    try:
+        with open(os.path.join(snap_dir, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get("format") == SNAPSHOT_FORMAT else None
+
+
+def load_snapshot(snap_dir: str, mmap: bool = True) -> CompactGraph:
+    """Abre um snapshot; com mmap=True os arrays são mapeados (somente leitura)
+    e processos diferentes compartilham as mesmas páginas."""
+    meta = read_snapshot_meta(snap_dir)
+    if meta is None:
+        raise ValueError(f"Snapshot inválido ou de outro formato: {snap_dir}")
+
+    mode = "r" if mmap else None
+
+    def arr(name):
+        return np.load(os.path.join(snap_dir, f"{name}.npy"), mmap_mode=mode)
+
+    g = CompactGraph(
+        meta["names"], arr("lat"), arr("lon"), arr("indptr"), arr("indices"),
+        {k: arr(f"w_{k}") for k in meta["weights"]}, arr("edge_ids"),
+    )
+    g.source_hash = meta["source_hash"]
+    g.snapshot_dir = os.path.abspath(snap_dir)
+    return g
+
+
+def load_graph(nodes_csv: str, edges_csv: str, cache_dir: str = None) -> CompactGraph:
+    """Carrega o grafo pelo snapshot em cache_dir; se os CSVs mudaram (hash
+    diferente) ou não há snapshot, relê os CSVs e regrava o snapshot."""
+    src_hash = source_hash(nodes_csv, edges_csv)
+    if cache_dir is None:
+        g = load_compact_graph(nodes_csv, edges_csv)
+        g.source_hash = src_hash
+        return g
 
-    return G
+    meta = read_snapshot_meta(cache_dir)
+    if meta is None or meta.get("source_hash") != src_hash:
+        save_snapshot(load_compact_graph(nodes_csv, edges_csv), cache_dir, src_hash)
+    return load_snapshot(cache_dir)
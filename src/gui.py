@@ -3,21 +3,23 @@ import os
 import sys
 import subprocess
 import time
+import queue
 import threading
 import pandas as pd
 import tkinter as tk
 from tkinter import ttk, messagebox
 
-from PIL import Image, ImageTk  # Pillow
-
-from graph import build_graph
-from search_algorithms import bfs_path, dfs_path, astar_path
-from clustering import kmeans_clusters
-from metrics import path_cost
-from visualization import draw_graph, draw_clusters, draw_route
+from route_cache import ROUTE_CACHE
+from pipeline import Cancelled, route_pipeline, report_body
+from visualization import Renderer
+from instrumentation import RunMetrics
+from orders import read_orders
 
 PICO_MIN_PEDIDOS = 8
 K_ENTREGADORES = 2
+CAPACIDADE_ENTREGADOR = None  # pedidos por entregador; None = clusters equilibrados
+UI_POLL_MS = 50  # intervalo em que a interface aplica os eventos da thread do run
+PREVIEW_SIZE = (310, 210)
 
 # Pasta raiz do projeto (independe de onde você roda)
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
@@ -25,6 +27,9 @@ BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 def p(*parts):
     return os.path.join(BASE_DIR, *parts)
 
+GRAPH_CACHE = p("data", ".cache", "graph")
+PERFIS_CSV = p("data", "edge_profiles.csv")  # tempos por horário; sem o arquivo, usa só time_min
+
 def open_path(path: str):
     """Abre arquivo ou pasta no Windows/macOS/Linux."""
     path = os.path.abspath(path)
@@ -38,9 +43,21 @@ def open_path(path: str):
     except Exception as e:
         messagebox.showerror("Erro", f"Não consegui abrir:\n{e}")
 
-def safe_read_csv(path: str):
+def make_thumbnail(img_path: str, max_size=PREVIEW_SIZE):
+    """Decodifica e reduz o PNG (Pillow); roda fora da thread da interface."""
+    if not img_path or not os.path.exists(img_path):
+        return None
+
+    from PIL import Image  # Pillow, só quando há preview
+
+    with Image.open(img_path) as img:
+        img.thumbnail(max_size, Image.Resampling.LANCZOS)
+        img.load()
+        return img.copy()
+
+def safe_read_orders(path: str, graph, log=None):
     try:
-        return pd.read_csv(path)
+        return read_orders(path, graph, log=log)
     except pd.errors.EmptyDataError:
         raise ValueError(
             "O arquivo data/deliveries.csv está sem colunas (vazio ou só com linhas em branco).\n"
@@ -65,8 +82,25 @@ class App(tk.Tk):
         self._img_route = None
         self._img_clusters = None
 
+        # workers de renderização ficam vivos entre runs (guardam a camada base do mapa)
+        self.renderer = Renderer(cache_dir=p("data", ".cache", "render"))
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+
+        # o Tkinter não é thread-safe: a thread do run só enfileira eventos e o
+        # mainloop os aplica em _drain_events
+        self._events = queue.Queue()
+        self._cancel = None
+
         self._build_ui()
         self._load_nodes()
+        self.after(UI_POLL_MS, self._drain_events)
+
+    def _on_close(self):
+        if self._cancel is not None:
+            self._cancel.set()
+        self.renderer.cancel()
+        self.renderer.close()
+        self.destroy()
 
     # ---------------- UI ----------------
     def _build_ui(self):
@@ -94,8 +128,17 @@ class App(tk.Tk):
         self.btn_run = ttk.Button(top, text="Rodar Otimização", command=self.run_all_async)
         self.btn_run.grid(row=1, column=4, sticky="w")
 
+        self.btn_cancel = ttk.Button(top, text="Cancelar", command=self.cancel_run, state="disabled")
+        self.btn_cancel.grid(row=1, column=5, sticky="w", padx=(8, 0))
+
         self.btn_open_run = ttk.Button(top, text="Abrir pasta do run", command=self.open_last_run)
-        self.btn_open_run.grid(row=1, column=5, sticky="w", padx=(8, 0))
+        self.btn_open_run.grid(row=1, column=6, sticky="w", padx=(8, 0))
+
+        # cProfile + tracemalloc no run (mais lento; grava profile.prof/profile.txt no run)
+        self.var_profile = tk.BooleanVar(value=False)
+        ttk.Checkbutton(top, text="Perfil (cProfile/memória)", variable=self.var_profile).grid(
+            row=1, column=7, sticky="w", padx=(12, 0)
+        )
 
         # Progress + status
         bar = ttk.Frame(self, padding=(12, 0, 12, 8))
@@ -122,7 +165,7 @@ class App(tk.Tk):
         table_card.pack(fill="x")
 
         cols = ("algoritmo", "tempo_min", "nos", "ms")
-        self.tree = ttk.Treeview(table_card, columns=cols, show="headings", height=4)
+        self.tree = ttk.Treeview(table_card, columns=cols, show="headings", height=7)
         self.tree.heading("algoritmo", text="Algoritmo")
         self.tree.heading("tempo_min", text="Tempo (min)")
         self.tree.heading("nos", text="Nós expandidos")
@@ -196,23 +239,59 @@ class App(tk.Tk):
         except Exception as e:
             messagebox.showerror("Erro", f"Não consegui carregar data/nodes.csv\n{e}")
 
-    # ---------------- helpers ----------------
+    # ---------------- eventos da thread do run ----------------
+    def post(self, fn, *args):
+        """Agenda fn(*args) na thread da interface (pode ser chamado de qualquer thread)."""
+        self._events.put((fn, args))
+
     def log(self, msg: str):
-        self.txt.insert("end", msg + "\n")
-        self.txt.see("end")
-        self.update_idletasks()
+        self._events.put((None, msg))
 
+    def _drain_events(self):
+        # linhas de log seguidas viram um insert só; o Tk redesenha quando o mainloop voltar
+        lines = []
+        try:
+            while True:
+                fn, args = self._events.get_nowait()
+                if fn is None:
+                    lines.append(args)
+                    continue
+                self._append_log(lines)
+                lines = []
+                fn(*args)
+        except queue.Empty:
+            pass
+        finally:
+            self._append_log(lines)
+            self.after(UI_POLL_MS, self._drain_events)
+
+    def _append_log(self, lines):
+        if lines:
+            self.txt.insert("end", "\n".join(lines) + "\n")
+            self.txt.see("end")
+
+    # ---------------- helpers ----------------
     def set_status(self, msg: str):
         self.lbl_status.config(text=f"Status: {msg}")
-        self.update_idletasks()
+
+    def set_preview_info(self, msg: str):
+        self.preview_info.config(text=msg)
 
     def set_running(self, running: bool):
         if running:
             self.btn_run.config(state="disabled")
+            self.btn_cancel.config(state="normal")
             self.progress.start(10)
         else:
             self.progress.stop()
             self.btn_run.config(state="normal")
+            self.btn_cancel.config(state="disabled")
+
+    def cancel_run(self):
+        if self._cancel is not None and not self._cancel.is_set():
+            self._cancel.set()
+            self.btn_cancel.config(state="disabled")
+            self.set_status("cancelando… (esperando as etapas em andamento)")
 
     def open_last_run(self):
         if self.last_run_dir and os.path.exists(self.last_run_dir):
@@ -239,7 +318,7 @@ class App(tk.Tk):
         self.clipboard_append(text)
         messagebox.showinfo("Copiado", "Resumo copiado para a área de transferência!")
 
-    def _set_table(self, bfs, dfs, astar):
+    def _set_table(self, rows):
         # limpa
         for iid in self.tree.get_children():
             self.tree.delete(iid)
@@ -251,21 +330,24 @@ class App(tk.Tk):
                 return f"{x:.2f}"
             return str(x)
 
-        self.tree.insert("", "end", values=("BFS", fmt(bfs["tempo"]), fmt(bfs["nos"]), fmt(bfs["ms"])))
-        self.tree.insert("", "end", values=("DFS", fmt(dfs["tempo"]), fmt(dfs["nos"]), fmt(dfs["ms"])))
-        self.tree.insert("", "end", values=("A*",  fmt(astar["tempo"]), fmt(astar["nos"]), fmt(astar["ms"])))
+        for name, r in rows:
+            self.tree.insert("", "end", values=(name, fmt(r["tempo"]), fmt(r["nos"]), fmt(r["ms"])))
 
         self.btn_open_report.config(state="normal")
         self.btn_open_route.config(state="normal")
         self.btn_copy_summary.config(state="normal")
 
-    def _load_preview(self, img_path: str, target: str, max_size=(310, 210)):
-        """Carrega uma imagem, redimensiona e coloca no label correto."""
-        if not img_path or not os.path.exists(img_path):
+    def _clear_clusters_preview(self):
+        self.canvas_clusters.config(image="")
+        self._img_clusters = None
+
+    def _show_preview(self, img, target: str):
+        """Coloca a miniatura (já decodificada por make_thumbnail) no label correto."""
+        if img is None:
             return
 
-        img = Image.open(img_path)
-        img.thumbnail(max_size, Image.Resampling.LANCZOS)
+        from PIL import ImageTk
+
         tkimg = ImageTk.PhotoImage(img)
 
         if target == "graph":
@@ -280,21 +362,29 @@ class App(tk.Tk):
 
     # ---------------- RUN (async) ----------------
     def run_all_async(self):
-        # roda em thread pra não travar a interface
-        t = threading.Thread(target=self.run_all, daemon=True)
-        t.start()
+        # widgets só são lidos aqui, na thread da interface; o run vai para outra thread
+        start = self.cmb_start.get().strip()
+        goal = self.cmb_goal.get().strip()
+        profile = self.var_profile.get()
 
-    def run_all(self):
-        # UI reset
         self.txt.delete("1.0", "end")
         self.preview_info.config(text="Gerando… (as imagens vão aparecer aqui)")
         self.set_status("executando…")
         self.set_running(True)
+        self._cancel = threading.Event()
+        t = threading.Thread(target=self.run_all, args=(start, goal, profile, self._cancel), daemon=True)
+        t.start()
 
-        try:
-            start = self.cmb_start.get().strip()
-            goal = self.cmb_goal.get().strip()
+    def run_all(self, start, goal, profile=False, cancel=None):
+        # roda fora da thread da interface: tudo que mexe em widget passa por self.post/self.log
+        metrics = None
+        ok = False
+
+        def check_cancel():
+            if cancel is not None and cancel.is_set():
+                raise Cancelled("Execução cancelada.")
 
+        try:
             if not start or not goal:
                 raise ValueError("Selecione origem e destino.")
 
@@ -308,75 +398,57 @@ class App(tk.Tk):
 
             self.last_run_dir = run_dir
             self.log(f"Run criado: {run_dir}")
+            metrics = RunMetrics(
+                os.path.join(run_dir, "metrics.jsonl"), trace_memory=profile, profile=profile, run_id=f"run_{ts}"
+            )
 
-            # 1) Grafo
-            self.log("1) Carregando grafo…")
-            G = build_graph(p("data", "nodes.csv"), p("data", "edges.csv"))
-
-            graph_path = os.path.join(run_dir, "graph.png")
-            draw_graph(G, graph_path)
-            self.last_graph_path = graph_path
-            self.log("   - Gerado: graph.png")
-
-            # 2) Pedidos
-            self.log("2) Lendo pedidos…")
             deliveries_path = p("data", "deliveries.csv")
-            self.log(f"   - Arquivo: {deliveries_path}")
-
             if not os.path.exists(deliveries_path):
                 raise FileNotFoundError(f"Arquivo não encontrado: {deliveries_path}")
 
-            deliveries = safe_read_csv(deliveries_path)
-            n_pedidos = len(deliveries)
-            if n_pedidos <= 0:
-                raise ValueError("deliveries.csv não tem pedidos (0 linhas).")
-
+            def read_deliveries(path, graph, log=None):
+                df = safe_read_orders(path, graph, log)
+                if len(df) <= 0:
+                    raise ValueError("deliveries.csv não tem pedidos (0 linhas).")
+                return df
+
+            # 1-5) Grafo, pedidos, pico/clustering, roteiros, buscas e figuras: mesmo DAG do
+            # main.py; etapas independentes rodam juntas (ver pipeline.route_pipeline)
+            self.log("1) Grafo, pedidos e rotas em paralelo…")
+            self.log(f"   - Arquivo de pedidos: {deliveries_path}")
+            pipe = route_pipeline(
+                run_dir,
+                p("data", "nodes.csv"),
+                p("data", "edges.csv"),
+                deliveries_path,
+                graph_cache=GRAPH_CACHE,
+                profiles_csv=PERFIS_CSV,
+                pico_min=PICO_MIN_PEDIDOS,
+                k=K_ENTREGADORES,
+                capacity=CAPACIDADE_ENTREGADOR,
+                renderer=self.renderer,
+                read_deliveries=read_deliveries,
+                metrics=metrics,
+                log=lambda msg: self.log(f"   {msg}"),
+                cancel=cancel,
+            )
+            res = pipe.run(start=start, goal=goal)
+            ms = pipe.timings
+            n_pedidos = res["plan"]["pedidos"]
             self.log(f"   - Pedidos: {n_pedidos}")
+            for t in res["tours"]:
+                self.log(f"     Entregador {t['entregador']}: {len(t['pedidos'])} pedidos, {t['total_min']:.1f} min")
+            self.log(f"   - Cache de rotas: {ROUTE_CACHE.hits} acertos / {ROUTE_CACHE.misses} falhas")
+            crit_ms, crit = pipe.critical_path()
+            self.log(f"   - Etapas: {pipe.wall_ms:.0f} ms (soma {sum(ms.values()):.0f} ms; "
+                     f"caminho crítico {crit_ms:.0f} ms: {' → '.join(crit)})")
 
-            # 3) Pico + clustering
-            clustered_csv_path = os.path.join(run_dir, "deliveries_with_clusters.csv")
-            clusters_path = os.path.join(run_dir, "clusters.png")
-            self.last_clusters_path = None  # reset
-
-            if n_pedidos >= PICO_MIN_PEDIDOS:
-                self.log(f"3) PICO: {n_pedidos} >= {PICO_MIN_PEDIDOS} → K-Means (k={K_ENTREGADORES})")
-                deliveries_clustered = kmeans_clusters(
-                    deliveries_csv=deliveries_path,
-                    k=K_ENTREGADORES,
-                    out_csv=clustered_csv_path
-                )
-                draw_clusters(deliveries_clustered, clusters_path)
-                self.last_clusters_path = clusters_path
-                self.log("   - Gerado: clusters.png")
-            else:
-                self.log(f"3) NORMAL: {n_pedidos} < {PICO_MIN_PEDIDOS} → sem clustering")
-                deliveries.to_csv(clustered_csv_path, index=False)
-
-            # 4) Rotas BFS/DFS/A*
-            self.log("4) Calculando rotas (BFS / DFS / A*)…")
-
-            # BFS
-            t0 = time.time()
-            p_bfs, ex_bfs = bfs_path(G, start, goal)
-            ms_bfs = (time.time() - t0) * 1000
-            cost_bfs = path_cost(G, p_bfs, "time_min") if p_bfs else None
-
-            # DFS
-            t0 = time.time()
-            p_dfs, ex_dfs = dfs_path(G, start, goal)
-            ms_dfs = (time.time() - t0) * 1000
-            cost_dfs = path_cost(G, p_dfs, "time_min") if p_dfs else None
-
-            # A*
-            t0 = time.time()
-            p_astar, ex_astar, cost_astar = astar_path(G, start, goal, weight="time_min")
-            ms_astar = (time.time() - t0) * 1000
-
-            # 5) Rota (A*) imagem
+            graph_path = os.path.join(run_dir, "graph.png")
             route_path = os.path.join(run_dir, "route_result.png")
-            draw_route(G, p_astar, route_path)
+            clusters_path = os.path.join(run_dir, "clusters.png")
+            self.last_graph_path = graph_path
             self.last_route_path = route_path
-            self.log("   - Gerado: route_result.png")
+            self.last_clusters_path = clusters_path if res["plan"]["modo"] == "pico" else None
 
             # 6) Report
             report_path = os.path.join(run_dir, "report.txt")
@@ -388,41 +460,59 @@ class App(tk.Tk):
             report_lines.append(f"Pedidos carregados: {n_pedidos}\n")
             report_lines.append(f"Regra de pico: >= {PICO_MIN_PEDIDOS} ativa clustering\n\n")
             report_lines.append(f"Rota escolhida na interface: {start} -> {goal}\n\n")
-            report_lines.append(f"BFS: caminho={p_bfs} | tempo_min={cost_bfs} | expandidos={ex_bfs} | ms={ms_bfs:.2f}\n")
-            report_lines.append(f"DFS: caminho={p_dfs} | tempo_min={cost_dfs} | expandidos={ex_dfs} | ms={ms_dfs:.2f}\n")
-            report_lines.append(f"A*:  caminho={p_astar} | tempo_min={cost_astar} | expandidos={ex_astar} | ms={ms_astar:.2f}\n")
+            report_lines.extend(report_body(res, ms, start))
 
-            with open(report_path, "w", encoding="utf-8") as f:
-                f.writelines(report_lines)
+            with metrics.stage("write_report"):
+                with open(report_path, "w", encoding="utf-8") as f:
+                    f.writelines(report_lines)
 
             # 7) Atualiza tabela (A)
-            bfs = {"tempo": cost_bfs, "nos": ex_bfs, "ms": ms_bfs}
-            dfs = {"tempo": cost_dfs, "nos": ex_dfs, "ms": ms_dfs}
-            ast = {"tempo": cost_astar, "nos": ex_astar, "ms": ms_astar}
-            self._set_table(bfs, dfs, ast)
-
-            # 8) Preview (C)
-            self._load_preview(graph_path, "graph")
-            self._load_preview(route_path, "route")
+            def row(key):
+                r = res[key]
+                return {"tempo": r["tempo_min"], "nos": r["expandidos"], "ms": ms[key]}
+
+            rows = [("BFS", "bfs"), ("DFS", "dfs"), ("A*", "astar"), ("A* bidir.", "astar_bidir"), ("ALT", "alt"),
+                    ("CH", "ch")]
+            self.post(self._set_table, [(label, row(key)) for label, key in rows if res.get(key) is not None])
+
+            # figuras renderizadas em paralelo: espera antes do preview
+            check_cancel()
+            with metrics.stage("render_wait"):
+                for rec in self.renderer.wait():
+                    metrics.emit(rec, parent="render_wait")
+
+            # 8) Preview (C): decodifica aqui, a interface só recebe a miniatura pronta
+            check_cancel()
+            self.post(self._show_preview, make_thumbnail(graph_path), "graph")
+            self.post(self._show_preview, make_thumbnail(route_path), "route")
             if self.last_clusters_path:
-                self._load_preview(self.last_clusters_path, "clusters")
-                self.preview_info.config(text=f"PICO ativado: clusters gerados ✅ (run_{ts})")
+                self.post(self._show_preview, make_thumbnail(self.last_clusters_path), "clusters")
+                self.post(self.set_preview_info, f"PICO ativado: clusters gerados ✅ (run_{ts})")
             else:
-                self.canvas_clusters.config(image="")
-                self._img_clusters = None
-                self.preview_info.config(text=f"Modo NORMAL: sem clustering (run_{ts})")
+                self.post(self._clear_clusters_preview)
+                self.post(self.set_preview_info, f"Modo NORMAL: sem clustering (run_{ts})")
 
             # final
             self.log("\n✅ Finalizado.")
             self.log(f"Arquivos do run em: {run_dir}")
-            self.set_status("finalizado ✅")
-            messagebox.showinfo("Pronto", f"Execução finalizada!\n\nPasta do run:\n{run_dir}")
-
+            self.post(self.set_status, "finalizado ✅")
+            self.post(messagebox.showinfo, "Pronto", f"Execução finalizada!\n\nPasta do run:\n{run_dir}")
+            ok = True
+
+        except Cancelled:
+            self.log("\n⏹ Cancelado.")
+            self.post(self.set_status, "cancelado")
+            self.post(self.set_preview_info, "Execução cancelada.")
         except Exception as e:
-            self.set_status("erro ❌")
-            messagebox.showerror("Erro", str(e))
+            self.post(self.set_status, "erro ❌")
+            self.post(messagebox.showerror, "Erro", str(e))
         finally:
-            self.set_running(False)
+            # figuras de um run cancelado ou que falhou não entram no próximo
+            if not ok:
+                self.renderer.cancel()
+            if metrics is not None:
+                metrics.close()
+            self.post(self.set_running, False)
 
 if __name__ == "__main__":
     app = App()
@@ -0,0 +1,190 @@
+import os
+import io
+import json
+import time
+import uuid
+import pstats
+import threading
+import cProfile
+import tracemalloc
+
+
+class Stage:
+    """Medidas de uma etapa: wall_ms, cpu_ms e (com trace_memory) peak_kb."""
+
+    __slots__ = ("name", "fields", "wall_ms", "cpu_ms", "peak_kb", "_t0", "_c0", "_base", "_peak")
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+        self.wall_ms = None
+        self.cpu_ms = None
+        self.peak_kb = None
+
+    def record(self):
+        rec = {"stage": self.name, "wall_ms": self.wall_ms, "cpu_ms": self.cpu_ms}
+        if self.peak_kb is not None:
+            rec["peak_kb"] = self.peak_kb
+        rec.update(self.fields)
+        return rec
+
+
+class RunMetrics:
+    """Instrumentação leve das etapas de um run.
+
+    Cada `with metrics.stage("nome", campo=valor):` mede tempo de parede
+    (perf_counter), CPU da thread que a executa (thread_time) e, se
+    trace_memory, o pico de alocação do Python na etapa (tracemalloc). Cada
+    etapa vira uma linha JSON em `path` (metrics.jsonl ao lado do
+    report.txt), com o id do run.
+
+    profile=True liga o cProfile no run inteiro; close() grava profile.prof e
+    um resumo profile.txt na mesma pasta.
+
+    Pode ser usado de várias threads (etapas em paralelo no pipeline): o
+    aninhamento é por thread e a escrita, serializada. O pico do tracemalloc é
+    do processo todo, então só é exato com uma etapa por vez.
+    """
+
+    def __init__(self, path=None, trace_memory=False, profile=False, run_id=None):
+        self.path = path
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.trace_memory = trace_memory
+        self.records = []
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._t0 = time.perf_counter()
+        self._c0 = time.process_time()
+        self._file = None
+        self._started_tracemalloc = False
+        self._profiler = None
+
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._file = open(path, "w", encoding="utf-8")
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        if profile:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    @property
+    def profiling(self):
+        """cProfile ligado (só vê a thread que criou o RunMetrics)."""
+        return self._profiler is not None
+
+    # ---------------- etapas ----------------
+    def stage(self, name, **fields):
+        return _StageContext(self, Stage(name, fields))
+
+    @property
+    def _stack(self):
+        # etapas abertas na thread atual
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _enter(self, st):
+        stack = self._stack
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                # etapa aninhada: guarda o pico da etapa de fora antes de zerar
+                outer = stack[-1]
+                outer._peak = max(outer._peak, peak)
+            tracemalloc.reset_peak()
+            st._base = current
+            st._peak = current
+        stack.append(st)
+        st._c0 = time.thread_time()
+        st._t0 = time.perf_counter()
+
+    def _exit(self, st, error):
+        st.wall_ms = (time.perf_counter() - st._t0) * 1000
+        st.cpu_ms = (time.thread_time() - st._c0) * 1000
+        stack = self._stack
+        stack.pop()
+        if self.trace_memory:
+            # pico acima do que já estava alocado quando a etapa começou
+            peak = max(st._peak, tracemalloc.get_traced_memory()[1])
+            st.peak_kb = (peak - st._base) / 1024
+            if stack:
+                outer = stack[-1]
+                outer._peak = max(outer._peak, peak)
+            tracemalloc.reset_peak()
+        if error is not None:
+            st.fields = {**st.fields, "erro": f"{type(error).__name__}: {error}"}
+        self.emit(st.record(), parent=stack[-1].name if stack else None)
+
+    def emit(self, record, parent=None):
+        """Grava uma linha (etapa ou evento) no JSONL do run."""
+        rec = {"run": self.run_id, "t_ms": (time.perf_counter() - self._t0) * 1000}
+        if parent:
+            rec["parent"] = parent
+        rec.update(record)
+        with self._write_lock:
+            self.records.append(rec)
+            if self._file:
+                self._file.write(json.dumps(rec, ensure_ascii=False, default=_jsonable) + "\n")
+                self._file.flush()
+        return rec
+
+    def summary(self):
+        """{etapa: wall_ms} das etapas de primeiro nível, na ordem em que rodaram."""
+        return {r["stage"]: r["wall_ms"] for r in self.records if "stage" in r and "parent" not in r}
+
+    # ---------------- fim do run ----------------
+    def close(self):
+        if self._profiler is not None:
+            self._profiler.disable()
+            if self.path:
+                base = os.path.dirname(os.path.abspath(self.path))
+                self._profiler.dump_stats(os.path.join(base, "profile.prof"))
+                out = io.StringIO()
+                pstats.Stats(self._profiler, stream=out).sort_stats("cumulative").print_stats(40)
+                with open(os.path.join(base, "profile.txt"), "w", encoding="utf-8") as f:
+                    f.write(out.getvalue())
+            self._profiler = None
+        total = {
+            "stage": "run",
+            "wall_ms": (time.perf_counter() - self._t0) * 1000,
+            "cpu_ms": (time.process_time() - self._c0) * 1000,
+        }
+        if self.trace_memory:
+            total["peak_kb"] = max((r.get("peak_kb", 0.0) for r in self.records), default=0.0)
+        self.emit(total)
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _StageContext:
+    __slots__ = ("metrics", "st")
+
+    def __init__(self, metrics, st):
+        self.metrics = metrics
+        self.st = st
+
+    def __enter__(self):
+        self.metrics._enter(self.st)
+        return self.st
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics._exit(self.st, exc)
+        return False
+
+
+def _jsonable(x):
+    # tipos NumPy (int64, float32...) que aparecem nos campos extras
+    return x.item() if hasattr(x, "item") else str(x)
@@ -0,0 +1,81 @@
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+
+from graph import CompactGraph
+from routing import shortest_path_tree, tree_path
+
+# faixas de entrega (minutos a partir da origem)
+ISO_BANDS = (10, 20, 30)
+TREE_CACHE_SIZE = 64
+
+# cache por grafo: {(origem, peso, cutoff): (versão, dist, pred)}
+_TREES = weakref.WeakKeyDictionary()
+
+
+def get_tree(g: CompactGraph, source: int, weight="time_min", cutoff=None):
+    """shortest_path_tree com cache por origem (arrays somente leitura).
+
+    Uma atualização de pesos ao vivo só invalida as árvores do peso que mudou.
+    """
+    key = (source, weight, cutoff)
+    cache = _TREES.setdefault(g, OrderedDict())
+    hit = cache.get(key)
+    if hit is not None:
+        if g.is_current(hit[0], weight):
+            cache.move_to_end(key)
+            return hit[1], hit[2]
+        del cache[key]
+    dist, pred = shortest_path_tree(g, source, weight, cutoff)
+    dist.flags.writeable = False
+    pred.flags.writeable = False
+    cache[key] = (g.version, dist, pred)
+    while len(cache) > TREE_CACHE_SIZE:
+        cache.popitem(last=False)
+    return dist, pred
+
+
+def isochrones(G: CompactGraph, origin, bands=ISO_BANDS, weight="time_min"):
+    """Nós alcançáveis a partir de origin em cada faixa de tempo.
+
+    A árvore sai de uma busca só, limitada à maior faixa (e fica em cache para
+    a origem). A faixa i tem os nós com bands[i-1] < tempo <= bands[i]; os
+    demais ficam em "fora". Retorna {"origem", "peso", "limites", "faixa"
+    (int8 por nó, len(bands) = fora), "tempo_min" (por nó, inf = fora),
+    "nos" (lista de nomes por faixa), "fora"}.
+    """
+    bands = tuple(sorted(bands))
+    dist, _ = get_tree(G, G.index[origin], weight, cutoff=bands[-1])
+    band = np.searchsorted(np.asarray(bands, dtype=np.float64), dist, side="left").astype(np.int8)
+    names = np.asarray(G.names, dtype=object)
+    return {
+        "origem": origin,
+        "peso": weight,
+        "limites": bands,
+        "faixa": band,
+        "tempo_min": dist,
+        "nos": [names[band == i].tolist() for i in range(len(bands))],
+        "fora": names[band == len(bands)].tolist(),
+    }
+
+
+def eta_path(G: CompactGraph, origin, goal, bands=ISO_BANDS, weight="time_min"):
+    """(caminho, tempo) de origin até goal pela árvore das isócronas (None se fora das faixas)."""
+    dist, pred = get_tree(G, G.index[origin], weight, cutoff=max(bands))
+    path = tree_path(dist, pred, G.index[goal])
+    if path is None:
+        return None, None
+    return [G.names[i] for i in path], float(dist[path[-1]])
+
+
+def isochrone_report(iso):
+    """Linhas do relatório: nós por faixa de tempo."""
+    lines = [f"\nIsócronas a partir de {iso['origem']} (peso={iso['peso']}):\n"]
+    lo = 0
+    for hi, nodes in zip(iso["limites"], iso["nos"]):
+        lines.append(f"  {lo}-{hi} min: {len(nodes)} nós | {', '.join(nodes) if nodes else '-'}\n")
+        lo = hi
+    fora = iso["fora"]
+    lines.append(f"  acima de {iso['limites'][-1]} min: {len(fora)} nós | {', '.join(fora) if fora else '-'}\n")
+    return lines
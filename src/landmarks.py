@@ -0,0 +1,218 @@
+import os
+import json
+import math
+import weakref
+from operator import sub
+import numpy as np
+
+from graph import CompactGraph
+from routing import dijkstra_all, route_by_name
+
+DEFAULT_K = 8
+
+# landmarks em memória por grafo: {(k, peso, método): Landmarks}
+_LANDMARKS = weakref.WeakKeyDictionary()
+
+
+class Landmarks:
+    """Tabelas de distância dos landmarks (ALT: A*, Landmarks, Triangle inequality).
+
+    table[v, i] = d(landmark_i, v). Como o grafo é não-direcionado,
+    |d(L, t) - d(L, v)| <= d(v, t) para todo landmark L, e o máximo entre os
+    landmarks é um limite inferior admissível e consistente.
+    """
+
+    def __init__(self, nodes, table, weight="time_min", source_hash=None, version=0):
+        self.nodes = np.asarray(nodes, dtype=np.int64)
+        self.table = np.ascontiguousarray(table, dtype=np.float64)
+        self.weight = weight
+        self.source_hash = source_hash
+        # versão do grafo em que as distâncias foram calculadas
+        self.version = version
+        self._rows = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_rows"] = None  # refeita sob demanda
+        return state
+
+    @property
+    def k(self):
+        return len(self.nodes)
+
+    def rows(self):
+        """table como listas Python por nó: a heurística roda a cada vizinho
+        relaxado, e max() sobre k floats sai bem mais barato que ufuncs NumPy
+        num array de k posições."""
+        if self._rows is None:
+            self._rows = self.table.tolist()
+        return self._rows
+
+    def to(self, t):
+        """Função v -> max_L |d(L, t) - d(L, v)| (memoizada por consulta)."""
+        rows = self.rows()
+        # landmark que não alcança t não dá informação (inf - inf): sai uma vez por consulta
+        keep = [i for i, d in enumerate(rows[t]) if d != math.inf]
+        memo = {}
+        if not keep:
+            return lambda v: 0.0
+        if len(keep) == len(rows[t]):
+            dt = rows[t]
+
+            def h(v):
+                r = memo.get(v)
+                if r is None:
+                    r = memo[v] = max(map(abs, map(sub, dt, rows[v])))
+                return r
+        else:
+            dt = [rows[t][i] for i in keep]
+
+            def h(v):
+                r = memo.get(v)
+                if r is None:
+                    row = rows[v]
+                    r = memo[v] = max(map(abs, map(sub, dt, [row[i] for i in keep])))
+                return r
+
+        return h
+
+    def bounds(self, s, t):
+        return self.to(t), self.to(s)
+
+
+def select_landmarks(g: CompactGraph, k=DEFAULT_K, weight="time_min", method="farthest", seed=0):
+    """Escolhe k landmarks e já devolve a tabela (n, k) de distâncias.
+
+    - farthest: cada novo landmark é o nó mais distante (pela rede) dos já escolhidos;
+    - planar: divide o mapa em k setores em volta do centro e pega o nó mais
+      afastado do centro em cada setor.
+    """
+    n = len(g.names)
+    k = max(1, min(k, n))
+
+    if method == "planar":
+        nodes = _planar_nodes(g, k, seed)
+        table = np.column_stack([dijkstra_all(g, L, weight) for L in nodes])
+        return nodes, table
+
+    if method != "farthest":
+        raise ValueError(f"método de landmarks desconhecido: {method}")
+
+    rng = np.random.default_rng(seed)
+    first = dijkstra_all(g, int(rng.integers(n)), weight)
+    nodes = [_farthest(first)]
+    cols = [dijkstra_all(g, nodes[0], weight)]
+    closest = cols[0].copy()
+    while len(nodes) < k:
+        closest[nodes] = -1.0  # nunca repete landmark
+        L = _farthest(closest)
+        nodes.append(L)
+        cols.append(dijkstra_all(g, L, weight))
+        closest = np.minimum(closest, cols[-1])
+    return np.array(nodes, dtype=np.int64), np.column_stack(cols)
+
+
+def _farthest(dist):
+    # nós em outra componente (inf) ganham prioridade: cobrem quem não tem landmark
+    finite = np.where(np.isinf(dist), np.finfo(np.float64).max, dist)
+    return int(np.argmax(finite))
+
+
+def _planar_nodes(g, k, seed):
+    lat, lon = np.asarray(g.lat), np.asarray(g.lon)
+    ok = ~(np.isnan(lat) | np.isnan(lon))
+    if not ok.any():
+        return np.random.default_rng(seed).choice(len(g.names), size=k, replace=False)
+    clat, clon = lat[ok].mean(), lon[ok].mean()
+    dy, dx = lat - clat, (lon - clon) * np.cos(np.radians(clat))
+    sector = np.floor((np.arctan2(dy, dx) + np.pi) / (2 * np.pi) * k).astype(np.int64) % k
+    r2 = np.where(ok, dx * dx + dy * dy, -1.0)
+    nodes = []
+    for s in range(k):
+        cand = np.flatnonzero((sector == s) & ok)
+        if len(cand):
+            nodes.append(int(cand[np.argmax(r2[cand])]))
+    # setores vazios: completa com os mais afastados que sobraram
+    for v in np.argsort(-r2):
+        if len(nodes) >= k:
+            break
+        if int(v) not in nodes:
+            nodes.append(int(v))
+    return np.array(nodes, dtype=np.int64)
+
+
+def build_landmarks(g: CompactGraph, k=DEFAULT_K, weight="time_min", method="farthest", seed=0) -> Landmarks:
+    nodes, table = select_landmarks(g, k, weight, method, seed)
+    return Landmarks(nodes, table, weight, g.source_hash, g.version)
+
+
+# ---------------- persistência (ao lado do snapshot do grafo) ----------------
+def landmarks_path(g: CompactGraph, k=DEFAULT_K, weight="time_min", method="farthest"):
+    if not g.snapshot_dir:
+        return None
+    return os.path.join(g.snapshot_dir, f"landmarks_{weight}_{method}_k{k}.npz")
+
+
+def save_landmarks(lm: Landmarks, path: str):
+    meta = {"weight": lm.weight, "source_hash": lm.source_hash}
+    tmp = f"{path}.tmp{os.getpid()}.npz"
+    np.savez(tmp, nodes=lm.nodes, table=lm.table, meta=np.array(json.dumps(meta)))
+    os.replace(tmp, path)
+
+
+def load_landmarks(path: str) -> Landmarks:
+    with np.load(path) as z:
+        meta = json.loads(str(z["meta"]))
+        return Landmarks(z["nodes"], z["table"], meta["weight"], meta["source_hash"])
+
+
+def landmarks_valid(g: CompactGraph, lm: Landmarks) -> bool:
+    """Pesos que só aumentaram mantêm os limites admissíveis; diminuições não."""
+    return lm.table.shape[0] == len(g.names) and g.is_current(lm.version, lm.weight, bounds_only=True)
+
+
+def has_landmarks(g: CompactGraph, k=DEFAULT_K, weight="time_min", method="farthest") -> bool:
+    """True se get_landmarks não precisa pré-processar (tabelas em memória ou salvas com o grafo)."""
+    lm = _LANDMARKS.get(g, {}).get((k, weight, method))
+    if lm is not None and landmarks_valid(g, lm):
+        return True
+    path = landmarks_path(g, k, weight, method)
+    return bool(path) and os.path.exists(path) and g.is_current(0, weight)
+
+
+def get_landmarks(g: CompactGraph, k=DEFAULT_K, weight="time_min", method="farthest") -> Landmarks:
+    """Carrega as tabelas salvas com o grafo; se não existirem (ou forem de
+    outra versão dos CSVs), pré-processa e salva.
+
+    Depois de atualizações de peso ao vivo que invalidem as tabelas, recalcula
+    só em memória (o arquivo continua representando os pesos dos CSVs).
+    """
+    per_graph = _LANDMARKS.setdefault(g, {})
+    lm = per_graph.get((k, weight, method))
+    if lm is not None and landmarks_valid(g, lm):
+        return lm
+
+    path = landmarks_path(g, k, weight, method)
+    if path and os.path.exists(path):
+        try:
+            lm = load_landmarks(path)
+            if lm.source_hash == g.source_hash and landmarks_valid(g, lm):
+                per_graph[(k, weight, method)] = lm
+                return lm
+        except (OSError, ValueError, KeyError):
+            pass
+    lm = build_landmarks(g, k, weight, method)
+    if path and g.is_current(0, weight):
+        save_landmarks(lm, path)
+    per_graph[(k, weight, method)] = lm
+    return lm
+
+
+def alt_path(G, start, goal, weight="time_min", landmarks=None):
+    """A* bidirecional com limites dos landmarks: (caminho, nós expandidos, custo)."""
+    lm = landmarks
+    if lm is None or not landmarks_valid(G, lm):
+        lm = get_landmarks(G, weight=weight)
+    if lm.weight != weight:
+        raise ValueError(f"landmarks calculados para {lm.weight!r}, não {weight!r}")
+    return route_by_name(G, start, goal, weight, lm)
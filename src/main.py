@@ -1,79 +1,99 @@
 import os
-import time
-import pandas as pd
+import argparse
 
-from graph import build_graph
-from search_algorithms import bfs_path, dfs_path, astar_path
-from clustering import kmeans_clusters
-from metrics import path_cost
-from visualization import draw_graph, draw_clusters, draw_route
+from pipeline import PIPELINE_WORKERS, route_pipeline, report_body
+from visualization import Renderer
+from instrumentation import RunMetrics
 
 PICO_MIN_PEDIDOS = 8
 K_ENTREGADORES = 2
+CAPACIDADE_ENTREGADOR = None  # pedidos por entregador; None = clusters equilibrados
+GRAPH_CACHE = "data/.cache/graph"
+PERFIS_CSV = "data/edge_profiles.csv"  # tempos por horário; sem o arquivo, usa só time_min
 
-def main():
-    os.makedirs("outputs", exist_ok=True)
-
-    # 1) Carrega grafo
-    G = build_graph("data/nodes.csv", "data/edges.csv")
-    draw_graph(G, "outputs/graph.png")
-
-    # 2) Carrega pedidos
-    deliveries = pd.read_csv("data/deliveries.csv")
-    n_pedidos = len(deliveries)
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Rota Inteligente - Sabor Express")
+    ap.add_argument("--profile", action="store_true",
+                    help="roda sob cProfile e grava outputs/profile.prof e profile.txt")
+    ap.add_argument("--trace-memory", action="store_true",
+                    help="mede o pico de alocação de cada etapa (tracemalloc; deixa o run mais lento)")
+    ap.add_argument("--no-render", action="store_true",
+                    help="não gera as figuras (nem importa matplotlib/networkx)")
+    ap.add_argument("--route-only", action="store_true",
+                    help="só as buscas e o relatório: sem clustering, roteiros nem figuras")
+    ap.add_argument("--workers", type=int, default=PIPELINE_WORKERS,
+                    help="etapas independentes em paralelo (1 = em sequência)")
+    ap.add_argument("--sweep", type=int, nargs="?", const=0, default=None, metavar="PARES",
+                    help="compara BFS/DFS/A* em todos os pares de nós (ou PARES sorteados); "
+                         "grava outputs/sweep.npz e um resumo no relatório")
+    ap.add_argument("--preprocessed", nargs="*", choices=("alt", "ch"), default=None, metavar="BUSCA",
+                    help="buscas com pré-processamento que rodam (alt, ch); padrão: todas, ou com "
+                         "--route-only só as que já têm índice salvo")
+    args = ap.parse_args(argv)
+    args.no_render = args.no_render or args.route_only
+    return args
 
-    # 3) Regra de pico
-    if n_pedidos >= PICO_MIN_PEDIDOS:
-        print(f"[PICO] {n_pedidos} pedidos >= {PICO_MIN_PEDIDOS} -> ativando K-Means (k={K_ENTREGADORES})")
-        deliveries_clustered = kmeans_clusters(
-            "data/deliveries.csv",
-            k=K_ENTREGADORES,
-            out_csv="outputs/deliveries_with_clusters.csv"
-        )
-        draw_clusters(deliveries_clustered, "outputs/clusters.png")
-    else:
-        print(f"[NORMAL] {n_pedidos} pedidos < {PICO_MIN_PEDIDOS} -> sem clustering (só rota)")
-        # salva um arquivo “vazio” só pra ficar organizado
-        deliveries.to_csv("outputs/deliveries_with_clusters.csv", index=False)
+def main(argv=None):
+    args = parse_args(argv)
+    os.makedirs("outputs", exist_ok=True)
+    # uma linha JSON por etapa em outputs/metrics.jsonl (ao lado do report.txt)
+    metrics = RunMetrics("outputs/metrics.jsonl", trace_memory=args.trace_memory, profile=args.profile)
+    # figuras em processos separados enquanto o run segue; camada base em data/.cache/render
+    renderer = None if args.no_render else Renderer()
+    try:
+        run(metrics, renderer, route_only=args.route_only, workers=args.workers, sweep_sample=args.sweep,
+            preprocessed=args.preprocessed)
+    finally:
+        if renderer is not None:
+            renderer.close()
+        metrics.close()
 
-    # 4) Comparação de algoritmos (exemplo fixo)
+def run(metrics, renderer=None, route_only=False, workers=PIPELINE_WORKERS, sweep_sample=None, preprocessed=None):
+    # 1-5) Grafo, pedidos, regra de pico, roteiros, buscas e figuras, como um DAG:
+    # o que não depende entre si roda junto (ver pipeline.route_pipeline)
     start = "Centro"
     goal = "Paraiso"
-
-    # BFS
-    t0 = time.time()
-    p_bfs, ex_bfs = bfs_path(G, start, goal)
-    ms_bfs = (time.time() - t0) * 1000
-    cost_bfs = path_cost(G, p_bfs, "time_min") if p_bfs else None
-
-    # DFS
-    t0 = time.time()
-    p_dfs, ex_dfs = dfs_path(G, start, goal)
-    ms_dfs = (time.time() - t0) * 1000
-    cost_dfs = path_cost(G, p_dfs, "time_min") if p_dfs else None
-
-    # A*
-    t0 = time.time()
-    p_astar, ex_astar, cost_astar = astar_path(G, start, goal, weight="time_min")
-    ms_astar = (time.time() - t0) * 1000
-
-    # 5) Output visual da melhor rota (A*)
-    draw_route(G, p_astar, "outputs/route_result.png")
+    pipe = route_pipeline(
+        "outputs",
+        "data/nodes.csv",
+        "data/edges.csv",
+        "data/deliveries.csv",
+        graph_cache=GRAPH_CACHE,
+        profiles_csv=PERFIS_CSV,
+        pico_min=PICO_MIN_PEDIDOS,
+        k=K_ENTREGADORES,
+        capacity=CAPACIDADE_ENTREGADOR,
+        renderer=renderer,
+        route_only=route_only,
+        metrics=metrics,
+        workers=workers,
+        sweep_sample=sweep_sample,
+        preprocessed=preprocessed,
+    )
+    res = pipe.run(start=start, goal=goal)
 
     # 6) Relatório
     report = []
     report.append("RELATÓRIO - Sabor Express (Rota Inteligente)\n\n")
-    report.append(f"Pedidos carregados: {n_pedidos}\n")
+    report.append(f"Pedidos carregados: {res['plan']['pedidos']}\n")
     report.append(f"Regra de pico: >= {PICO_MIN_PEDIDOS} pedidos ativa clustering\n\n")
     report.append(f"Exemplo de rota: {start} -> {goal}\n\n")
-    report.append(f"BFS: caminho={p_bfs} | tempo_min={cost_bfs} | expandidos={ex_bfs} | ms={ms_bfs:.2f}\n")
-    report.append(f"DFS: caminho={p_dfs} | tempo_min={cost_dfs} | expandidos={ex_dfs} | ms={ms_dfs:.2f}\n")
-    report.append(f"A*:  caminho={p_astar} | tempo_min={cost_astar} | expandidos={ex_astar} | ms={ms_astar:.2f}\n")
+    report.extend(report_body(res, pipe.timings, start))
+
+    with metrics.stage("write_report"):
+        with open("outputs/report.txt", "w", encoding="utf-8") as f:
+            f.writelines(report)
+
+    if renderer is None:
+        print("OK! Gerado em outputs/: report.txt, metrics.jsonl (sem figuras)")
+        return
 
-    with open("outputs/report.txt", "w", encoding="utf-8") as f:
-        f.writelines(report)
+    # espera as figuras e registra as medidas de cada uma (feitas nos workers)
+    with metrics.stage("render_wait"):
+        for rec in renderer.wait():
+            metrics.emit(rec, parent="render_wait")
 
-    print("OK! Gerado em outputs/: graph.png, clusters.png (se pico), route_result.png, report.txt")
+    print("OK! Gerado em outputs/: graph.png, clusters.png (se pico), route_result.png, isochrones.png, report.txt, metrics.jsonl")
 
 if __name__ == "__main__":
     main()
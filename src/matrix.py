@@ -0,0 +1,147 @@
+import os
+import math
+import heapq
+import weakref
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from graph import CompactGraph, load_snapshot
+
+# abaixo disso o custo de subir processos não compensa
+PARALLEL_MIN_SOURCES = 64
+MATRIX_CACHE_SIZE = 32
+
+# cache por grafo: {(peso, origens, destinos): (versão, matriz)}
+_CACHE = weakref.WeakKeyDictionary()
+
+# grafo do processo worker (aberto uma vez pelo initializer)
+_WORKER_GRAPH = None
+
+
+def pool_context():
+    """Contexto dos pools de processos: forkserver (spawn onde não houver).
+
+    Os pools sobem de dentro de threads (estágios do pipeline, GUI, serviço);
+    fork copiaria locks presos por outras threads e o worker pode travar.
+    """
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(method)
+
+
+def default_workers():
+    """CPUs realmente disponíveis para este processo."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def one_to_many(g: CompactGraph, s: int, targets, weight="time_min"):
+    """Dijkstra a partir de s que para quando todos os alvos foram assentados.
+
+    Retorna um array com o custo até cada alvo (inf = inalcançável).
+    """
+    indptr, indices, w = g.indptr, g.indices, g.weights[weight]
+    targets = list(targets)
+    pending = set(targets)
+    best = {s: 0.0}
+    final = {}
+    heap = [(0.0, s)]
+    inf = math.inf
+    while heap and pending:
+        du, u = heapq.heappop(heap)
+        if du > best[u]:
+            continue
+        final[u] = du
+        pending.discard(u)
+        a, b = indptr[u], indptr[u + 1]
+        for v, wv in zip(indices[a:b].tolist(), w[a:b].tolist()):
+            nd = du + wv
+            if nd < best.get(v, inf):
+                best[v] = nd
+                heapq.heappush(heap, (nd, v))
+    return np.array([final.get(t, inf) for t in targets], dtype=np.float64)
+
+
+def _rows(g, sources, targets, weight):
+    out = np.empty((len(sources), len(targets)), dtype=np.float64)
+    for r, s in enumerate(sources):
+        out[r] = one_to_many(g, s, targets, weight)
+    return out
+
+
+def worker_graph_args(g: CompactGraph, weight=None):
+    """initargs para abrir g num processo worker (ver open_worker_graph).
+
+    Com snapshot em disco e o peso ainda igual ao do arquivo, vai só o
+    caminho: cada worker mapeia os mesmos arquivos (páginas compartilhadas).
+    Grafo só em memória (ou peso alterado / fora do snapshot) vai por arrays.
+    weight=None exige isso de todos os pesos (workers que atendem qualquer um).
+    """
+    weights = list(g.weights) if weight is None else [weight]
+    if g.snapshot_dir and all(isinstance(g.weights[w], np.memmap) and g.is_current(0, w) for w in weights):
+        return (g.snapshot_dir, None)
+    return (None, (g.names, g.lat, g.lon, g.indptr, g.indices, g.weights, g.edge_ids))
+
+
+def open_worker_graph(snapshot_dir, arrays):
+    return load_snapshot(snapshot_dir) if snapshot_dir else CompactGraph(*arrays)
+
+
+def _init_worker(snapshot_dir, arrays):
+    global _WORKER_GRAPH
+    _WORKER_GRAPH = open_worker_graph(snapshot_dir, arrays)
+
+
+def _worker_rows(args):
+    sources, targets, weight = args
+    return _rows(_WORKER_GRAPH, sources, targets, weight)
+
+
+def _parallel_rows(g, sources, targets, weight, workers):
+    init = worker_graph_args(g, weight)
+    n_chunks = min(len(sources), workers * 4)
+    chunks = [c.tolist() for c in np.array_split(np.asarray(sources), n_chunks)]
+    with ProcessPoolExecutor(max_workers=workers, mp_context=pool_context(), initializer=_init_worker,
+                             initargs=init) as ex:
+        parts = list(ex.map(_worker_rows, [(c, targets, weight) for c in chunks]))
+    return np.vstack(parts)
+
+
+def distance_matrix(G: CompactGraph, sources, targets, weight="time_min", workers=None, use_cache=True):
+    """Matriz origem x destino de custos (np.ndarray, inf = inalcançável).
+
+    sources/targets são nomes de nós. Faz um Dijkstra um-para-muitos por
+    origem; com muitas origens distribui em processos (workers=None usa
+    todas as CPUs disponíveis, workers=1 força serial). O resultado fica em
+    cache e volta como array somente leitura; atualizações de pesos ao vivo
+    só invalidam as matrizes do peso que mudou.
+    """
+    src = [G.index[n] for n in sources]
+    tgt = [G.index[n] for n in targets]
+    key = (weight, tuple(src), tuple(tgt))
+
+    cache = _CACHE.setdefault(G, OrderedDict())
+    hit = cache.get(key) if use_cache else None
+    if hit is not None:
+        if G.is_current(hit[0], weight):
+            cache.move_to_end(key)
+            return hit[1]
+        del cache[key]
+
+    if workers is None:
+        workers = default_workers()
+    if workers > 1 and len(src) >= PARALLEL_MIN_SOURCES:
+        out = _parallel_rows(G, src, tgt, weight, workers)
+    else:
+        out = _rows(G, src, tgt, weight)
+    out.flags.writeable = False
+
+    if use_cache:
+        cache[key] = (G.version, out)
+        while len(cache) > MATRIX_CACHE_SIZE:
+            cache.popitem(last=False)
+    return out
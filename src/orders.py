@@ -0,0 +1,159 @@
+import numpy as np
+import pandas as pd
+
+from graph import CompactGraph
+from spatial import get_spatial_index
+
+# linhas por bloco na leitura: limita a memória de parsing em arquivos de um dia inteiro
+ORDER_CHUNK = 100_000
+ORDER_COLUMNS = ("order_id", "node", "lat", "lon")
+# amostra de order_id descartados mostrada no aviso
+SAMPLE_IDS = 5
+
+
+def order_dtypes(g: CompactGraph):
+    """dtypes da leitura: node categórico sobre os nós do grafo, coordenadas float32.
+
+    Com as categorias fixas nos nomes do grafo, cada pedido guarda só o código
+    do nó (int8/int16) e todos os blocos concatenam sem recodificar.
+    """
+    return {
+        "order_id": str,
+        "node": pd.CategoricalDtype(list(g.names)),
+        "lat": np.float32,
+        "lon": np.float32,
+    }
+
+
+def _check_columns(path):
+    cols = pd.read_csv(path, nrows=0).columns
+    if "node" not in cols and not {"lat", "lon"} <= set(cols):
+        raise ValueError(f"{path}: os pedidos precisam da coluna node ou de lat e lon (colunas: {list(cols)}).")
+    return [c for c in ORDER_COLUMNS if c in cols]
+
+
+def _validate_chunk(chunk, raw_node, g, spatial, stats):
+    """Valida e completa um bloco (vetorizado); devolve só as linhas aproveitáveis."""
+    # nome presente no arquivo mas fora do grafo: vira NaN no categórico
+    unknown = raw_node.notna().to_numpy() & chunk["node"].isna().to_numpy()
+    stats["no_desconhecido"] += int(unknown.sum())
+
+    lat = chunk["lat"].to_numpy()
+    lon = chunk["lon"].to_numpy()
+    has_xy = ~(np.isnan(lat) | np.isnan(lon))
+    bad_xy = has_xy & ((np.abs(lat) > 90) | (np.abs(lon) > 180))
+    if bad_xy.any():
+        chunk.loc[bad_xy, ["lat", "lon"]] = np.nan
+        has_xy &= ~bad_xy
+    stats["coord_invalida"] += int(bad_xy.sum())
+
+    # sem nó válido: nó mais próximo pelas coordenadas (KD-tree salva com o grafo)
+    todo = chunk["node"].isna().to_numpy() & has_xy
+    chunk["snap_km"] = np.float32(0.0)
+    if todo.any():
+        nodes, dist = spatial().snap(lat[todo], lon[todo], return_distance=True)
+        ok = nodes >= 0
+        codes = chunk["node"].cat.codes.to_numpy().copy()
+        rows = np.flatnonzero(todo)
+        codes[rows[ok]] = nodes[ok]
+        chunk["node"] = pd.Categorical.from_codes(codes, dtype=chunk["node"].dtype)
+        # snap sem nó (fora do raio) não tem distância: a linha será descartada
+        chunk.iloc[rows[ok], chunk.columns.get_loc("snap_km")] = dist[ok].astype(np.float32)
+        stats["ajustados"] += int(ok.sum())
+
+    # coordenadas do nó para quem veio só com o nome do bairro
+    codes = chunk["node"].cat.codes.to_numpy()
+    fill = (codes >= 0) & ~has_xy
+    if fill.any():
+        chunk.loc[fill, "lat"] = np.asarray(g.lat, dtype=np.float32)[codes[fill]]
+        chunk.loc[fill, "lon"] = np.asarray(g.lon, dtype=np.float32)[codes[fill]]
+
+    drop = codes < 0
+    if drop.any():
+        stats["descartados"] += int(drop.sum())
+        room = SAMPLE_IDS - len(stats["amostra_descartados"])
+        if room > 0:
+            stats["amostra_descartados"] += chunk.loc[drop, "order_id"].head(room).tolist()
+        chunk = chunk.loc[~drop]
+    return chunk
+
+
+def _prepare_chunk(chunk, start, dtypes):
+    """Colunas faltantes, order_id automático (P001...) e dtypes de order_dtypes.
+
+    Devolve (bloco com ORDER_COLUMNS, nomes de nó como vieram no arquivo).
+    """
+    for col in ORDER_COLUMNS:
+        if col not in chunk.columns:
+            chunk[col] = np.nan if col != "node" else None
+    if chunk["order_id"].isna().any():
+        auto = pd.Series([f"P{i + 1:03d}" for i in range(start, start + len(chunk))], index=chunk.index)
+        chunk["order_id"] = chunk["order_id"].fillna(auto)
+    # categorias do bloco (poucos nomes distintos) -> categorias do grafo
+    raw_node = chunk["node"].astype("category")
+    chunk["node"] = raw_node.cat.set_categories(dtypes["node"].categories)
+    chunk = chunk.astype({"lat": np.float32, "lon": np.float32, "order_id": str})
+    return chunk[list(ORDER_COLUMNS)], raw_node
+
+
+def _new_stats():
+    return {"lidos": 0, "no_desconhecido": 0, "coord_invalida": 0, "ajustados": 0, "descartados": 0,
+            "amostra_descartados": [], "blocos": 0}
+
+
+def _finish(parts, stats, dtypes, log):
+    df = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(
+        {c: pd.Series(dtype=dtypes[c]) for c in ORDER_COLUMNS}).assign(snap_km=np.float32(0.0))
+    stats["pedidos"] = len(df)
+    df.attrs["validacao"] = stats
+    if log and (stats["no_desconhecido"] or stats["coord_invalida"] or stats["descartados"]):
+        log(f"[PEDIDOS] {stats['lidos']} lidos: {stats['no_desconhecido']} com bairro fora do grafo, "
+            f"{stats['coord_invalida']} com coordenada inválida, {stats['ajustados']} ajustados ao nó mais "
+            f"próximo, {stats['descartados']} descartados {stats['amostra_descartados']}")
+    return df
+
+
+def validate_orders(orders: pd.DataFrame, g: CompactGraph, index=None, log=None):
+    """Mesma validação de read_orders para pedidos já em memória (ex.: JSON do serviço)."""
+    dtypes = order_dtypes(g)
+    stats = _new_stats()
+    stats["lidos"] = len(orders)
+    stats["blocos"] = 1
+    chunk, raw_node = _prepare_chunk(orders.reset_index(drop=True), 0, dtypes)
+    spatial = (lambda: index) if index is not None else (lambda: get_spatial_index(g))
+    return _finish([_validate_chunk(chunk, raw_node, g, spatial, stats)], stats, dtypes, log)
+
+
+def read_orders(path, g: CompactGraph, chunksize=ORDER_CHUNK, index=None, log=None):
+    """Lê os pedidos em blocos, já validados contra o grafo e com o nó de cada um.
+
+    - dtypes compactos (order_dtypes): node categórico, lat/lon float32;
+    - nó inexistente no grafo ou coordenada fora de [-90, 90] x [-180, 180]
+      conta como ausente; sem nó, o pedido recebe o mais próximo das
+      coordenadas (coluna snap_km); sem nenhum dos dois, é descartado;
+    - pedidos só com o nome do bairro ganham as coordenadas do nó.
+
+    A memória de parsing fica em um bloco; o DataFrame final é o mesmo para
+    clustering e roteiros. O resumo da validação vai em df.attrs["validacao"]
+    (e para log, se algo foi corrigido ou descartado).
+    """
+    usecols = _check_columns(path)
+    dtypes = order_dtypes(g)
+    stats = _new_stats()
+    parts = []
+
+    def spatial():
+        # KD-tree só se algum pedido precisar, e uma vez para o arquivo todo
+        nonlocal index
+        if index is None:
+            index = get_spatial_index(g)
+        return index
+
+    reader = pd.read_csv(path, usecols=usecols, dtype={**{c: dtypes[c] for c in usecols if c != "node"},
+                                                       "node": "category"}, chunksize=chunksize)
+    for chunk in reader:
+        start = stats["lidos"]
+        stats["lidos"] += len(chunk)
+        stats["blocos"] += 1
+        parts.append(_validate_chunk(*_prepare_chunk(chunk, start, dtypes), g, spatial, stats))
+    return _finish(parts, stats, dtypes, log)
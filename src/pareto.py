@@ -0,0 +1,182 @@
+import heapq
+import weakref
+from bisect import bisect_left, bisect_right
+import numpy as np
+
+from graph import CompactGraph
+from routing import HaversineHeuristic, bidirectional_search, dijkstra_all, heuristic_scale
+
+CRITERIA = ("time_min", "dist_km")
+
+# pesos combinados da soma ponderada por grafo: {(alpha, critérios): (versão, array)}
+_COMBINED = weakref.WeakKeyDictionary()
+
+
+class _Front:
+    """Conjunto não-dominado de rótulos (c1, c2) de um nó.
+
+    c1 fica em ordem crescente e c2, consequentemente, decrescente: testar se
+    um rótulo é dominado é uma busca binária, e os que ele domina formam um
+    trecho contíguo.
+    """
+
+    __slots__ = ("c1", "c2", "ids")
+
+    def __init__(self):
+        self.c1 = []
+        self.c2 = []
+        self.ids = []
+
+    def dominates(self, a, b):
+        i = bisect_right(self.c1, a) - 1
+        return i >= 0 and self.c2[i] <= b
+
+    def insert(self, a, b, label):
+        """Insere (a, b) e devolve os ids dos rótulos que passaram a ser dominados."""
+        i = bisect_left(self.c1, a)
+        j = i
+        while j < len(self.c1) and self.c2[j] >= b:
+            j += 1
+        removed = self.ids[i:j]
+        self.c1[i:j] = [a]
+        self.c2[i:j] = [b]
+        self.ids[i:j] = [label]
+        return removed
+
+
+def pareto_search(g: CompactGraph, s: int, t: int, criteria=CRITERIA, eps=0.0, max_labels=None):
+    """Busca multiobjetivo por rótulos (label-setting) sobre dois pesos.
+
+    Rótulos saem da fila em ordem lexicográfica (c1, c2), então um rótulo
+    retirado nunca é dominado depois. Podas:
+    - dominância no próprio nó (_Front);
+    - dominância no alvo: custo + limite inferior até t (um Dijkstra reverso
+      por critério) dominado por uma rota já encontrada é descartado.
+
+    eps > 0 troca as duas podas por eps-dominância (descarta o que algum
+    rótulo cobre a menos de um fator 1 + eps em cada critério). Devolve um
+    conjunto aproximado bem menor e muito mais rápido em redes grandes; como as
+    podas nos nós se acumulam ao longo da rota, a perda pode passar um pouco
+    de 1 + eps (em grades de 10 mil nós, eps=0.01 ficou a menos de 7%).
+
+    max_labels limita os rótulos retirados (None = sem limite; com limite, o
+    conjunto pode ficar incompleto). Retorna (lista de (caminho em índices,
+    (c1, c2)) em ordem de c1, rótulos retirados).
+    """
+    w1 = np.asarray(g.weights[criteria[0]], dtype=np.float64).tolist()
+    w2 = np.asarray(g.weights[criteria[1]], dtype=np.float64).tolist()
+    lb1 = dijkstra_all(g, t, criteria[0]).tolist()
+    lb2 = dijkstra_all(g, t, criteria[1]).tolist()
+    if lb1[s] == float("inf"):
+        return [], 0
+
+    # rótulo até (1 + eps) vezes pior que um já existente é descartado
+    f = 1.0 + eps
+
+    indptr, indices = g.indptr, g.indices
+    node, parent, c1s, c2s = [s], [-1], [0.0], [0.0]
+    dead = set()
+    fronts = {s: _Front()}
+    fronts[s].insert(0.0, 0.0, 0)
+    target = _Front()
+    heap = [(0.0, 0.0, 0)]
+    popped = 0
+
+    while heap:
+        a, b, lab = heapq.heappop(heap)
+        if lab in dead:
+            continue
+        u = node[lab]
+        # pode ter sido dominado no alvo depois de entrar na fila
+        if target.dominates((a + lb1[u]) * f, (b + lb2[u]) * f):
+            continue
+        popped += 1
+        if u == t:
+            target.insert(a, b, lab)
+            continue
+        if max_labels is not None and popped >= max_labels:
+            break
+        lo, hi = indptr[u], indptr[u + 1]
+        for v, x, y in zip(indices[lo:hi].tolist(), w1[lo:hi], w2[lo:hi]):
+            na, nb = a + x, b + y
+            if target.dominates((na + lb1[v]) * f, (nb + lb2[v]) * f):
+                continue
+            front = fronts.get(v)
+            if front is None:
+                front = fronts[v] = _Front()
+            elif front.dominates(na * f, nb * f):
+                continue
+            new = len(node)
+            node.append(v)
+            parent.append(lab)
+            c1s.append(na)
+            c2s.append(nb)
+            dead.update(front.insert(na, nb, new))
+            heapq.heappush(heap, (na, nb, new))
+
+    out = []
+    for lab in target.ids:
+        path = []
+        cur = lab
+        while cur != -1:
+            path.append(node[cur])
+            cur = parent[cur]
+        path.reverse()
+        out.append((path, (c1s[lab], c2s[lab])))
+    return out, popped
+
+
+def pareto_paths(G, start, goal, criteria=CRITERIA, eps=0.0, max_labels=None):
+    """pareto_search com nomes: ([(caminho, (c1, c2)), ...], rótulos retirados)."""
+    front, popped = pareto_search(G, G.index[start], G.index[goal], criteria, eps, max_labels)
+    return [([G.names[i] for i in path], costs) for path, costs in front], popped
+
+
+def combined_weight(g: CompactGraph, alpha=0.5, criteria=CRITERIA):
+    """Peso alpha * c1 + (1 - alpha) * k * c2 por arco.
+
+    k = soma(c1) / soma(c2) põe os dois critérios na mesma escala (para
+    time_min x dist_km, o tempo médio por km da rede), então alpha=0.5 pesa
+    os dois igualmente. Fica em cache até algum dos critérios mudar.
+    """
+    key = (float(alpha), tuple(criteria))
+    per_graph = _COMBINED.setdefault(g, {})
+    hit = per_graph.get(key)
+    if hit is not None and all(g.is_current(hit[0], c) for c in criteria):
+        return hit[1]
+    c1 = np.asarray(g.weights[criteria[0]], dtype=np.float64)
+    c2 = np.asarray(g.weights[criteria[1]], dtype=np.float64)
+    k = c1.sum() / c2.sum() if c2.sum() > 0 else 1.0
+    w = alpha * c1 + (1 - alpha) * k * c2
+    per_graph[key] = (g.version, w)
+    return w
+
+
+def weighted_sum_path(G, start, goal, alpha=0.5, criteria=CRITERIA):
+    """Soma ponderada no motor rápido (A* bidirecional, heurística haversine).
+
+    Acha só rotas "suportadas" do conjunto de Pareto (as que minimizam alguma
+    combinação linear), mas custa uma busca simples. Retorna
+    (caminho, nós expandidos, (c1, c2)).
+    """
+    w = combined_weight(G, alpha, criteria)
+    h = HaversineHeuristic(G, scale=heuristic_scale(G, w))
+    path, expanded, _ = bidirectional_search(G, G.index[start], G.index[goal], w, h)
+    if path is None:
+        return None, expanded, None
+    pos = G.arc_positions(path[:-1], path[1:])
+    costs = tuple(float(np.asarray(G.weights[c])[pos].sum()) for c in criteria)
+    return [G.names[i] for i in path], expanded, costs
+
+
+def weighted_sum_front(G, start, goal, alphas=(0.0, 0.25, 0.5, 0.75, 1.0), criteria=CRITERIA):
+    """Rotas não-dominadas da soma ponderada para vários alphas, em ordem de c1."""
+    front = _Front()
+    paths = []
+    for alpha in alphas:
+        path, _, costs = weighted_sum_path(G, start, goal, alpha, criteria)
+        # empates nos extremos (alpha 0 ou 1) podem trazer rota dominada
+        if path is not None and not front.dominates(*costs):
+            front.insert(*costs, len(paths))
+            paths.append(path)
+    return [(paths[i], (a, b)) for a, b, i in zip(front.c1, front.c2, front.ids)]
@@ -0,0 +1,406 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from graph import load_graph
+from search_algorithms import bfs_path, dfs_path, astar_path
+from routing import bidirectional_astar_path
+from landmarks import alt_path, get_landmarks, has_landmarks
+from contraction import ch_path, get_ch, has_ch
+from route_cache import ROUTE_CACHE, cached_search
+from clustering import balanced_clusters
+from metrics import path_cost
+from tours import plan_courier_tours
+from orders import read_orders
+from pareto import pareto_paths, weighted_sum_path
+from time_profiles import load_profiles, apply_slot, td_astar_path, time_slot, format_time_of_day, parse_time_of_day
+from sweep import sweep, sweep_report
+from isochrones import ISO_BANDS, isochrones, isochrone_report
+
+PIPELINE_WORKERS = 4
+
+
+class Cancelled(Exception):
+    """Run interrompido pelo usuário (ver Pipeline(cancel=...))."""
+
+
+class PipelineStage:
+    __slots__ = ("name", "fn", "deps", "when", "metric", "fields", "info")
+
+    def __init__(self, name, fn, deps, when, metric, fields, info):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.when = when
+        self.metric = metric
+        self.fields = fields
+        self.info = info
+
+
+class _InlineExecutor:
+    """Executa cada etapa na hora, na thread que chamou run() (mesma interface do pool)."""
+
+    def submit(self, fn, *args):
+        fut = Future()
+        try:
+            fut.set_result(fn(*args))
+        except Exception as e:
+            fut.set_exception(e)
+        return fut
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class Pipeline:
+    """Etapas com dependências (DAG) executadas em paralelo num pool de threads.
+
+    Cada etapa é fn(**resultados das dependências) e entra no pool assim que
+    as dependências terminam, então o run leva o tempo do caminho crítico e
+    não a soma das etapas. Threads porque as etapas compartilham o grafo em
+    memória; o que é CPU pesado fora do GIL já vai para processos (figuras no
+    Renderer, matriz de distâncias grande no pool do matrix.py).
+
+    - when(resultados) -> False pula a etapa (resultado None, sem registro);
+    - metric: nome da etapa no metrics.jsonl (padrão: o nome; False = não registra);
+    - info(resultado) -> dict de campos extras para o registro.
+
+    Com metrics.trace_memory roda uma etapa por vez: o pico do tracemalloc é
+    do processo todo e vazaria de uma etapa para a outra. Com o cProfile
+    ligado (metrics.profiling) as etapas rodam na própria thread de run(), a
+    única que o profiler enxerga.
+
+    cancel (threading.Event) interrompe o run: nenhuma etapa nova começa, as
+    que já rodam terminam (não dá para parar uma thread no meio) e run() sobe
+    Cancelled.
+    """
+
+    def __init__(self, metrics=None, workers=PIPELINE_WORKERS, cancel=None):
+        self.metrics = metrics
+        self.cancel = cancel
+        if metrics is not None and metrics.trace_memory:
+            workers = 1
+        self.inline = metrics is not None and metrics.profiling
+        self.workers = 1 if self.inline else max(1, min(workers, os.cpu_count() or 1))
+        self.stages = {}
+        self.timings = {}
+        self.wall_ms = None
+
+    def add(self, name, fn, deps=(), when=None, metric=None, info=None, **fields):
+        if name in self.stages:
+            raise ValueError(f"Etapa repetida no pipeline: {name}")
+        self.stages[name] = PipelineStage(name, fn, deps, when, metric, fields, info)
+        return fn
+
+    def run(self, **inputs):
+        """Executa tudo; devolve {etapa: resultado} (mais os inputs). Erro de uma etapa
+        para o agendamento das seguintes, espera as que já rodam e sobe."""
+        results = dict(inputs)
+        pending = {n: st for n, st in self.stages.items() if n not in results}
+        unknown = {d for st in pending.values() for d in st.deps} - set(self.stages) - set(results)
+        if unknown:
+            raise ValueError(f"Dependências desconhecidas no pipeline: {sorted(unknown)}")
+
+        t0 = time.perf_counter()
+        running = {}
+        error = None
+        if self.inline:
+            executor = _InlineExecutor()
+        else:
+            executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pipeline")
+        with executor as ex:
+            while True:
+                if error is None and self.cancel is not None and self.cancel.is_set():
+                    error = Cancelled("Execução cancelada.")
+                if error is None:
+                    self._submit_ready(ex, pending, running, results)
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    name = running.pop(fut)
+                    try:
+                        results[name] = fut.result()
+                    except Exception as e:
+                        error = error or e
+        self.wall_ms = (time.perf_counter() - t0) * 1000
+        self._emit_summary()
+        if error is not None:
+            raise error
+        if pending:
+            raise ValueError(f"Dependência circular entre as etapas: {sorted(pending)}")
+        return results
+
+    def _submit_ready(self, ex, pending, running, results):
+        progress = True
+        while progress:
+            progress = False
+            for name, st in list(pending.items()):
+                if not all(d in results for d in st.deps):
+                    continue
+                del pending[name]
+                if st.when is not None and not st.when(results):
+                    results[name] = None
+                    progress = True  # etapa pulada pode liberar outras
+                    continue
+                args = {d: results[d] for d in st.deps}
+                running[ex.submit(self._call, st, args)] = name
+
+    def _call(self, st, args):
+        if self.metrics is None or st.metric is False:
+            t0 = time.perf_counter()
+            out = st.fn(**args)
+            self.timings[st.name] = (time.perf_counter() - t0) * 1000
+            return out
+        with self.metrics.stage(st.metric or st.name, **st.fields) as m:
+            out = st.fn(**args)
+            if st.info is not None:
+                m.fields.update(st.info(out))
+        self.timings[st.name] = m.wall_ms
+        return out
+
+    def critical_path(self):
+        """(ms, etapas) da cadeia de dependências mais longa entre as que rodaram."""
+        best = {}
+
+        def longest(name):
+            if name not in best:
+                st = self.stages.get(name)
+                prev = max((longest(d) for d in st.deps if d in self.stages), default=(0.0, []))
+                best[name] = (prev[0] + self.timings.get(name, 0.0), prev[1] + [name])
+            return best[name]
+
+        return max((longest(n) for n in self.timings), default=(0.0, []))
+
+    def _emit_summary(self):
+        if self.metrics is None:
+            return
+        crit_ms, crit = self.critical_path()
+        self.metrics.emit({
+            "stage": "pipeline",
+            "wall_ms": self.wall_ms,
+            "soma_etapas_ms": sum(self.timings.values()),
+            "caminho_critico_ms": crit_ms,
+            "caminho_critico": crit,
+            "workers": self.workers,
+        })
+
+
+# ---------------- run padrão (main.py e interface) ----------------
+def _search(name, fn, **kwargs):
+    """Etapa de busca com cache: devolve {"caminho", "expandidos", "tempo_min"}."""
+    def stage(graph, start, goal, plan=None, **pre):
+        out = cached_search(name, fn, graph, start, goal, **kwargs, **pre)
+        if len(out) == 2:  # BFS/DFS não devolvem custo
+            path, expanded = out
+            cost = path_cost(graph, path, "time_min") if path else None
+        else:
+            path, expanded, cost = out
+        return {"caminho": path, "expandidos": expanded, "tempo_min": cost}
+    return stage
+
+
+def route_pipeline(out_dir, nodes_csv, edges_csv, deliveries_csv, graph_cache=None, profiles_csv=None,
+                   pico_min=8, k=2, capacity=None, renderer=None, route_only=False,
+                   read_deliveries=read_orders, metrics=None, workers=PIPELINE_WORKERS, log=print, cancel=None,
+                   sweep_sample=None, preprocessed=None):
+    """Monta o DAG de um run: grafo, pedidos, clustering, roteiros, buscas e figuras.
+
+    Executar com run(start=..., goal=...). Dependências principais:
+
+        graph ─┬─ orders ── plan ─┬─ clusters ── tours
+               └─ profiles ┘      └─ buscas (bfs, dfs, astar, ..., alt, ch, pareto)
+
+    Os pedidos são lidos uma vez (read_deliveries(caminho, grafo, log=...),
+    padrão orders.read_orders: em blocos, validados e com o nó de cada um) e o
+    mesmo DataFrame segue para o plano, o clustering e os roteiros.
+
+    As buscas esperam o plan só porque ele pode gravar o peso time_slot no
+    grafo (apply_slot). As figuras (renderer) saem assim que o dado existe e
+    rodam em processos; quem chama espera com renderer.wait().
+
+    sweep_sample liga a varredura BFS/DFS/A* em vários pares (sweep.sweep):
+    0 = todos os pares, N = N pares sorteados; grava sweep.npz em out_dir.
+
+    preprocessed escolhe as buscas com pré-processamento ("alt", "ch") que
+    rodam. None: todas num run completo; com route_only, só as que já têm o
+    índice em memória ou salvo com o grafo (a CH leva ~100 s em 10k nós).
+    """
+    p = Pipeline(metrics, workers, cancel)
+    clusters_csv = os.path.join(out_dir, "deliveries_with_clusters.csv")
+    has_profiles = profiles_csv is not None and os.path.exists(profiles_csv)
+    rendering = renderer is not None
+
+    p.add("graph", lambda: load_graph(nodes_csv, edges_csv, cache_dir=graph_cache), metric="load_graph",
+          info=lambda g: {"nos": len(g.names), "arestas": g.number_of_edges()})
+    # pedidos só com lat/lon ganham o nó mais próximo (KD-tree salva com o grafo)
+    p.add("orders", lambda graph: read_deliveries(deliveries_csv, graph, log=log), deps=("graph",),
+          metric="read_orders", info=lambda df: df.attrs.get("validacao", {"pedidos": len(df)}))
+    # perfis de tempo por horário (opcionais)
+    p.add("profiles", lambda graph: load_profiles(graph, profiles_csv) if has_profiles else None,
+          deps=("graph",), metric="load_profiles")
+
+    def plan(graph, orders, profiles):
+        n = len(orders)
+        saida = time_slot()
+        weight = "time_min"
+        if route_only:
+            mode = "rota"
+            log(f"[ROTA] {n} pedidos carregados -> só buscas e relatório")
+        elif n >= pico_min:
+            mode = "pico"
+            log(f"[PICO] {n} pedidos >= {pico_min} -> ativando K-Means balanceado (k={k})")
+            if profiles is not None:
+                # planeja com o trânsito da faixa de horário atual
+                apply_slot(graph, profiles, saida, weight="time_slot")
+                weight = "time_slot"
+                log(f"[PICO] usando perfis de tempo da faixa {format_time_of_day(saida)}")
+        else:
+            mode = "normal"
+            log(f"[NORMAL] {n} pedidos < {pico_min} -> sem clustering (só rota)")
+        return {"modo": mode, "pedidos": n, "peso": weight, "saida": saida}
+
+    p.add("plan", plan, deps=("graph", "orders", "profiles"), info=lambda r: {"modo": r["modo"], "peso": r["peso"]})
+
+    def clusters(graph, orders, plan):
+        if plan["modo"] != "pico":
+            # salva um arquivo “vazio” só pra ficar organizado
+            orders.to_csv(clusters_csv, index=False)
+            return orders
+        return balanced_clusters(orders, k=k, out_csv=clusters_csv, capacity=capacity, graph=graph,
+                                 weight=plan["peso"])
+
+    p.add("clusters", clusters, deps=("graph", "orders", "plan"), when=lambda r: not route_only,
+          metric="clustering", k=k)
+    # ordem de visita de cada entregador (saindo da origem) — 2-opt/Or-opt sobre a matriz de tempos
+    p.add("tours", lambda graph, clusters, plan, start: plan_courier_tours(graph, clusters, depot_node=start,
+                                                                          weight=plan["peso"]),
+          deps=("graph", "clusters", "plan", "start"), when=lambda r: not route_only)
+
+    # buscas Centro -> destino; cada uma independente das outras
+    base = ("graph", "start", "goal", "plan")
+    p.add("bfs", _search("bfs", bfs_path), deps=base, metric="search", algoritmo="bfs")
+    p.add("dfs", _search("dfs", dfs_path), deps=base, metric="search", algoritmo="dfs")
+    p.add("astar", _search("astar", astar_path, weight="time_min"), deps=base, metric="search", algoritmo="astar")
+    # A* bidirecional (heurística haversine admissível)
+    p.add("astar_bidir", _search("astar_bidir", bidirectional_astar_path, weight="time_min"), deps=base,
+          metric="search", algoritmo="astar_bidir")
+    # ALT e CH: pré-processamento salvo junto do snapshot do grafo, só se a busca for pedida
+    def wants(name, graph):
+        if preprocessed is not None:
+            return name in preprocessed
+        if not route_only:
+            return True
+        return has_landmarks(graph, weight="time_min") if name == "alt" else has_ch(graph, weight="time_min")
+
+    p.add("landmarks", lambda graph, plan: get_landmarks(graph, weight="time_min"), deps=("graph", "plan"),
+          when=lambda r: wants("alt", r["graph"]), metric="preprocess", algoritmo="alt")
+    p.add("alt", _search("alt", alt_path, weight="time_min"), deps=base + ("landmarks",),
+          when=lambda r: r["landmarks"] is not None, metric="search", algoritmo="alt")
+    p.add("ch_index", lambda graph, plan: get_ch(graph, weight="time_min"), deps=("graph", "plan"),
+          when=lambda r: wants("ch", r["graph"]), metric="preprocess", algoritmo="ch")
+    p.add("ch", lambda ch_index, **kw: _search("ch", ch_path, weight="time_min")(ch=ch_index, **kw),
+          deps=base + ("ch_index",), when=lambda r: r["ch_index"] is not None, metric="search", algoritmo="ch")
+    # Pareto tempo x distância (moto: combustível e prazo) + soma ponderada
+    p.add("pareto", lambda graph, start, goal, plan: pareto_paths(graph, start, goal, ("time_min", "dist_km")),
+          deps=base, metric="search", algoritmo="pareto")
+    p.add("weighted_sum", lambda graph, start, goal, plan: weighted_sum_path(graph, start, goal, alpha=0.5),
+          deps=base, metric="search", algoritmo="weighted_sum")
+
+    # A* dependente do horário (saindo agora), se houver perfis
+    def td_astar(graph, start, goal, plan, profiles):
+        # perfis e minuto de saída entram na chave; atualizações de peso descartam a entrada
+        key = (profiles.cache_token, parse_time_of_day(plan["saida"]))
+        return _search("td_astar", td_astar_path, key=key, depart=plan["saida"],
+                       profiles=profiles)(graph, start, goal)
+
+    p.add("td_astar", td_astar, deps=base + ("profiles",), when=lambda r: r["profiles"] is not None,
+          metric="search", algoritmo="td_astar")
+
+    # faixas de 10/20/30 min a partir da origem (taxa de entrega e prazo prometido)
+    p.add("isochrones", lambda graph, start, plan: isochrones(graph, start, ISO_BANDS, weight=plan["peso"]),
+          deps=("graph", "start", "plan"), info=lambda r: {"faixas": [len(n) for n in r["nos"]]})
+
+    # varredura de pares em processos (fica de fora do cache de rotas)
+    p.add("sweep", lambda graph, plan: sweep(graph, sample=sweep_sample or None,
+                                             out_path=os.path.join(out_dir, "sweep.npz")),
+          deps=("graph", "plan"), when=lambda r: sweep_sample is not None,
+          info=lambda r: {"pares": r["meta"]["pares"], "workers": r["meta"]["workers"]})
+
+    # figuras: só enfileiram no Renderer (processos); o tempo de cada uma vem do worker
+    p.add("fig_graph", lambda graph: renderer.graph(graph, os.path.join(out_dir, "graph.png")),
+          deps=("graph",), when=lambda r: rendering, metric=False)
+    p.add("fig_clusters", lambda graph, clusters, plan: renderer.clusters(clusters, os.path.join(out_dir, "clusters.png"),
+                                                                   graph),
+          deps=("graph", "clusters", "plan"), when=lambda r: rendering and r["plan"]["modo"] == "pico", metric=False)
+    p.add("fig_route", lambda graph, astar: renderer.route(graph, astar["caminho"],
+                                                          os.path.join(out_dir, "route_result.png")),
+          deps=("graph", "astar"), when=lambda r: rendering, metric=False)
+    p.add("fig_isochrones", lambda graph, isochrones: renderer.isochrones(graph, isochrones,
+                                                                       os.path.join(out_dir, "isochrones.png")),
+          deps=("graph", "isochrones"), when=lambda r: rendering, metric=False)
+    return p
+
+
+def report_body(res, timings, start):
+    """Linhas do relatório a partir dos resultados do route_pipeline (roteiros em diante)."""
+    lines = []
+    plan = res["plan"]
+    if res.get("tours") is not None:
+        lines.append(f"Roteiro por entregador (saindo de {start}, peso={plan['peso']}, {timings['tours']:.1f} ms):\n")
+        for t in res["tours"]:
+            lines.append(
+                f"  Entregador {t['entregador']}: {t['total_min']:.1f} min | "
+                f"paradas={' -> '.join(t['nos'])} | pedidos={t['pedidos']}\n"
+            )
+        lines.append("\n")
+
+    def row(label, key):
+        r = res[key]
+        return (f"{label}caminho={r['caminho']} | tempo_min={r['tempo_min']} | expandidos={r['expandidos']} | "
+                f"ms={timings[key]:.2f}\n")
+
+    lines.append(row("BFS: ", "bfs"))
+    lines.append(row("DFS: ", "dfs"))
+    lines.append(row("A*:  ", "astar"))
+    lines.append(row("A* bidirecional: ", "astar_bidir"))
+    if res.get("alt") is not None:
+        lines.append(row(f"ALT (k={res['landmarks'].k}): ", "alt"))
+        ex_alt, ex_astar = res["alt"]["expandidos"], res["astar"]["expandidos"]
+        lines.append(f"Nós expandidos vs A*: ALT={ex_alt} / A*={ex_astar} "
+                     f"({(1 - ex_alt / max(ex_astar, 1)) * 100:.0f}% a menos)\n")
+    if res.get("ch") is not None:
+        lines.append(row("CH: ", "ch"))
+        ch_info = res["ch_index"].stats()
+        lines.append(
+            f"CH pré-processamento: {ch_info['preprocess_ms']:.1f} ms | atalhos={ch_info['atalhos']} | "
+            f"memória={ch_info['memoria_kb']:.1f} KB | consulta={timings['ch']:.3f} ms\n"
+        )
+    td = res.get("td_astar")
+    if td is not None:
+        cost = td["tempo_min"]
+        lines.append(
+            f"A* dependente do horário (saída {format_time_of_day(plan['saida'])}): caminho={td['caminho']} | "
+            f"tempo_min={None if cost is None else round(cost, 1)} | expandidos={td['expandidos']} | "
+            f"ms={timings['td_astar']:.2f}\n"
+        )
+    pareto, labels = res["pareto"]
+    lines.append(f"Pareto tempo x distância: {len(pareto)} rotas | rótulos={labels} | ms={timings['pareto']:.2f}\n")
+    for path, (t_min, d_km) in pareto:
+        lines.append(f"  {t_min:.1f} min / {d_km:.2f} km: {' -> '.join(path)}\n")
+    p_ws, _, cost_ws = res["weighted_sum"]
+    if p_ws:
+        lines.append(f"Soma ponderada (alpha=0.5): {cost_ws[0]:.1f} min / {cost_ws[1]:.2f} km: {' -> '.join(p_ws)}\n")
+    cache_info = ROUTE_CACHE.stats()
+    lines.append(
+        f"Cache de rotas: acertos={cache_info['acertos']} | falhas={cache_info['falhas']} | "
+        f"entradas={cache_info['tamanho']}/{cache_info['max']}\n"
+    )
+    if res.get("isochrones") is not None:
+        lines.extend(isochrone_report(res["isochrones"]))
+    if res.get("sweep") is not None:
+        lines.extend(sweep_report(res["sweep"]))
+    return lines
@@ -0,0 +1,181 @@
+import itertools
+import threading
+import weakref
+from collections import OrderedDict
+import numpy as np
+
+DEFAULT_MAXSIZE = 1024
+
+# identidade de grafos networkx (sem cache_token); weakref para não reciclar o id()
+_NX_TOKENS = weakref.WeakKeyDictionary()
+_NX_COUNTER = itertools.count(1)
+
+
+def graph_key(G):
+    """Identidade dos pesos do grafo (CompactGraph.cache_token).
+
+    Hash dos CSVs mais o digest das atualizações ao vivo: runs que recarregam
+    o mesmo grafo dividem as rotas; instâncias com pesos diferentes, não.
+    nx.Graph usa a identidade da instância.
+    """
+    token = getattr(G, "cache_token", None)
+    if token is not None:
+        return token
+    token = _NX_TOKENS.get(G)
+    if token is None:
+        token = _NX_TOKENS.setdefault(G, ("nx", next(_NX_COUNTER)))
+    return token
+
+
+def graph_version(G):
+    """Versão dos pesos: CompactGraph.version ou G.graph["version"] no nx.Graph."""
+    v = getattr(G, "version", None)
+    if v is None:
+        v = getattr(G, "graph", {}).get("version", 0)
+    return v
+
+
+class RouteCache:
+    """Cache LRU de resultados de busca.
+
+    Chave: (grafo, versão do grafo, origem, destino, peso, algoritmo, extra),
+    onde extra identifica dados de fora do grafo que mudam o resultado
+    (perfis de horário e minuto de saída do A* dependente do tempo). Quando
+    aparece uma versão nova de um grafo, as entradas das versões antigas são
+    descartadas — mudar pesos (e incrementar a versão) invalida o cache sozinho.
+
+    Para CompactGraph o cache assina as atualizações de peso ao vivo
+    (on_edges_updated) e só descarta as rotas que a atualização pode ter mudado.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._drop_stale(key[0], key[1])
+            self._data[key] = value
+            self._data.move_to_end(key)
+            self._trim()
+
+    def _drop_stale(self, gk, version):
+        if self._versions.get(gk, version) != version:
+            for k in [k for k in self._data if k[0] == gk and k[1] != version]:
+                del self._data[k]
+        self._versions[gk] = version
+        if len(self._versions) > 4 * self.maxsize:
+            # um token por estado de pesos já consultado: esquece os que saíram do cache
+            live = {k[0] for k in self._data}
+            self._versions = {g: v for g, v in self._versions.items() if g in live or g == gk}
+
+    def _trim(self):
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def on_edges_updated(self, G, update):
+        """Leva para a versão nova as entradas que continuam ótimas.
+
+        Continuam valendo: buscas sem peso (BFS/DFS), buscas por outro peso,
+        "sem caminho" e, se os pesos só aumentaram, rotas que não passam por
+        nenhuma aresta alterada. O resto não é copiado — nem as buscas com
+        chave extra, que dependem de dados que o grafo não acompanha.
+
+        As entradas do estado anterior ficam: outra instância com os mesmos
+        pesos (outro run, o mesmo CSV) ainda pode usá-las; o LRU as descarta.
+        """
+        prev, gk = update["previous_token"], update["token"]
+        new = update["version"]
+        edges = update["edges"]
+        with self._lock:
+            carried = []
+            for k, value in self._data.items():
+                if k[0] != prev or k[1] != new - 1 or k[6]:
+                    continue
+                path = value[0]
+                keep = (
+                    k[4] is None or k[4] != update["weight"] or path is None or not len(edges)
+                    or (update["increased_only"]
+                        and not np.isin(G.path_edge_ids(path), edges).any())
+                )
+                if keep:
+                    carried.append(((gk, new) + k[2:], value))
+            for key, value in carried:
+                self._data[key] = value
+            self._versions[gk] = new
+            self._trim()
+
+    def invalidate(self, G=None):
+        """Limpa tudo, ou só as entradas de um grafo."""
+        with self._lock:
+            if G is None:
+                self._data.clear()
+                self._versions.clear()
+                return
+            gk = graph_key(G)
+            for k in [k for k in self._data if k[0] == gk]:
+                del self._data[k]
+            self._versions.pop(gk, None)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "tamanho": len(self._data),
+            "max": self.maxsize,
+            "acertos": self.hits,
+            "falhas": self.misses,
+            "descartes": self.evictions,
+            "taxa_acerto": self.hits / total if total else 0.0,
+        }
+
+    def search(self, name, fn, G, start, goal, weight=None, key=(), **kwargs):
+        """Chama fn(G, start, goal[, weight=...], **kwargs) passando pelo cache.
+
+        name identifica o algoritmo na chave ("bfs", "astar", ...); kwargs
+        (landmarks, ch...) não entram na chave porque derivam do próprio grafo.
+        kwargs que não derivam (perfis, horário) precisam ir em key.
+        """
+        if hasattr(G, "subscribe"):
+            G.subscribe(self.on_edges_updated)
+        key = (graph_key(G), graph_version(G), start, goal, weight, name, tuple(key))
+        hit = self.get(key)
+        if hit is not None:
+            return _copy_result(hit)
+        if weight is None:
+            result = fn(G, start, goal, **kwargs)
+        else:
+            result = fn(G, start, goal, weight=weight, **kwargs)
+        self.put(key, _copy_result(result))
+        return result
+
+
+def _copy_result(result):
+    # o caminho é uma lista: quem chama pode mexer sem estragar o cache
+    path, *rest = result
+    return (list(path) if path is not None else None, *rest)
+
+
+# cache compartilhado por CLI e GUI
+ROUTE_CACHE = RouteCache()
+
+
+def cached_search(name, fn, G, start, goal, weight=None, key=(), **kwargs):
+    return ROUTE_CACHE.search(name, fn, G, start, goal, weight, key, **kwargs)
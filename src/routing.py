@@ -0,0 +1,245 @@
+import math
+import heapq
+import weakref
+import numpy as np
+
+from graph import CompactGraph
+
+EARTH_RADIUS_KM = 6371.0088
+
+# heurísticas por grafo/peso (a escala depende de todas as arestas)
+_HEURISTICS = weakref.WeakKeyDictionary()
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Distância em linha reta (km) na esfera; aceita escalares ou arrays."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def heuristic_scale(g: CompactGraph, weight="time_min") -> float:
+    """Menor razão peso/km-em-linha-reta entre as arestas do grafo.
+
+    Para time_min é 1 / (velocidade máxima da rede em km/min). Como cada aresta
+    custa pelo menos escala * haversine(u, v), pela desigualdade triangular
+    escala * haversine(v, alvo) nunca supera o custo real: a heurística é
+    admissível e consistente. weight pode ser o nome do peso ou um array
+    alinhado com os arcos.
+    """
+    if np.isnan(g.lat).any() or np.isnan(g.lon).any():
+        return 0.0  # nó sem coordenada: sem limite inferior seguro
+    src = g.sources()
+    dst = np.asarray(g.indices)
+    km = haversine_km(g.lat[src], g.lon[src], g.lat[dst], g.lon[dst])
+    w = np.asarray(g.weights[weight] if isinstance(weight, str) else weight, dtype=np.float64)
+    ok = km > 0
+    if not ok.any():
+        return 0.0
+    # folga mínima para erro de arredondamento não quebrar a consistência
+    return max(0.0, float((w[ok] / km[ok]).min()) * (1 - 1e-9))
+
+
+class HaversineHeuristic:
+    """h(v) = escala * haversine(v, alvo), com a escala de `heuristic_scale`."""
+
+    def __init__(self, g: CompactGraph, weight="time_min", scale=None):
+        self.scale = heuristic_scale(g, weight) if scale is None else scale
+        self.version = g.version
+        self._lat = np.radians(g.lat).tolist()
+        self._lon = np.radians(g.lon).tolist()
+        self._cos = np.cos(np.radians(g.lat)).tolist()
+
+    def to(self, t):
+        """Função v -> limite inferior do custo de v até t."""
+        if self.scale == 0.0:
+            return lambda v: 0.0
+        lat, lon, cos = self._lat, self._lon, self._cos
+        la_t, lo_t, cos_t = lat[t], lon[t], cos[t]
+        k = 2 * EARTH_RADIUS_KM * self.scale
+
+        def h(v):
+            a = math.sin((la_t - lat[v]) / 2) ** 2 + cos[v] * cos_t * math.sin((lo_t - lon[v]) / 2) ** 2
+            return k * math.asin(math.sqrt(min(a, 1.0)))
+
+        return h
+
+    def bounds(self, s, t):
+        """(h até t, h desde s) — o grafo é não-direcionado, então é simétrico."""
+        return self.to(t), self.to(s)
+
+
+def haversine_heuristic(g: CompactGraph, weight="time_min") -> HaversineHeuristic:
+    per_graph = _HEURISTICS.setdefault(g, {})
+    h = per_graph.get(weight)
+    # se algum peso diminuiu, a escala antiga pode superestimar: recalcula
+    if h is None or not g.is_current(h.version, weight, bounds_only=True):
+        h = per_graph[weight] = HaversineHeuristic(g, weight)
+    return h
+
+
+def bidirectional_search(g: CompactGraph, s: int, t: int, weight="time_min", heuristic=None):
+    """A* bidirecional por índice; heuristic=None vira Dijkstra bidirecional.
+
+    Usa o potencial médio p(v) = (h_t(v) - h_s(v)) / 2 nos dois sentidos, o que
+    mantém as chaves consistentes e permite parar quando
+    topo_frente + topo_trás >= melhor custo encontrado.
+
+    weight pode ser o nome do peso ou um array alinhado com os arcos.
+
+    Retorna (caminho em índices | None, nós expandidos, custo | None).
+    """
+    if s == t:
+        return [s], 1, 0.0
+
+    if heuristic is None:
+        def pot(v):
+            return 0.0
+    else:
+        h_t, h_s = heuristic.bounds(s, t)
+
+        def pot(v):
+            return (h_t(v) - h_s(v)) / 2
+
+    indptr, indices = g.indptr, g.indices
+    w = g.weights[weight] if isinstance(weight, str) else weight
+    inf = math.inf
+    dist = ({s: 0.0}, {t: 0.0})
+    parent = ({s: -1}, {t: -1})
+    closed = (set(), set())
+    heaps = ([(pot(s), s)], [(-pot(t), t)])
+    sign = (1.0, -1.0)
+
+    mu = inf
+    meet = -1
+    expanded = 0
+
+    while heaps[0] and heaps[1]:
+        top_f, top_r = heaps[0][0][0], heaps[1][0][0]
+        if top_f + top_r >= mu:
+            break
+        side = 0 if top_f <= top_r else 1
+        _, u = heapq.heappop(heaps[side])
+        if u in closed[side]:
+            continue
+        closed[side].add(u)
+        expanded += 1
+
+        d, par, other, heap, sg = dist[side], parent[side], dist[1 - side], heaps[side], sign[side]
+        du = d[u]
+        a, b = indptr[u], indptr[u + 1]
+        for v, wv in zip(indices[a:b].tolist(), w[a:b].tolist()):
+            nd = du + wv
+            if nd < d.get(v, inf):
+                d[v] = nd
+                par[v] = u
+                heapq.heappush(heap, (nd + sg * pot(v), v))
+            dv = other.get(v)
+            if dv is not None and d[v] + dv < mu:
+                mu = d[v] + dv
+                meet = v
+
+    if meet < 0:
+        return None, expanded, None
+
+    path = []
+    cur = meet
+    while cur != -1:
+        path.append(cur)
+        cur = parent[0][cur]
+    path.reverse()
+    cur = parent[1][meet]
+    while cur != -1:
+        path.append(cur)
+        cur = parent[1][cur]
+    return path, expanded, mu
+
+
+def dijkstra_all(g: CompactGraph, source: int, weight="time_min", cutoff=None):
+    """Dijkstra de um nó para todos; devolve array float64 (inf = inalcançável)."""
+    indptr, indices, w = g.indptr, g.indices, g.weights[weight]
+    dist = np.full(len(g.names), np.inf)
+    dist[source] = 0.0
+    best = {source: 0.0}
+    heap = [(0.0, source)]
+    inf = math.inf
+    limit = inf if cutoff is None else cutoff
+    while heap:
+        du, u = heapq.heappop(heap)
+        if du > best[u]:
+            continue
+        dist[u] = du
+        a, b = indptr[u], indptr[u + 1]
+        for v, wv in zip(indices[a:b].tolist(), w[a:b].tolist()):
+            nd = du + wv
+            if nd <= limit and nd < best.get(v, inf):
+                best[v] = nd
+                heapq.heappush(heap, (nd, v))
+    return dist
+
+
+def shortest_path_tree(g: CompactGraph, source: int, weight="time_min", cutoff=None):
+    """Árvore de caminhos mínimos a partir de source: (dist, pred).
+
+    dist é float64 (inf = inalcançável ou além de cutoff) e pred, int32 com o
+    nó anterior no caminho mínimo (-1 na origem e nos não alcançados). Com
+    cutoff a busca não passa desse custo: em rede grande, o raio de entrega
+    custa só os nós dentro dele. Caminho até t: tree_path(dist, pred, t).
+    """
+    indptr, indices, w = g.indptr, g.indices, g.weights[weight]
+    n = len(g.names)
+    dist = np.full(n, np.inf)
+    pred = np.full(n, -1, dtype=np.int32)
+    best = {source: 0.0}
+    parent = {source: -1}
+    heap = [(0.0, source)]
+    inf = math.inf
+    limit = inf if cutoff is None else cutoff
+    settled = []
+    while heap:
+        du, u = heapq.heappop(heap)
+        if du > best[u]:
+            continue
+        settled.append(u)
+        a, b = indptr[u], indptr[u + 1]
+        for v, wv in zip(indices[a:b].tolist(), w[a:b].tolist()):
+            nd = du + wv
+            if nd <= limit and nd < best.get(v, inf):
+                best[v] = nd
+                parent[v] = u
+                heapq.heappush(heap, (nd, v))
+    # preenche os arrays de uma vez (só os nós assentados)
+    idx = np.array(settled, dtype=np.int64)
+    dist[idx] = [best[u] for u in settled]
+    pred[idx] = [parent[u] for u in settled]
+    return dist, pred
+
+
+def tree_path(dist, pred, target):
+    """Caminho (índices) da origem da árvore até target; None se não alcançado."""
+    if dist[target] == np.inf:
+        return None
+    path = [int(target)]
+    while pred[path[-1]] >= 0:
+        path.append(int(pred[path[-1]]))
+    path.reverse()
+    return path
+
+
+def route_by_name(G, start, goal, weight="time_min", heuristic=None):
+    """bidirectional_search com nomes de nós; heuristic é qualquer objeto com bounds(s, t)."""
+    if not isinstance(G, CompactGraph):
+        raise TypeError("O motor de roteamento roda sobre graph.CompactGraph (use graph.load_graph).")
+    path, expanded, cost = bidirectional_search(G, G.index[start], G.index[goal], weight, heuristic)
+    if path is None:
+        return None, expanded, None
+    return [G.names[i] for i in path], expanded, cost
+
+
+def bidirectional_astar_path(G, start, goal, weight="time_min"):
+    """Mesma saída de astar_path: (caminho, nós expandidos, custo)."""
+    return route_by_name(G, start, goal, weight, haversine_heuristic(G, weight))
+
+
+def bidirectional_dijkstra_path(G, start, goal, weight="time_min"):
+    return route_by_name(G, start, goal, weight, None)
@@ -30,24 +30,30 @@ def bfs_path(G, start, goal):
     return list(reversed(path)), expanded
 
 def dfs_path(G, start, goal):
-    visited = set()
+    # DFS com pilha explícita (sem recursão): mesma ordem de visita e mesma
+    # contagem de expandidos da versão recursiva, sem limite de profundidade
     parent = {start: None}
-    expanded = 0
-    found = False
-
-    def rec(u):
-        nonlocal expanded, found
-        visited.add(u)
-        expanded += 1
-        if u == goal:
-            found = True
-            return
-        for v in G.neighbors(u):
-            if v not in visited and not found:
-                parent[v] = u
-                rec(v)
+    visited = {start}
+    expanded = 1
+    found = start == goal
 
-    rec(start)
+    nodes = [start]
+    iters = [iter(G.neighbors(start))]
+    while iters and not found:
+        for v in iters[-1]:
+            if v not in visited:
+                visited.add(v)
+                parent[v] = nodes[-1]
+                expanded += 1
+                if v == goal:
+                    found = True
+                    break
+                nodes.append(v)
+                iters.append(iter(G.neighbors(v)))
+                break
+        else:
+            nodes.pop()
+            iters.pop()
 
     if not found:
         return None, expanded
@@ -59,6 +65,45 @@ def dfs_path(G, start, goal):
         cur = parent[cur]
     return list(reversed(path)), expanded
 
+def iddfs_path(G, start, goal, max_depth=None):
+    # aprofundamento iterativo: DFS limitada com limite 0, 1, 2, ...
+    # acha o caminho com menos arestas (como o BFS), explorando em profundidade
+    expanded = 0
+    limit = 0
+    while max_depth is None or limit <= max_depth:
+        parent = {start: None}
+        depth = {start: 0}
+        cut = False
+
+        stack = [(start, 0)]
+        while stack:
+            u, d = stack.pop()
+            if d > depth[u]:
+                continue  # já foi alcançado por um caminho mais curto
+            expanded += 1
+            if u == goal:
+                path = []
+                cur = goal
+                while cur is not None:
+                    path.append(cur)
+                    cur = parent[cur]
+                return list(reversed(path)), expanded
+            if d == limit:
+                cut = True
+                continue
+            # empilha ao contrário para visitar na ordem dos vizinhos
+            for v in reversed(list(G.neighbors(u))):
+                if d + 1 < depth.get(v, d + 2):
+                    depth[v] = d + 1
+                    parent[v] = u
+                    stack.append((v, d + 1))
+
+        if not cut:
+            break
+        limit += 1
+
+    return None, expanded
+
 def _euclid_latlon(G, a, b):
     la1, lo1 = G.nodes[a]["lat"], G.nodes[a]["lon"]
     la2, lo2 = G.nodes[b]["lat"], G.nodes[b]["lon"]
@@ -0,0 +1,433 @@
+"""Serviço HTTP/JSON de despacho (asyncio, sem dependências extras).
+
+Carrega o grafo uma vez e atende:
+
+- GET  /health  -> estado do serviço;
+- POST /route   -> {"start", "goal", "algorithm"?, "weight"?} uma rota;
+- POST /routes  -> {"queries": [...]} várias rotas de uma vez;
+- POST /plan    -> {"orders": [...], "depot", "k"?, "capacity"?} roteiro por entregador;
+- POST /isochrones -> {"origin", "bands"?, "weight"?} nós alcançáveis em cada faixa de minutos.
+
+As buscas (CPU) rodam num pool de workers para o laço de eventos continuar
+respondendo. Uso: python src/service.py --port 8080
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from graph import CompactGraph, load_graph
+from search_algorithms import bfs_path, dfs_path, astar_path
+from routing import bidirectional_astar_path
+from landmarks import alt_path
+from contraction import ch_path
+from route_cache import cached_search
+from clustering import balanced_clusters
+from metrics import path_cost
+from tours import plan_courier_tours
+from orders import validate_orders
+from matrix import default_workers, pool_context, worker_graph_args, open_worker_graph
+from isochrones import ISO_BANDS, isochrones
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DEFAULT_PORT = 8080
+# consultas por tarefa do pool no /routes (amortiza o custo de ida e volta)
+BATCH_CHUNK = 32
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+ALGORITHMS = {
+    "bfs": bfs_path,
+    "dfs": dfs_path,
+    "astar": astar_path,
+    "astar_bidir": bidirectional_astar_path,
+    "alt": alt_path,
+    "ch": ch_path,
+}
+# buscas sem peso (contam arestas); o custo é calculado depois no peso pedido
+UNWEIGHTED = {"bfs", "dfs"}
+
+_HTTP_STATUS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                413: "Payload Too Large", 500: "Internal Server Error"}
+
+# grafo do processo worker (aberto uma vez pelo initializer)
+_WORKER_GRAPH = None
+
+log = logging.getLogger("service")
+
+
+class RequestError(Exception):
+    """Erro do cliente: vira resposta 4xx com a mensagem."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+# ---------------- trabalho executado no pool ----------------
+def _init_worker(snapshot_dir, arrays):
+    global _WORKER_GRAPH
+    _WORKER_GRAPH = open_worker_graph(snapshot_dir, arrays)
+
+
+def run_route(query, g=None):
+    """Uma consulta de rota; devolve dict pronto para JSON (ou {"erro"})."""
+    g = g if g is not None else _WORKER_GRAPH
+    try:
+        start, goal = query["start"], query["goal"]
+        algorithm = query.get("algorithm", "astar_bidir")
+        weight = query.get("weight", "time_min")
+        fn = ALGORITHMS.get(algorithm)
+        if fn is None:
+            raise ValueError(f"algoritmo desconhecido: {algorithm} (use {sorted(ALGORITHMS)})")
+        if weight not in g.weights:
+            raise ValueError(f"peso desconhecido: {weight}")
+        for n in (start, goal):
+            if n not in g.index:
+                raise KeyError(f"nó inexistente: {n}")
+
+        t0 = time.perf_counter()
+        if algorithm in UNWEIGHTED:
+            path, expanded = cached_search(algorithm, fn, g, start, goal)
+            cost = path_cost(g, path, weight) if path else None
+        else:
+            path, expanded, cost = cached_search(algorithm, fn, g, start, goal, weight=weight)
+        ms = (time.perf_counter() - t0) * 1000
+    except (KeyError, ValueError, TypeError) as e:
+        return {"erro": str(e).strip("'\"")}
+    return {
+        "start": start, "goal": goal, "algorithm": algorithm, "weight": weight,
+        "caminho": path, "custo": None if cost is None else float(cost),
+        "expandidos": int(expanded), "ms": ms,
+    }
+
+
+def run_routes(queries, g=None):
+    return [run_route(q, g) for q in queries]
+
+
+def run_plan(payload, g=None):
+    """Agrupa os pedidos (k entregadores) e otimiza a ordem de visita de cada um."""
+    g = g if g is not None else _WORKER_GRAPH
+    orders = payload.get("orders")
+    if not orders:
+        raise ValueError('"orders" vazio')
+    depot = payload.get("depot", "Centro")
+    if depot not in g.index:
+        raise KeyError(f"nó inexistente: {depot}")
+    weight = payload.get("weight", "time_min")
+
+    # mesma validação do arquivo de pedidos (orders.read_orders); aqui descarte é erro do cliente
+    df = validate_orders(pd.DataFrame(orders), g)
+    stats = df.attrs["validacao"]
+    if stats["descartados"]:
+        raise ValueError(f"pedidos sem nó válido nem coordenadas válidas: {stats['amostra_descartados']}")
+
+    # matriz serial: o pool do serviço já paraleliza entre pedidos (sem pool dentro do worker)
+    k = int(payload.get("k", 1))
+    if k > 1:
+        df = balanced_clusters(df, k=k, out_csv=None, capacity=payload.get("capacity"),
+                               graph=g, weight=weight, workers=1)
+    tours = plan_courier_tours(g, df, depot_node=depot, weight=weight, workers=1)
+    return {
+        "depot": depot,
+        "entregadores": [
+            {"entregador": int(t["entregador"]), "pedidos": [str(o) for o in t["pedidos"]],
+             "nos": list(t["nos"]), "total_min": float(t["total_min"])}
+            for t in tours
+        ],
+    }
+
+
+def run_isochrones(payload, g=None):
+    """Faixas de tempo a partir de uma origem (árvore em cache por origem no worker)."""
+    g = g if g is not None else _WORKER_GRAPH
+    origin = payload.get("origin", "Centro")
+    if origin not in g.index:
+        raise KeyError(f"nó inexistente: {origin}")
+    weight = payload.get("weight", "time_min")
+    if weight not in g.weights:
+        raise ValueError(f"peso desconhecido: {weight}")
+    bands = payload.get("bands") or ISO_BANDS
+    if not all(isinstance(b, (int, float)) and b > 0 for b in bands):
+        raise ValueError('as faixas ("bands") devem ser uma lista de minutos positivos')
+    iso = isochrones(g, origin, bands, weight)
+    reach = np.flatnonzero(np.isfinite(iso["tempo_min"]))
+    return {
+        "origin": origin, "weight": weight,
+        "faixas": [{"ate_min": float(hi), "nos": nodes} for hi, nodes in zip(iso["limites"], iso["nos"])],
+        "fora": iso["fora"],
+        "tempo_min": {g.names[i]: float(iso["tempo_min"][i]) for i in reach.tolist()},
+    }
+
+
+# ---------------- serviço ----------------
+class DispatchService:
+    """Grafo carregado uma vez + pool de workers + roteamento dos endpoints.
+
+    workers <= 1 usa uma thread (compartilha grafo e caches do processo);
+    com mais, processos que abrem o snapshot do grafo (ou recebem os arrays).
+    """
+
+    def __init__(self, graph: CompactGraph, workers=None):
+        self.graph = graph
+        self.workers = default_workers() if workers is None else max(1, workers)
+        self.started = time.time()
+        self.requests = 0
+        self._executor = None
+
+    @property
+    def uses_processes(self):
+        return self.workers > 1
+
+    def start(self):
+        if self._executor is not None:
+            return
+        if self.uses_processes:
+            # workers atendem qualquer peso: snapshot só se todos ainda batem com o arquivo
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=pool_context(),
+                                                 initializer=_init_worker, initargs=worker_graph_args(self.graph))
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dispatch")
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    async def _run(self, fn, *args):
+        self.start()
+        if not self.uses_processes:
+            args = (*args, self.graph)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def dispatch(self, method, path, payload=None):
+        """(status, corpo) para um pedido já decodificado."""
+        self.requests += 1
+        routes = {
+            ("GET", "/health"): self._health,
+            ("POST", "/route"): self._route,
+            ("POST", "/routes"): self._routes,
+            ("POST", "/plan"): self._plan,
+            ("POST", "/isochrones"): self._isochrones,
+        }
+        handler = routes.get((method, path))
+        if handler is None:
+            if any(p == path for _, p in routes):
+                return 405, {"erro": f"método {method} não aceito em {path}"}
+            return 404, {"erro": f"rota desconhecida: {path}"}
+        try:
+            return 200, await handler(payload or {})
+        except RequestError as e:
+            return e.status, {"erro": str(e)}
+        except (KeyError, ValueError, TypeError) as e:
+            return 400, {"erro": str(e).strip("'\"")}
+        except Exception:
+            # falha do serviço (worker morto, bug): registra e responde sem derrubar a conexão
+            log.exception("erro ao atender %s %s", method, path)
+            return 500, {"erro": "erro interno do serviço"}
+
+    async def _health(self, _):
+        g = self.graph
+        return {
+            "status": "ok", "nos": len(g.names), "arestas": g.number_of_edges(),
+            "versao": g.version, "workers": self.workers,
+            "uptime_s": round(time.time() - self.started, 1), "requisicoes": self.requests,
+        }
+
+    async def _route(self, payload):
+        result = await self._run(run_route, payload)
+        if "erro" in result:
+            raise RequestError(result["erro"])
+        return result
+
+    async def _routes(self, payload):
+        queries = payload.get("queries")
+        if not isinstance(queries, list):
+            raise RequestError('esperado {"queries": [...]}')
+        chunks = [queries[i:i + BATCH_CHUNK] for i in range(0, len(queries), BATCH_CHUNK)]
+        t0 = time.perf_counter()
+        parts = await asyncio.gather(*(self._run(run_routes, c) for c in chunks))
+        results = [r for part in parts for r in part]
+        return {"resultados": results, "n": len(results), "ms": (time.perf_counter() - t0) * 1000}
+
+    async def _plan(self, payload):
+        return await self._run(run_plan, payload)
+
+    async def _isochrones(self, payload):
+        return await self._run(run_isochrones, payload)
+
+    # ---------------- HTTP/1.1 mínimo ----------------
+    async def handle_connection(self, reader, writer):
+        """Atende pedidos numa conexão (keep-alive) até o cliente fechar."""
+        try:
+            while True:
+                req = await _read_request(reader)
+                if req is None:
+                    break
+                method, path, body, keep_alive = req
+                if isinstance(body, tuple):  # erro de leitura/decodificação
+                    status, out = body
+                else:
+                    status, out = await self.dispatch(method, path, body)
+                _write_response(writer, status, out, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=DEFAULT_PORT):
+        self.start()
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        return server
+
+
+async def _read_request(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        return "GET", "", (400, {"erro": "linha de requisição inválida"}), False
+    headers = {}
+    while True:
+        h = await reader.readline()
+        if h in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = h.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+    path = target.split("?", 1)[0]
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        length = -1
+    if length < 0:
+        return method, path, (400, {"erro": "Content-Length inválido"}), False
+    if length > MAX_BODY_BYTES:
+        return method, path, (413, {"erro": "corpo grande demais"}), False
+    body = None
+    if length:
+        raw = await reader.readexactly(length)
+        try:
+            body = json.loads(raw)
+        except ValueError:
+            return method, path, (400, {"erro": "JSON inválido"}), keep_alive
+        if not isinstance(body, dict):
+            return method, path, (400, {"erro": "o corpo deve ser um objeto JSON"}), keep_alive
+    return method, path, body, keep_alive
+
+
+def _write_response(writer, status, obj, keep_alive):
+    data = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {_HTTP_STATUS.get(status, '')}\r\n"
+        "Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(data)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    writer.write(head.encode("latin-1") + data)
+
+
+# ---------------- cliente no mesmo processo (testes / scripts) ----------------
+class _BufferWriter:
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.buffer += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class InProcessClient:
+    """Cliente que conversa com o serviço sem abrir socket.
+
+    Monta a requisição HTTP em bytes e passa pelo mesmo parser/servidor do
+    serviço real:
+
+        async with DispatchService(g, workers=1) as svc:
+            client = InProcessClient(svc)
+            status, body = await client.post("/route", {"start": "Centro", "goal": "Paraiso"})
+    """
+
+    def __init__(self, service: DispatchService):
+        self.service = service
+
+    async def request(self, method, path, payload=None):
+        data = b"" if payload is None else json.dumps(payload).encode("utf-8")
+        return await self.send(method, path, data)
+
+    async def send(self, method, path, data=b"", content_length=None):
+        """Requisição com corpo em bytes (e Content-Length, se dado) como vierem."""
+        length = len(data) if content_length is None else content_length
+        raw = (
+            f"{method} {path} HTTP/1.1\r\nHost: local\r\nConnection: close\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {length}\r\n\r\n"
+        ).encode("latin-1") + data
+        reader = asyncio.StreamReader()
+        reader.feed_data(raw)
+        reader.feed_eof()
+        writer = _BufferWriter()
+        await self.service.handle_connection(reader, writer)
+        head, _, body = bytes(writer.buffer).partition(b"\r\n\r\n")
+        status = int(head.split(b" ", 2)[1])
+        return status, json.loads(body)
+
+    async def get(self, path):
+        return await self.request("GET", path)
+
+    async def post(self, path, payload):
+        return await self.request("POST", path, payload)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Serviço HTTP/JSON de rotas da Sabor Express")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT)
+    ap.add_argument("--workers", type=int, default=None, help="processos de busca (padrão: CPUs disponíveis)")
+    ap.add_argument("--data", default=os.path.join(BASE_DIR, "data"), help="pasta com nodes.csv e edges.csv")
+    args = ap.parse_args(argv)
+
+    graph = load_graph(os.path.join(args.data, "nodes.csv"), os.path.join(args.data, "edges.csv"),
+                       cache_dir=os.path.join(args.data, ".cache", "graph"))
+    service = DispatchService(graph, workers=args.workers)
+
+    async def run():
+        server = await service.serve(args.host, args.port)
+        print(f"Servindo em http://{args.host}:{args.port} ({service.workers} worker(s), {len(graph.names)} nós)")
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+import os
+import math
+import pickle
+import weakref
+import numpy as np
+
+from graph import CompactGraph
+from routing import EARTH_RADIUS_KM
+
+# mesmo raio da haversine (routing.haversine_km): snap_km bate com as outras distâncias
+KM_PER_DEG = math.radians(EARTH_RADIUS_KM)
+
+# índices já abertos no processo (workers do serviço, runs seguidos): por hash
+# dos CSVs; grafos sem hash (só em memória) por instância
+_BY_SOURCE = {}
+_BY_GRAPH = weakref.WeakKeyDictionary()
+
+
+class SpatialIndex:
+    """KD-tree das coordenadas dos nós, numa projeção local em km.
+
+    snap() recebe arrays de lat/lon e devolve, de forma vetorizada, o índice do
+    nó mais próximo de cada ponto (e a distância em km).
+    """
+
+    def __init__(self, g: CompactGraph, leaf_size=40):
+        # import tardio: snap_orders só chega aqui se algum pedido veio sem nó
+        from sklearn.neighbors import KDTree
+
+        lat, lon = np.asarray(g.lat), np.asarray(g.lon)
+        ok = ~(np.isnan(lat) | np.isnan(lon))
+        if not ok.any():
+            raise ValueError("Nenhum nó do grafo tem coordenadas.")
+        self.lat0 = float(lat[ok].mean())
+        self.km_per_deg = KM_PER_DEG
+        self.node_ids = np.flatnonzero(ok)
+        self.tree = KDTree(self._project(lat[ok], lon[ok]), leaf_size=leaf_size)
+        self.source_hash = g.source_hash
+
+    def _project(self, lat, lon):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        k = self.km_per_deg
+        return np.column_stack([lat * k, lon * k * np.cos(np.radians(self.lat0))])
+
+    def snap(self, lat, lon, return_distance=False):
+        """Nó mais próximo de cada (lat, lon). Pontos sem coordenada dão -1."""
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        lon = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+        out = np.full(len(lat), -1, dtype=np.int64)
+        dist = np.full(len(lat), np.nan)
+        ok = ~(np.isnan(lat) | np.isnan(lon))
+        if ok.any():
+            d, i = self.tree.query(self._project(lat[ok], lon[ok]), k=1)
+            out[ok] = self.node_ids[i[:, 0]]
+            dist[ok] = d[:, 0]
+        return (out, dist) if return_distance else out
+
+
+def spatial_index_path(g: CompactGraph):
+    return os.path.join(g.snapshot_dir, "spatial.pkl") if g.snapshot_dir else None
+
+
+def get_spatial_index(g: CompactGraph) -> SpatialIndex:
+    """Índice do grafo: memória do processo -> arquivo salvo junto do snapshot
+    (se for dos mesmos CSVs) -> constrói e salva.
+
+    As coordenadas não mudam com atualizações de peso, então o índice em
+    memória vale enquanto o hash dos CSVs for o mesmo.
+    """
+    cache, key = (_BY_SOURCE, g.source_hash) if g.source_hash else (_BY_GRAPH, g)
+    idx = cache.get(key)
+    if idx is not None:
+        return idx
+    path = spatial_index_path(g)
+    if path and os.path.exists(path):
+        try:
+            with open(path, "rb") as f:
+                idx = pickle.load(f)
+            # outros CSVs ou índice salvo com outra escala de projeção
+            if idx.source_hash != g.source_hash or getattr(idx, "km_per_deg", None) != KM_PER_DEG:
+                idx = None
+        except (OSError, pickle.UnpicklingError, AttributeError, EOFError):
+            idx = None
+    if idx is None:
+        idx = SpatialIndex(g)
+        if path:
+            tmp = f"{path}.tmp{os.getpid()}"
+            with open(tmp, "wb") as f:
+                pickle.dump(idx, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+    cache[key] = idx
+    return idx
+
+
+def snap_orders(df, g: CompactGraph, index: SpatialIndex = None):
+    """Preenche a coluna "node" dos pedidos que vieram só com lat/lon.
+
+    Pedidos com node já válido ficam como estão; os demais recebem o nó mais
+    próximo e a distância do ajuste em "snap_km".
+    """
+    df = df.copy()
+    if "node" not in df.columns:
+        df["node"] = None
+    names = np.asarray(g.names, dtype=object)
+    known = df["node"].isin(g.index)
+    if known.all():
+        return df
+
+    idx = index if index is not None else get_spatial_index(g)
+    todo = ~known.to_numpy()
+    nodes, dist = idx.snap(df.loc[todo, "lat"].to_numpy(), df.loc[todo, "lon"].to_numpy(), return_distance=True)
+    df.loc[todo, "node"] = np.where(nodes >= 0, names[np.maximum(nodes, 0)], None)
+    df["snap_km"] = 0.0
+    df.loc[todo, "snap_km"] = dist
+    return df
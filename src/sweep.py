@@ -0,0 +1,212 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from graph import CompactGraph
+from matrix import default_workers, pool_context, worker_graph_args, open_worker_graph
+from routing import dijkstra_all, bidirectional_astar_path
+from search_algorithms import bfs_path, dfs_path, astar_path
+from metrics import path_cost
+
+# algoritmos da tabela comparativa que consultam por nome, sem pré-processamento
+ALGORITHMS = {
+    "bfs": lambda G, a, b, weight: bfs_path(G, a, b),
+    "dfs": lambda G, a, b, weight: dfs_path(G, a, b),
+    "astar": astar_path,
+    "astar_bidir": bidirectional_astar_path,
+}
+SWEEP_ALGORITHMS = tuple(ALGORITHMS)
+# abaixo disso (pares x algoritmos) o custo de subir processos não compensa
+PARALLEL_MIN_QUERIES = 2_000
+# custo até 1 + isto vezes o ótimo ainda conta como ótimo (arredondamento do float32)
+GAP_TOL = 1e-6
+
+# grafo do processo worker (aberto uma vez pelo initializer)
+_WORKER_GRAPH = None
+
+
+def sweep_pairs(g: CompactGraph, sample=None, seed=0):
+    """(origens, destinos) em índices, ordenados por origem.
+
+    sample=None: todos os pares ordenados com origem != destino. Com sample,
+    sorteia esse número de pares (com reposição) em vez de todos; se sample
+    cobre todos os pares (ou o grafo tem menos de 2 nós), devolve todos.
+    """
+    n = len(g.names)
+    if sample is not None and sample < 0:
+        raise ValueError(f"amostra de pares negativa: {sample}")
+    if sample is None or n < 2 or sample >= n * (n - 1):
+        s, t = np.divmod(np.arange(n * n, dtype=np.int64), n)
+        keep = s != t
+        s, t = s[keep], t[keep]
+    else:
+        rng = np.random.default_rng(seed)
+        s = rng.integers(0, n, sample)
+        t = rng.integers(0, n - 1, sample)
+        t += t >= s  # destino sorteado entre os outros n - 1 nós
+    order = np.lexsort((t, s))
+    return s[order].astype(np.int32), t[order].astype(np.int32)
+
+
+def _run_pairs(g, sources, targets, algorithms, weight):
+    """Roda cada algoritmo em cada par; devolve as colunas (arrays) do resultado.
+
+    O custo ótimo vem de um Dijkstra por origem distinta (pares chegam
+    ordenados por origem). Pares sem caminho ficam de fora.
+    """
+    names = g.names
+    rows = len(sources) * len(algorithms)
+    cols = {
+        "algoritmo": np.empty(rows, dtype=np.int8),
+        "origem": np.empty(rows, dtype=np.int32),
+        "destino": np.empty(rows, dtype=np.int32),
+        "otimo_min": np.empty(rows, dtype=np.float32),
+        "custo_min": np.empty(rows, dtype=np.float32),
+        "gap": np.empty(rows, dtype=np.float32),
+        "expandidos": np.empty(rows, dtype=np.int32),
+        "lat_us": np.empty(rows, dtype=np.float32),
+    }
+    fns = [ALGORITHMS[a] for a in algorithms]
+    i = 0
+    dist, last = None, -1
+    for s, t in zip(sources.tolist(), targets.tolist()):
+        if s != last:
+            dist, last = dijkstra_all(g, s, weight), s
+        opt = float(dist[t])
+        if opt == np.inf:
+            continue
+        for code, fn in enumerate(fns):
+            t0 = time.perf_counter_ns()
+            out = fn(g, names[s], names[t], weight)
+            lat = time.perf_counter_ns() - t0
+            path, expanded = out[0], out[1]
+            if not path:
+                cost = np.nan
+            elif len(out) > 2 and out[2] is not None:
+                cost = out[2]
+            else:
+                cost = path_cost(g, path, weight)  # BFS/DFS não devolvem custo
+            cols["algoritmo"][i] = code
+            cols["origem"][i] = s
+            cols["destino"][i] = t
+            cols["otimo_min"][i] = opt
+            cols["custo_min"][i] = cost
+            cols["gap"][i] = cost / opt - 1.0 if opt > 0 else 0.0
+            cols["expandidos"][i] = expanded
+            cols["lat_us"][i] = lat / 1e3
+            i += 1
+    return {k: v[:i] for k, v in cols.items()}
+
+
+def _init_worker(snapshot_dir, arrays):
+    global _WORKER_GRAPH
+    _WORKER_GRAPH = open_worker_graph(snapshot_dir, arrays)
+
+
+def _worker_pairs(args):
+    sources, targets, algorithms, weight = args
+    return _run_pairs(_WORKER_GRAPH, sources, targets, algorithms, weight)
+
+
+def _parallel_pairs(g, sources, targets, algorithms, weight, workers):
+    # fatias por origem: cada Dijkstra de referência roda num worker só
+    uniq = np.unique(sources)
+    n_chunks = min(len(uniq), workers * 4)
+    bounds = [np.searchsorted(sources, c[0]) for c in np.array_split(uniq, n_chunks)] + [len(sources)]
+    jobs = [(sources[a:b], targets[a:b], algorithms, weight) for a, b in zip(bounds, bounds[1:])]
+    with ProcessPoolExecutor(max_workers=workers, mp_context=pool_context(), initializer=_init_worker,
+                             initargs=worker_graph_args(g, weight)) as ex:
+        parts = list(ex.map(_worker_pairs, jobs))
+    return {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+
+
+def summarize(cols, algorithms):
+    """Uma linha por algoritmo: taxa de ótimos, gap, nós expandidos e latência."""
+    rows = []
+    for code, name in enumerate(algorithms):
+        sel = cols["algoritmo"] == code
+        gap = cols["gap"][sel].astype(np.float64)
+        found = gap[~np.isnan(gap)]
+        exp = cols["expandidos"][sel]
+        lat = cols["lat_us"][sel].astype(np.float64)
+        row = {"algoritmo": name, "pares": int(sel.sum()), "sem_rota": int(len(gap) - len(found))}
+        if len(found):
+            g50, g90 = np.percentile(found, [50, 90]) * 100
+            row.update(otimos_pct=float((found <= GAP_TOL).mean() * 100), gap_medio_pct=float(found.mean() * 100),
+                       gap_p50_pct=float(g50), gap_p90_pct=float(g90), gap_max_pct=float(found.max() * 100))
+        if len(exp):
+            l50, l90, l99 = np.percentile(lat, [50, 90, 99])
+            row.update(expandidos_media=float(exp.mean()), expandidos_p90=float(np.percentile(exp, 90)),
+                       lat_p50_us=float(l50), lat_p90_us=float(l90), lat_p99_us=float(l99))
+        rows.append(row)
+    return rows
+
+
+def sweep(G: CompactGraph, algorithms=SWEEP_ALGORITHMS, sample=None, seed=0, weight="time_min", workers=None,
+          out_path=None):
+    """Compara os algoritmos em todos os pares de nós (ou em sample pares sorteados).
+
+    Mede, por par, o gap do custo em relação ao ótimo (Dijkstra), os nós
+    expandidos e a latência da consulta. Os pares são divididos por origem
+    entre processos (workers=None usa todas as CPUs, workers=1 força serial);
+    com várias consultas ao mesmo tempo a latência de cada uma inclui a
+    disputa por cache e memória, então compare sweeps com o mesmo workers.
+
+    out_path grava as colunas num .npz (np.load devolve um array por coluna,
+    mais "nomes" dos nós e "algoritmos" para decodificar os códigos).
+    Retorna {"meta", "resumo": summarize(...), "colunas"}.
+    """
+    algorithms = tuple(algorithms)
+    unknown = set(algorithms) - set(ALGORITHMS)
+    if unknown:
+        raise ValueError(f"algoritmo desconhecido na varredura: {sorted(unknown)} (use {list(ALGORITHMS)})")
+    sources, targets = sweep_pairs(G, sample, seed)
+
+    t0 = time.perf_counter()
+    if workers is None:
+        workers = default_workers()
+    workers = max(1, min(workers, len(np.unique(sources)) or 1))
+    if workers > 1 and len(sources) * len(algorithms) >= PARALLEL_MIN_QUERIES:
+        cols = _parallel_pairs(G, sources, targets, algorithms, weight, workers)
+    else:
+        workers = 1
+        cols = _run_pairs(G, sources, targets, algorithms, weight)
+    wall_ms = (time.perf_counter() - t0) * 1000
+
+    meta = {
+        "peso": weight,
+        "pares": len(sources),
+        "sem_caminho": len(sources) - len(cols["origem"]) // max(len(algorithms), 1),
+        "amostra": sample,
+        "seed": seed,
+        "workers": workers,
+        "wall_ms": wall_ms,
+    }
+    if out_path:
+        np.savez_compressed(out_path, nomes=np.asarray(G.names), algoritmos=np.asarray(algorithms), **cols)
+        meta["arquivo"] = out_path
+    return {"meta": meta, "resumo": summarize(cols, algorithms), "colunas": cols}
+
+
+def sweep_report(result):
+    """Seção do relatório com o resumo da varredura."""
+    meta = result["meta"]
+    lines = [
+        f"\nVarredura de pares (peso={meta['peso']}, {meta['pares']} pares"
+        f"{'' if meta['amostra'] is None else ' sorteados'}, sem caminho={meta['sem_caminho']}, "
+        f"workers={meta['workers']}, {meta['wall_ms']:.0f} ms):\n"
+    ]
+    for r in result["resumo"]:
+        if "otimos_pct" not in r:
+            lines.append(f"  {r['algoritmo']}: sem rotas encontradas ({r['pares']} pares)\n")
+            continue
+        lines.append(
+            f"  {r['algoritmo']}: ótimo em {r['otimos_pct']:.0f}% | gap médio={r['gap_medio_pct']:.1f}% "
+            f"p90={r['gap_p90_pct']:.1f}% máx={r['gap_max_pct']:.1f}% | expandidos média={r['expandidos_media']:.1f} "
+            f"p90={r['expandidos_p90']:.0f} | latência p50={r['lat_p50_us']:.0f} µs p90={r['lat_p90_us']:.0f} µs "
+            f"p99={r['lat_p99_us']:.0f} µs\n"
+        )
+    if meta.get("arquivo"):
+        lines.append(f"  colunas por par em {meta['arquivo']}\n")
+    return lines
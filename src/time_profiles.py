@@ -0,0 +1,254 @@
+import math
+import heapq
+import hashlib
+import time
+import weakref
+import numpy as np
+import pandas as pd
+
+from graph import CompactGraph
+from routing import HaversineHeuristic, heuristic_scale
+
+DAY_MIN = 1440.0
+# granularidade da "faixa de horário" usada no planejamento de pico
+SLOT_MIN = 30
+
+# heurística do A* dependente do horário por grafo/perfis (perfis não mudam depois de criados)
+_TD_HEURISTICS = weakref.WeakKeyDictionary()
+
+
+def parse_time_of_day(t) -> float:
+    """"19:30" -> 1170.0 (minutos desde 00:00); números passam direto."""
+    if isinstance(t, str):
+        h, _, m = t.partition(":")
+        return (int(h) * 60 + float(m or 0)) % DAY_MIN
+    return float(t) % DAY_MIN
+
+
+def time_slot(t=None, slot_min=SLOT_MIN) -> float:
+    """Início da faixa de horário de t (None = agora, pelo relógio local)."""
+    if t is None:
+        now = time.localtime()
+        t = now.tm_hour * 60 + now.tm_min
+    t = parse_time_of_day(t)
+    return float(math.floor(t / slot_min) * slot_min)
+
+
+def format_time_of_day(t) -> str:
+    t = int(round(t)) % int(DAY_MIN)
+    return f"{t // 60:02d}:{t % 60:02d}"
+
+
+class TravelTimeProfiles:
+    """Perfis de tempo de viagem por aresta, lineares por partes ao longo do dia.
+
+    Guardados em CSR, um bloco por aresta não-direcionada (id de graph.edge_ids):
+    - offsets[e]:offsets[e + 1] delimita os pontos da aresta e;
+    - times: minuto do dia de cada ponto (crescente dentro da aresta);
+    - values: tempo de travessia (min) para quem entra na aresta naquele minuto.
+
+    Entre pontos interpola linearmente; o perfil é periódico (23:59 -> 00:00).
+    Exige inclinação >= -1 em todo trecho (propriedade FIFO: sair mais tarde
+    nunca faz chegar antes), o que mantém o A* dependente do tempo exato.
+    """
+
+    def __init__(self, offsets, times, values):
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.times = np.asarray(times, dtype=np.float32)
+        self.values = np.asarray(values, dtype=np.float32)
+        if (self.values < 0).any():
+            raise ValueError("Perfil com tempo de viagem negativo.")
+        bad = self._fifo_violations()
+        if len(bad):
+            raise ValueError(f"Perfis violam FIFO (queda mais rápida que o relógio) nas arestas {bad[:5].tolist()}")
+        self._token = None
+
+    @property
+    def n_edges(self):
+        return len(self.offsets) - 1
+
+    @property
+    def cache_token(self):
+        """Digest do conteúdo (perfis não mudam): o mesmo CSV dá o mesmo token em outro run."""
+        if self._token is None:
+            h = hashlib.sha1()
+            for a in (self.offsets, self.times, self.values):
+                h.update(np.ascontiguousarray(a).tobytes())
+            self._token = h.hexdigest()[:20]
+        return self._token
+
+    def nbytes(self):
+        return self.offsets.nbytes + self.times.nbytes + self.values.nbytes
+
+    def _fifo_violations(self):
+        t = self.times.astype(np.float64)
+        v = self.values.astype(np.float64)
+        if not len(t):
+            return np.empty(0, dtype=np.int64)
+        edge = np.repeat(np.arange(self.n_edges), np.diff(self.offsets))
+        last = self.offsets[1:] - 1
+        # próximo ponto de cada ponto; o último de cada aresta volta ao primeiro (+1 dia)
+        nxt = np.arange(1, len(t) + 1)
+        nxt[last] = self.offsets[:-1]
+        dt = t[nxt] - t
+        dt[last] += DAY_MIN
+        slope = np.divide(v[nxt] - v, dt, out=np.zeros_like(dt), where=dt > 0)
+        return np.unique(edge[slope < -1 - 1e-9])
+
+    def travel_time(self, e, t):
+        """Tempo para atravessar a aresta e entrando no minuto t (qualquer dia)."""
+        a, b = self.offsets[e], self.offsets[e + 1]
+        if b - a == 1:
+            return float(self.values[a])
+        return float(np.interp(t % DAY_MIN, self.times[a:b], self.values[a:b], period=DAY_MIN))
+
+    def at(self, t):
+        """Tempo de todas as arestas no minuto t (vetorizado): array (n_edges,)."""
+        t = parse_time_of_day(t)
+        counts = np.diff(self.offsets)
+        edge = np.repeat(np.arange(self.n_edges), counts)
+        times = self.times.astype(np.float64)
+        # último ponto <= t dentro de cada aresta (chave = aresta * 2 dias + minuto)
+        keys = edge * (2 * DAY_MIN) + times
+        q = np.arange(self.n_edges) * (2 * DAY_MIN) + t
+        lo = np.searchsorted(keys, q, side="right") - 1
+        first, last = self.offsets[:-1], self.offsets[1:] - 1
+        wrap_lo = lo < first
+        lo = np.where(wrap_lo, last, lo)
+        hi = np.where(lo == last, first, lo + 1)
+        t_lo = times[lo] - np.where(wrap_lo, DAY_MIN, 0.0)
+        t_hi = times[hi] + np.where((hi == first) & ~wrap_lo, DAY_MIN, 0.0)
+        span = t_hi - t_lo
+        frac = np.divide(t - t_lo, span, out=np.zeros_like(span), where=span > 0)
+        v = self.values.astype(np.float64)
+        return v[lo] + frac * (v[hi] - v[lo])
+
+    def min_times(self):
+        """Menor tempo de cada aresta ao longo do dia (limite inferior)."""
+        return np.minimum.reduceat(self.values.astype(np.float64), self.offsets[:-1])
+
+
+def profiles_from_frame(g: CompactGraph, df: pd.DataFrame, weight="time_min") -> TravelTimeProfiles:
+    """Monta os perfis a partir de linhas u, v, time_of_day, <weight>.
+
+    Arestas sem linhas no DataFrame ficam constantes, com o peso atual do grafo.
+    """
+    missing = {"u", "v", "time_of_day", weight} - set(df.columns)
+    if missing:
+        raise ValueError(f"Perfis sem as colunas: {sorted(missing)}")
+    m = g.number_of_edges()
+    base = np.empty(m)
+    base[g.edge_ids] = g.weights[weight]
+
+    pos = g.arc_positions(g._as_index(df["u"].to_numpy()), g._as_index(df["v"].to_numpy()))
+    if (pos < 0).any():
+        bad = df.loc[pos < 0, ["u", "v"]].head(5).itertuples(index=False)
+        raise KeyError(f"arestas inexistentes: {[tuple(r) for r in bad]}")
+    e = np.asarray(g.edge_ids)[pos].astype(np.int64)
+    t = np.array([parse_time_of_day(x) for x in df["time_of_day"].tolist()])
+    vals = df[weight].to_numpy(dtype=np.float64)
+
+    const = np.setdiff1d(np.arange(m), e)
+    e = np.concatenate([e, const])
+    t = np.concatenate([t, np.zeros(len(const))])
+    vals = np.concatenate([vals, base[const]])
+
+    # ordena por (aresta, minuto); ponto repetido: vale a última linha
+    order = np.lexsort((np.arange(len(e)), t, e))
+    e, t, vals = e[order], t[order], vals[order]
+    keep = np.ones(len(e), dtype=bool)
+    keep[:-1] = (e[1:] != e[:-1]) | (t[1:] != t[:-1])
+    e, t, vals = e[keep], t[keep], vals[keep]
+
+    offsets = np.zeros(m + 1, dtype=np.int64)
+    np.cumsum(np.bincount(e, minlength=m), out=offsets[1:])
+    return TravelTimeProfiles(offsets, t, vals)
+
+
+def load_profiles(g: CompactGraph, path: str, weight="time_min") -> TravelTimeProfiles:
+    """Lê o CSV de perfis (u, v, time_of_day "HH:MM", time_min)."""
+    df = pd.read_csv(path, dtype={"u": str, "v": str, "time_of_day": str})
+    return profiles_from_frame(g, df, weight)
+
+
+def apply_slot(g: CompactGraph, profiles: TravelTimeProfiles, t=None, weight="time_slot"):
+    """Grava no grafo, como o peso `weight`, os tempos da faixa de horário de t.
+
+    Depois disso qualquer algoritmo estático (clustering, roteiros, buscas)
+    planeja com o trânsito daquela faixa. A troca passa por set_weights
+    (lock e versão do grafo), então os caches derivados são invalidados
+    também na primeira gravação do peso.
+    Retorna o minuto da faixa usada.
+    """
+    slot = time_slot(t)
+    g.set_weights(weight, profiles.at(slot)[np.asarray(g.edge_ids)])
+    return slot
+
+
+def td_heuristic(g: CompactGraph, profiles: TravelTimeProfiles) -> HaversineHeuristic:
+    """Haversine com a escala dos menores tempos do dia (calculada uma vez por perfis)."""
+    per_graph = _TD_HEURISTICS.setdefault(g, weakref.WeakKeyDictionary())
+    h = per_graph.get(profiles)
+    if h is None:
+        lb = profiles.min_times()[np.asarray(g.edge_ids)]
+        h = per_graph[profiles] = HaversineHeuristic(g, scale=heuristic_scale(g, lb))
+    return h
+
+
+def td_astar(g: CompactGraph, s: int, t: int, depart, profiles: TravelTimeProfiles):
+    """A* dependente do horário, por índice.
+
+    O custo de uma aresta depende da hora de chegada ao nó de onde ela sai.
+    Com perfis FIFO, o primeiro rótulo assentado de cada nó é o de chegada
+    mais cedo, como no Dijkstra. A heurística usa o menor tempo de cada aresta
+    no dia inteiro, então continua admissível em qualquer horário.
+
+    Retorna (caminho em índices | None, nós expandidos, minutos de viagem | None).
+    """
+    t0 = parse_time_of_day(depart)
+    h = td_heuristic(g, profiles).to(t)
+
+    indptr, indices, edge_ids = g.indptr, g.indices, g.edge_ids
+    arrival = {s: t0}
+    parent = {s: -1}
+    closed = set()
+    heap = [(t0 + h(s), s)]
+    expanded = 0
+    inf = math.inf
+
+    while heap:
+        _, u = heapq.heappop(heap)
+        if u in closed:
+            continue
+        closed.add(u)
+        expanded += 1
+        if u == t:
+            break
+        au = arrival[u]
+        a, b = indptr[u], indptr[u + 1]
+        for v, e in zip(indices[a:b].tolist(), edge_ids[a:b].tolist()):
+            av = au + profiles.travel_time(e, au)
+            if av < arrival.get(v, inf):
+                arrival[v] = av
+                parent[v] = u
+                heapq.heappush(heap, (av + h(v), v))
+
+    if t not in closed:
+        return None, expanded, None
+    path = []
+    cur = t
+    while cur != -1:
+        path.append(cur)
+        cur = parent[cur]
+    path.reverse()
+    return path, expanded, arrival[t] - t0
+
+
+def td_astar_path(G, start, goal, depart="08:00", profiles=None):
+    """Variante de astar_path com horário de saída: (caminho, nós expandidos, minutos)."""
+    if profiles is None:
+        raise ValueError("td_astar_path precisa dos perfis de tempo (load_profiles).")
+    path, expanded, cost = td_astar(G, G.index[start], G.index[goal], depart, profiles)
+    if path is None:
+        return None, expanded, None
+    return [G.names[i] for i in path], expanded, cost
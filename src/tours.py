@@ -0,0 +1,157 @@
+import time
+import numpy as np
+
+from matrix import distance_matrix
+
+DEFAULT_TIME_BUDGET_S = 0.5
+
+
+def _padded(D, return_to_depot):
+    """Rota com pontas fixas: [depósito, ..., depósito] ou, para rota aberta,
+    [depósito, ..., V] com um nó virtual V de custo zero."""
+    if return_to_depot:
+        return np.asarray(D, dtype=np.float64), 0
+    n = len(D)
+    P = np.zeros((n + 1, n + 1))
+    P[:n, :n] = D
+    return P, n
+
+
+def route_cost(D, route):
+    r = np.asarray(route)
+    return float(D[r[:-1], r[1:]].sum())
+
+
+def nearest_neighbor(D, depot, stops):
+    """Construção gulosa: sempre vai para a parada mais próxima ainda não visitada."""
+    left = list(stops)
+    route = [depot]
+    cur = depot
+    while left:
+        row = D[cur, left]
+        k = int(np.argmin(row))
+        cur = left.pop(k)
+        route.append(cur)
+    return route
+
+
+def two_opt(D, route, deadline):
+    """2-opt (primeira melhora por i, melhor j vetorizado). Pontas ficam fixas.
+
+    Supõe custos simétricos (grafo não-direcionado), então inverter um trecho
+    não muda o custo interno dele.
+    """
+    r = np.asarray(route)
+    improved = False
+    L = len(r)
+    i = 0
+    while i < L - 3:
+        if time.perf_counter() > deadline:
+            break
+        j = np.arange(i + 2, L - 1)
+        delta = D[r[i], r[j]] + D[r[i + 1], r[j + 1]] - D[r[i], r[i + 1]] - D[r[j], r[j + 1]]
+        k = int(np.argmin(delta))
+        if delta[k] < -1e-9:
+            jj = int(j[k])
+            r[i + 1:jj + 1] = r[i + 1:jj + 1][::-1].copy()
+            improved = True
+            continue  # tenta de novo a partir do mesmo i
+        i += 1
+    return r.tolist(), improved
+
+
+def or_opt(D, route, deadline, max_seg=3):
+    """Or-opt: move trechos de 1..max_seg paradas (também invertidos) para a
+    melhor posição da rota."""
+    r = list(route)
+    improved = False
+    for seg in range(1, max_seg + 1):
+        i = 1
+        while i + seg < len(r):
+            if time.perf_counter() > deadline:
+                return r, improved
+            s0, s1 = r[i], r[i + seg - 1]
+            p, q = r[i - 1], r[i + seg]
+            gain = D[p, s0] + D[s1, q] - D[p, q]
+
+            rest = r[:i] + r[i + seg:]
+            a = np.asarray(rest[:-1])
+            b = np.asarray(rest[1:])
+            base = D[a, b]
+            fwd = D[a, s0] + D[s1, b] - base
+            rev = D[a, s1] + D[s0, b] - base
+            add = np.minimum(fwd, rev)
+            k = int(np.argmin(add))
+            if add[k] < gain - 1e-9:
+                piece = r[i:i + seg]
+                if rev[k] < fwd[k]:
+                    piece = piece[::-1]
+                r = rest[:k + 1] + piece + rest[k + 1:]
+                improved = True
+                continue
+            i += 1
+    return r, improved
+
+
+def optimize_tour(D, depot=0, stops=None, time_budget_s=DEFAULT_TIME_BUDGET_S, return_to_depot=True):
+    """Vizinho mais próximo + 2-opt/Or-opt até não melhorar ou estourar o tempo.
+
+    D é a matriz de tempos (posições), depot a posição do restaurante e stops
+    as posições das paradas. Retorna (ordem das paradas, custo total).
+    """
+    deadline = time.perf_counter() + time_budget_s
+    D = np.asarray(D, dtype=np.float64)
+    if stops is None:
+        stops = [i for i in range(len(D)) if i != depot]
+    stops = list(stops)
+    if not stops:
+        return [], 0.0
+
+    P, end = _padded(D, return_to_depot)
+    route = nearest_neighbor(P, depot, stops) + [end]
+
+    while time.perf_counter() < deadline:
+        route, a = two_opt(P, route, deadline)
+        route, b = or_opt(P, route, deadline)
+        if not (a or b):
+            break
+    return route[1:-1], route_cost(P, route)
+
+
+def plan_courier_tours(G, deliveries, depot_node, cluster_col="cluster", weight="time_min",
+                       time_budget_s=DEFAULT_TIME_BUDGET_S, return_to_depot=True, workers=None):
+    """Ordem de visita por entregador (um por cluster) sobre a matriz de tempos da rede.
+
+    workers vai para matrix.distance_matrix (1 = serial, p.ex. dentro de um worker).
+
+    Retorna lista de dicts: entregador, pedidos (order_id na ordem), nos, total_min.
+    """
+    df = deliveries
+    if cluster_col not in df.columns:
+        df = df.assign(**{cluster_col: 0})
+
+    nodes = [depot_node] + sorted(set(df["node"]) - {depot_node})
+    pos = {n: i for i, n in enumerate(nodes)}
+    D = distance_matrix(G, nodes, nodes, weight, workers=workers)
+
+    tours = []
+    clusters = sorted(df[cluster_col].unique())
+    budget = time_budget_s / max(len(clusters), 1)
+    for c in clusters:
+        part = df[df[cluster_col] == c]
+        # pedidos no mesmo nó viram uma parada só
+        stops = sorted({pos[n] for n in part["node"]} - {0})
+        order, total = optimize_tour(D, 0, stops, budget, return_to_depot)
+
+        by_node = part.groupby("node", sort=False, observed=True)["order_id"].apply(list)
+        seq = [nodes[i] for i in order]
+        order_ids = [o for n in seq for o in by_node.get(n, [])]
+        # pedidos no próprio restaurante saem primeiro
+        order_ids = by_node.get(depot_node, []) + order_ids
+        tours.append({
+            "entregador": int(c),
+            "pedidos": order_ids,
+            "nos": [depot_node] + seq + ([depot_node] if return_to_depot else []),
+            "total_min": total,
+        })
+    return tours
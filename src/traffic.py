@@ -0,0 +1,30 @@
+import pandas as pd
+
+from graph import CompactGraph
+
+FEED_CHUNKSIZE = 10_000
+
+
+def read_traffic_feed(path, chunksize=FEED_CHUNKSIZE):
+    """Lê o feed de trânsito (CSV u,v,<peso>) em blocos, sem carregar tudo."""
+    return pd.read_csv(path, chunksize=chunksize)
+
+
+def apply_traffic_updates(g: CompactGraph, updates, weight="time_min"):
+    """Aplica um lote de novos pesos (DataFrame ou caminho de CSV com u, v, weight).
+
+    Atualiza o grafo no lugar (sem reconstruir) e devolve o dict de
+    atualização do grafo; caches ligados ao grafo invalidam só o necessário.
+    """
+    df = updates if isinstance(updates, pd.DataFrame) else pd.read_csv(updates)
+    missing = {"u", "v", weight} - set(df.columns)
+    if missing:
+        raise ValueError(f"Feed de trânsito sem as colunas: {sorted(missing)}")
+    # a última leitura de cada aresta no lote é a que vale
+    df = df.drop_duplicates(subset=["u", "v"], keep="last")
+    return g.update_edge_weights(df["u"].to_numpy(), df["v"].to_numpy(), df[weight].to_numpy(), weight)
+
+
+def apply_traffic_feed(g: CompactGraph, path, weight="time_min", chunksize=FEED_CHUNKSIZE):
+    """Aplica um arquivo de feed bloco a bloco; retorna a lista de atualizações."""
+    return [apply_traffic_updates(g, chunk, weight) for chunk in read_traffic_feed(path, chunksize)]
@@ -1,40 +1,354 @@
 import os
-import matplotlib.pyplot as plt
-import networkx as nx
-
-def draw_graph(G, out_path):
-    os.makedirs(os.path.dirname(out_path), exist_ok=True)
-    plt.figure(figsize=(8, 6))
-    pos = {n: G.nodes[n]["pos"] for n in G.nodes}
-    nx.draw(G, pos, with_labels=True, node_size=900, font_size=8)
-    plt.title("Grafo da cidade (bairros e ruas)")
-    plt.tight_layout()
-    plt.savefig(out_path, dpi=180)
-    plt.close()
-
-def draw_clusters(deliveries_df, out_path):
-    os.makedirs(os.path.dirname(out_path), exist_ok=True)
-    plt.figure(figsize=(7, 6))
-    plt.scatter(deliveries_df["lon"], deliveries_df["lat"], c=deliveries_df["cluster"])
-    plt.title("Clusters de entregas (K-Means)")
-    plt.xlabel("Longitude")
-    plt.ylabel("Latitude")
-    plt.tight_layout()
-    plt.savefig(out_path, dpi=180)
-    plt.close()
-
-def draw_route(G, path, out_path):
-    os.makedirs(os.path.dirname(out_path), exist_ok=True)
-    plt.figure(figsize=(8, 6))
-    pos = {n: G.nodes[n]["pos"] for n in G.nodes}
-    nx.draw(G, pos, with_labels=True, node_size=900, font_size=8, alpha=0.5)
-
-    if path and len(path) >= 2:
-        edges = list(zip(path[:-1], path[1:]))
-        nx.draw_networkx_edges(G, pos, edgelist=edges, width=3)
-        nx.draw_networkx_nodes(G, pos, nodelist=path, node_size=1100)
-
-    plt.title("Rota destacada")
-    plt.tight_layout()
-    plt.savefig(out_path, dpi=180)
-    plt.close()
+import time
+import hashlib
+import weakref
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+import numpy as np
+
+from matrix import pool_context
+
+# matplotlib e networkx só são importados ao desenhar (nos workers, quando há pool),
+# então importar este módulo não pesa no início do run nem no modo --no-render
+
+FIGSIZE = (8, 6)
+DPI = 180
+# área do mapa na figura (fração), fixa: o overlay cai pixel a pixel sobre a camada base
+MAP_RECT = (0.03, 0.03, 0.94, 0.88)
+MARGIN = 0.08
+RENDER_CACHE = "data/.cache/render"
+RENDER_WORKERS = 3
+
+# camada base já renderizada neste processo: {chave: RGBA uint8}
+_BASE = {}
+_BASE_MAX = 4
+# layout (posições, arestas, chave) por grafo
+_LAYOUTS = weakref.WeakKeyDictionary()
+
+
+# ---------------- camada base ----------------
+def map_layout(G):
+    """Geometria do mapa: posições, arestas, limites e chave da camada base.
+
+    G pode ser o CompactGraph (sem passar pelo networkx) ou um nx.Graph com o
+    atributo "pos" nos nós. A chave é um hash das posições e arestas (e do tamanho/dpi da figura). A
+    camada base não desenha pesos, então atualizações de trânsito não a
+    invalidam; muda de chave só se a rede mudar. O dict é pequeno e
+    serializável, é ele que vai para os workers (não o grafo).
+    """
+    lay = _LAYOUTS.get(G)
+    if lay is not None:
+        return lay
+    pos, edges = _geometry(G)
+    # ordem canônica: o mesmo grafo dá a mesma chave vindo do CompactGraph ou do networkx
+    edges = sorted((min(u, v), max(u, v)) for u, v in edges)
+    h = hashlib.sha1(f"{FIGSIZE}|{DPI}|{MAP_RECT}\n".encode())
+    for n, (x, y) in pos.items():
+        h.update(f"{n}\0{x!r}\0{y!r}\n".encode())
+    for u, v in edges:
+        h.update(f"{u}\0{v}\n".encode())
+
+    xy = np.array(list(pos.values()), dtype=np.float64).reshape(-1, 2)
+    if len(xy):
+        lo, hi = xy.min(axis=0), xy.max(axis=0)
+    else:
+        lo, hi = np.zeros(2), np.ones(2)
+    pad = np.maximum((hi - lo) * MARGIN, 1e-3)
+    lay = {
+        "key": h.hexdigest()[:16],
+        "pos": pos,
+        "edges": edges,
+        "xlim": (float(lo[0] - pad[0]), float(hi[0] + pad[0])),
+        "ylim": (float(lo[1] - pad[1]), float(hi[1] + pad[1])),
+    }
+    _LAYOUTS[G] = lay
+    return lay
+
+
+def _geometry(G):
+    if hasattr(G, "indptr"):
+        lat, lon = np.asarray(G.lat), np.asarray(G.lon)
+        ok = ~(np.isnan(lat) | np.isnan(lon))
+        pos = {G.names[i]: (float(lon[i]), float(lat[i])) for i in np.flatnonzero(ok).tolist()}
+        # cada aresta uma vez
+        src, dst = G.sources(), np.asarray(G.indices)
+        keep = np.flatnonzero((src <= dst) & ok[src] & ok[dst])
+        edges = [(G.names[u], G.names[v]) for u, v in zip(src[keep].tolist(), dst[keep].tolist())]
+        return pos, edges
+    pos = {n: tuple(G.nodes[n]["pos"]) for n in G.nodes if "pos" in G.nodes[n]}
+    edges = [(u, v) for u, v in G.edges if u in pos and v in pos]
+    return pos, edges
+
+
+def _figure():
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=FIGSIZE, dpi=DPI)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def _map_axes(fig, lay):
+    ax = fig.add_axes(MAP_RECT)
+    ax.set_axis_off()
+    ax.set_xlim(*lay["xlim"])
+    ax.set_ylim(*lay["ylim"])
+    return ax
+
+
+def _render_base(lay):
+    import networkx as nx
+
+    fig = _figure()
+    ax = _map_axes(fig, lay)
+    g = nx.Graph()
+    g.add_nodes_from(lay["pos"])
+    g.add_edges_from(lay["edges"])
+    nx.draw(g, lay["pos"], ax=ax, with_labels=True, node_size=900, font_size=8)
+    ax.set_xlim(*lay["xlim"])
+    ax.set_ylim(*lay["ylim"])
+    fig.canvas.draw()
+    return np.asarray(fig.canvas.buffer_rgba()).copy()
+
+
+def base_layer(lay, cache_dir=None):
+    """RGBA da rede inteira (nós, ruas, nomes), renderizada uma vez por chave.
+
+    Fica em memória no processo e, com cache_dir, num PNG reaproveitado entre
+    execuções. A escrita é atômica, então dois workers que a desenhem ao mesmo
+    tempo (cache frio) não deixam arquivo pela metade.
+    """
+    import matplotlib.image as mpimg
+
+    key = lay["key"]
+    img = _BASE.get(key)
+    if img is not None:
+        return img
+    path = os.path.join(cache_dir, f"base_{key}.png") if cache_dir else None
+    if path and os.path.exists(path):
+        img = mpimg.imread(path)
+        if img.dtype != np.uint8:
+            img = (img * 255).round().astype(np.uint8)
+    else:
+        img = _render_base(lay)
+        if path:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            mpimg.imsave(tmp, img, format="png")
+            os.replace(tmp, path)
+    if len(_BASE) >= _BASE_MAX:
+        _BASE.pop(next(iter(_BASE)))
+    _BASE[key] = img
+    return img
+
+
+def _compose(lay, title, cache_dir, alpha=1.0):
+    """Figura com a camada base (opcionalmente esmaecida) e eixos alinhados para o overlay."""
+    fig = _figure()
+    fig.figimage(base_layer(lay, cache_dir), alpha=alpha, origin="upper")
+    ax = _map_axes(fig, lay)
+    fig.suptitle(title)
+    return fig, ax
+
+
+def _save(fig, out_path):
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    fig.savefig(out_path, dpi=DPI)
+
+
+# ---------------- figuras (rodam no processo atual ou num worker) ----------------
+def _timed(name, out_path, fn, *args):
+    t0, c0 = time.perf_counter(), time.process_time()
+    fn(*args)
+    return {
+        "stage": name,
+        "arquivo": out_path,
+        "wall_ms": (time.perf_counter() - t0) * 1000,
+        "cpu_ms": (time.process_time() - c0) * 1000,
+        "pid": os.getpid(),
+    }
+
+
+def _graph_figure(lay, out_path, cache_dir):
+    fig, _ = _compose(lay, "Grafo da cidade (bairros e ruas)", cache_dir)
+    _save(fig, out_path)
+
+
+def _route_figure(lay, path, out_path, cache_dir):
+    import networkx as nx
+
+    fig, ax = _compose(lay, "Rota destacada", cache_dir, alpha=0.5)
+    pos = lay["pos"]
+    if path and len(path) >= 2 and all(n in pos for n in path):
+        g = nx.path_graph(path)
+        nx.draw_networkx_edges(g, pos, ax=ax, width=3)
+        nx.draw_networkx_nodes(g, pos, ax=ax, node_size=1100)
+        nx.draw_networkx_labels(g, pos, ax=ax, font_size=8)
+        ax.set_axis_off()
+        ax.set_xlim(*lay["xlim"])
+        ax.set_ylim(*lay["ylim"])
+    _save(fig, out_path)
+
+
+def _clusters_figure(lon, lat, cluster, out_path, lay, cache_dir):
+    title = "Clusters de entregas (K-Means)"
+    if lay is None:
+        fig = _figure()
+        ax = fig.add_subplot()
+        ax.scatter(lon, lat, c=cluster)
+        ax.set_title(title)
+        ax.set_xlabel("Longitude")
+        ax.set_ylabel("Latitude")
+        fig.tight_layout()
+    else:
+        # pedidos sobre o mapa esmaecido; fora dos limites da rede ainda aparecem na margem
+        fig, ax = _compose(lay, title, cache_dir, alpha=0.35)
+        ax.scatter(lon, lat, c=cluster, s=60, edgecolors="black", linewidths=0.5, zorder=3, clip_on=False)
+    _save(fig, out_path)
+
+
+def _isochrones_figure(lay, faixa, limites, origem, out_path, cache_dir):
+    fig, ax = _compose(lay, f"Isócronas a partir de {origem}", cache_dir, alpha=0.35)
+    pos = lay["pos"]
+    colors = ("tab:green", "tab:olive", "tab:orange", "tab:red", "tab:purple")
+    lo = 0
+    for i, hi in enumerate(list(limites) + [None]):
+        nodes = [n for n, b in faixa.items() if b == i and n in pos]
+        label = f"{lo}-{hi} min" if hi is not None else f"> {lo} min"
+        color = colors[i] if hi is not None and i < len(colors) else "lightgray"
+        if nodes:
+            xy = np.array([pos[n] for n in nodes])
+            ax.scatter(xy[:, 0], xy[:, 1], s=900, c=color, alpha=0.8, edgecolors="black", linewidths=0.5,
+                       zorder=3, label=label)
+        lo = hi
+    if origem in pos:
+        ax.scatter(*pos[origem], s=300, marker="*", c="black", zorder=4, label=origem)
+    for n, (x, y) in pos.items():
+        ax.text(x, y, n, fontsize=8, ha="center", va="center", zorder=5)
+    ax.legend(loc="lower right", fontsize=7, markerscale=0.3)
+    ax.set_axis_off()
+    ax.set_xlim(*lay["xlim"])
+    ax.set_ylim(*lay["ylim"])
+    _save(fig, out_path)
+
+
+def _isochrone_args(G, iso):
+    faixa = dict(zip(G.names, iso["faixa"].tolist()))
+    return map_layout(G), faixa, iso["limites"], iso["origem"]
+
+
+def _cluster_columns(deliveries_df):
+    return (
+        deliveries_df["lon"].to_numpy(dtype=np.float64),
+        deliveries_df["lat"].to_numpy(dtype=np.float64),
+        deliveries_df["cluster"].to_numpy(),
+    )
+
+
+def draw_graph(G, out_path, cache_dir=RENDER_CACHE):
+    return _timed("draw_graph", out_path, _graph_figure, map_layout(G), out_path, cache_dir)
+
+
+def draw_clusters(deliveries_df, out_path, G=None, cache_dir=RENDER_CACHE):
+    lay = map_layout(G) if G is not None else None
+    return _timed("draw_clusters", out_path, _clusters_figure, *_cluster_columns(deliveries_df), out_path, lay, cache_dir)
+
+
+def draw_route(G, path, out_path, cache_dir=RENDER_CACHE):
+    return _timed("draw_route", out_path, _route_figure, map_layout(G), list(path or []), out_path, cache_dir)
+
+
+def draw_isochrones(G, iso, out_path, cache_dir=RENDER_CACHE):
+    """Nós coloridos pela faixa de tempo de isochrones.isochrones(G, ...)."""
+    return _timed("draw_isochrones", out_path, _isochrones_figure, *_isochrone_args(G, iso), out_path, cache_dir)
+
+
+# ---------------- renderização em paralelo ----------------
+def _init_worker():
+    import matplotlib
+
+    matplotlib.use("Agg")
+
+
+class Renderer:
+    """Renderiza as figuras em processos separados (backend Agg), sem travar o run.
+
+    graph/route/clusters devolvem um Future com as medidas da figura (stage,
+    arquivo, wall_ms, cpu_ms, pid); wait() espera todas as pendentes. Os
+    workers mantêm a camada base em memória entre figuras e runs (a interface
+    reusa o mesmo Renderer). Com cache frio, mais de um worker pode desenhar a
+    base ao mesmo tempo; custa CPU, não tempo de parede, e só acontece uma vez
+    por rede.
+
+    workers <= 1 renderiza no próprio processo, na chamada (uma figura por
+    vez, mesmo chamado de várias threads: o matplotlib não é thread-safe).
+    """
+
+    def __init__(self, workers=RENDER_WORKERS, cache_dir=RENDER_CACHE):
+        self.workers = max(1, min(workers, os.cpu_count() or 1))
+        self.cache_dir = cache_dir
+        self.pending = []
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _submit(self, name, out_path, fn, *args):
+        if self.workers <= 1:
+            fut = Future()
+            try:
+                with self._lock:
+                    fut.set_result(_timed(name, out_path, fn, *args))
+            except Exception as e:
+                fut.set_exception(e)
+        else:
+            if self._executor is None:
+                # o primeiro submit costuma vir de uma thread do pipeline: nada de fork
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=pool_context(),
+                                                     initializer=_init_worker)
+            fut = self._executor.submit(_timed, name, out_path, fn, *args)
+        self.pending.append(fut)
+        return fut
+
+    def graph(self, G, out_path):
+        return self._submit("draw_graph", out_path, _graph_figure, map_layout(G), out_path, self.cache_dir)
+
+    def route(self, G, path, out_path):
+        return self._submit(
+            "draw_route", out_path, _route_figure, map_layout(G), list(path or []), out_path, self.cache_dir
+        )
+
+    def isochrones(self, G, iso, out_path):
+        return self._submit("draw_isochrones", out_path, _isochrones_figure, *_isochrone_args(G, iso), out_path,
+                            self.cache_dir)
+
+    def clusters(self, deliveries_df, out_path, G=None):
+        lay = map_layout(G) if G is not None else None
+        return self._submit(
+            "draw_clusters", out_path, _clusters_figure, *_cluster_columns(deliveries_df), out_path, lay, self.cache_dir
+        )
+
+    def wait(self):
+        """Espera as figuras pendentes; devolve as medidas de cada uma (erro de uma sobe aqui)."""
+        pending, self.pending = self.pending, []
+        return [f.result() for f in pending]
+
+    def cancel(self):
+        """Descarta as figuras pendentes: as que ainda não começaram nem rodam, e
+        nenhuma entra no próximo wait()."""
+        pending, self.pending = self.pending, []
+        for f in pending:
+            f.cancel()
+
+    def close(self):
+        try:
+            self.wait()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
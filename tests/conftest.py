@@ -0,0 +1,45 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DATA = os.path.join(ROOT, "data")
+# os módulos do projeto se importam pelo nome (como em python src/main.py)
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from graph import load_compact_graph  # noqa: E402
+
+
+@pytest.fixture
+def graph():
+    """Rede de exemplo do repositório (10 bairros), nova a cada teste."""
+    return load_compact_graph(os.path.join(DATA, "nodes.csv"), os.path.join(DATA, "edges.csv"))
+
+
+def random_graph(seed, n=24, extra=30, isolated=True):
+    """Grafo aleatório pequeno: árvore geradora + arestas extras, coordenadas
+    perto do centro de SP e tempos com velocidades variadas. Com isolated, o
+    último nó fica sem arestas (pares sem caminho)."""
+    import numpy as np
+    from graph import graph_from_arrays
+    from routing import haversine_km
+
+    rng = np.random.default_rng(seed)
+    lat = -23.55 + rng.uniform(-0.05, 0.05, n)
+    lon = -46.63 + rng.uniform(-0.05, 0.05, n)
+    m = n - 1 if isolated else n
+    edges = {(int(rng.integers(0, v)), v) for v in range(1, m)}
+    total = min(m - 1 + extra, m * (m - 1) // 2)
+    while len(edges) < total:
+        a, b = sorted(rng.choice(m, 2, replace=False).tolist())
+        edges.add((a, b))
+    u, v = np.array(sorted(edges)).T
+    km = haversine_km(lat[u], lon[u], lat[v], lon[v]) * rng.uniform(1.0, 1.6, len(u))
+    minutes = km / rng.uniform(0.2, 0.8, len(u))
+    return graph_from_arrays([f"n{i}" for i in range(n)], lat, lon, u, v, {"dist_km": km, "time_min": minutes})
+
+
+@pytest.fixture(params=range(5))
+def rgraph(request):
+    return random_graph(request.param)
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from clustering import StreamingClusterer, balanced_clusters, capacitated_assign
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_capacitated_assign_respects_capacity(seed):
+    rng = np.random.default_rng(seed)
+    n, k = int(rng.integers(5, 60)), int(rng.integers(1, 6))
+    cost = rng.uniform(0, 10, (n, k))
+    capacity = rng.integers(1, n, k)
+    capacity[0] += max(0, n - capacity.sum())
+    assigned = capacitated_assign(cost, capacity)
+    assert (assigned >= 0).all()
+    assert (np.bincount(assigned, minlength=k) <= capacity).all()
+
+
+def test_capacitated_assign_without_pressure_is_argmin():
+    cost = np.random.default_rng(0).uniform(0, 10, (40, 4))
+    np.testing.assert_array_equal(capacitated_assign(cost, 40), cost.argmin(axis=1))
+
+
+def test_capacitated_assign_uses_regret():
+    # os dois preferem o cluster 0 (uma vaga): fica quem perde mais indo para o 1
+    cost = np.array([[1.0, 2.0], [1.0, 9.0]])
+    np.testing.assert_array_equal(capacitated_assign(cost, [1, 1]), [1, 0])
+
+
+def test_capacitated_assign_infeasible():
+    with pytest.raises(ValueError):
+        capacitated_assign(np.zeros((5, 2)), [2, 2])
+
+
+def test_streaming_first_fit_returns_buffered_orders():
+    clf = StreamingClusterer(k=3)
+    first = clf.add_orders(pd.DataFrame({"lat": [-23.55, -23.56], "lon": [-46.63, -46.64]}))
+    assert (first["cluster"] == -1).all()
+    second = clf.add_orders(pd.DataFrame({"lat": [-23.57, -23.54], "lon": [-46.62, -46.66]}))
+    assert len(second) == 4 and (second["cluster"] >= 0).all()
+    assert len(clf.add_orders(pd.DataFrame({"lat": [-23.575], "lon": [-46.64]}))) == 1
+
+
+def test_balanced_clusters_without_orders(graph, tmp_path):
+    empty = pd.DataFrame({"order_id": [], "node": [], "lat": [], "lon": []})
+    out = str(tmp_path / "clusters.csv")
+    for g in (None, graph):
+        df = balanced_clusters(empty, k=3, out_csv=out, graph=g)
+        assert len(df) == 0 and "cluster" in df.columns
+        assert "cluster" not in empty.columns
+    assert pd.read_csv(out).columns.tolist() == ["order_id", "node", "lat", "lon", "cluster"]
+    with pytest.raises(ValueError, match="k=0"):
+        balanced_clusters(empty, k=0, out_csv=None)
+
+
+def test_streaming_refit_restarts_model_from_window():
+    rng = np.random.default_rng(0)
+    clf = StreamingClusterer(k=3, drift_km=1e9, window=300)
+    for i in range(6):
+        clf.add_orders(pd.DataFrame({"lat": -23.55 + 0.004 * i + rng.normal(0, 0.01, 100),
+                                     "lon": -46.63 + rng.normal(0, 0.01, 100)}))
+    old_model, before = clf.model, clf.model.cluster_centers_.copy()
+    assert clf.drift() > 0 and clf.refits == 0
+    clf.refit()
+    assert clf.model is not old_model and clf.refits == 1
+    # modelo novo ajustado só pela API (partial_fit na janela), partindo dos centros do K-Means
+    assert clf.model.n_steps_ == 1
+    assert clf.drift() == 0.0
+    # mesmos centros (e números) do K-Means na janela partindo dos centros anteriores
+    from sklearn.cluster import KMeans
+
+    km = KMeans(n_clusters=3, init=before, n_init=1, random_state=42).fit(clf._recent)
+    np.testing.assert_allclose(clf.model.cluster_centers_, km.cluster_centers_, atol=1e-6)
+    out = clf.add_orders(pd.DataFrame({"lat": [-23.53], "lon": [-46.63]}))
+    assert 0 <= out["cluster"].iloc[0] < 3
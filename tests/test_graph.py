@@ -0,0 +1,102 @@
+import os
+import shutil
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import DATA
+from graph import graph_from_arrays, load_compact_graph, load_graph, save_snapshot, source_hash
+
+NODES, EDGES = os.path.join(DATA, "nodes.csv"), os.path.join(DATA, "edges.csv")
+
+
+def networkx_reference(nodes_csv, edges_csv):
+    """Loader original (iterrows + nx.Graph), antes do CompactGraph."""
+    nodes = pd.read_csv(nodes_csv)
+    edges = pd.read_csv(edges_csv)
+    G = nx.Graph()
+    for _, r in nodes.iterrows():
+        G.add_node(r["node"], lat=float(r["lat"]), lon=float(r["lon"]), pos=(float(r["lon"]), float(r["lat"])))
+    for _, e in edges.iterrows():
+        G.add_edge(e["u"], e["v"], dist_km=float(e["dist_km"]), time_min=float(e["time_min"]))
+    return G
+
+
+def assert_same_graph(G, ref):
+    assert list(G.nodes(data=True)) == list(ref.nodes(data=True))
+    assert list(G.edges(data=True)) == list(ref.edges(data=True))
+    # ordem dos vizinhos decide empates das buscas
+    assert {n: list(G.adj[n]) for n in G} == {n: list(ref.adj[n]) for n in ref}
+
+
+@pytest.fixture
+def tricky_csvs(tmp_path):
+    """Nó repetido, nó só em edges.csv, aresta repetida (invertida) e laço."""
+    nodes = tmp_path / "nodes.csv"
+    edges = tmp_path / "edges.csv"
+    nodes.write_text("node,lat,lon\nA,-23.50,-46.60\nB,-23.51,-46.61\nA,-23.52,-46.62\nC,-23.53,-46.63\n")
+    edges.write_text("u,v,dist_km,time_min\nA,B,1.0,3\nB,C,2.0,5\nC,D,0.5,2\nB,A,1.5,4\nC,C,0.1,1\n")
+    return str(nodes), str(edges)
+
+
+def test_to_networkx_matches_old_loader():
+    assert_same_graph(load_compact_graph(NODES, EDGES).to_networkx(), networkx_reference(NODES, EDGES))
+
+
+def test_to_networkx_matches_old_loader_on_edge_cases(tricky_csvs):
+    assert_same_graph(load_compact_graph(*tricky_csvs).to_networkx(), networkx_reference(*tricky_csvs))
+
+
+def test_graph_from_arrays_matches_csv_loader():
+    g = load_compact_graph(NODES, EDGES)
+    edges = pd.read_csv(EDGES)
+    u = [g.index[n] for n in edges["u"]]
+    v = [g.index[n] for n in edges["v"]]
+    h = graph_from_arrays(g.names, g.lat, g.lon, u, v, {k: edges[k].to_numpy(np.float64) for k in g.weights})
+    assert_same_graph(h.to_networkx(), networkx_reference(NODES, EDGES))
+
+
+def test_snapshot_round_trip_is_mmapped(tmp_path):
+    cache = str(tmp_path / "graph")
+    built = load_graph(NODES, EDGES, cache_dir=cache)
+    again = load_graph(NODES, EDGES, cache_dir=cache)
+    ref = load_compact_graph(NODES, EDGES)
+    for g in (built, again):
+        assert g.source_hash == source_hash(NODES, EDGES)
+        assert g.snapshot_dir == os.path.abspath(cache)
+        assert isinstance(g.indices, np.memmap) and isinstance(g.weights["time_min"], np.memmap)
+        assert g.names == ref.names
+        for a, b in [(g.indptr, ref.indptr), (g.indices, ref.indices), (g.edge_ids, ref.edge_ids),
+                     (g.lat, ref.lat), (g.lon, ref.lon)]:
+            np.testing.assert_array_equal(a, b)
+        for k in ref.weights:
+            np.testing.assert_array_equal(g.weights[k], ref.weights[k])
+    assert_same_graph(again.to_networkx(), networkx_reference(NODES, EDGES))
+
+
+def test_snapshot_rebuilt_when_csv_changes(tmp_path):
+    nodes, edges = str(tmp_path / "nodes.csv"), str(tmp_path / "edges.csv")
+    shutil.copy(NODES, nodes)
+    shutil.copy(EDGES, edges)
+    cache = str(tmp_path / "graph")
+    old = load_graph(nodes, edges, cache_dir=cache)
+    before = old.edges["Centro", "Bela Vista"]["time_min"]
+
+    df = pd.read_csv(edges)
+    df.loc[(df["u"] == "Centro") & (df["v"] == "Bela Vista"), "time_min"] = before + 7
+    df.to_csv(edges, index=False)
+    new = load_graph(nodes, edges, cache_dir=cache)
+    assert new.source_hash == source_hash(nodes, edges) != old.source_hash
+    assert new.edges["Centro", "Bela Vista"]["time_min"] == before + 7
+
+
+def test_stale_snapshot_is_not_reused(tmp_path):
+    cache = str(tmp_path / "graph")
+    # snapshot com pesos diferentes e hash de outros CSVs: relê os CSVs e regrava
+    other = load_compact_graph(NODES, EDGES)
+    other.update_edge_weights(["Centro"], ["Bela Vista"], [99.0])
+    save_snapshot(other, cache, "hash-antigo")
+    g = load_graph(NODES, EDGES, cache_dir=cache)
+    assert g.edges["Centro", "Bela Vista"]["time_min"] == 10.0
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from isochrones import eta_path, get_tree, isochrones
+from metrics import path_cost
+from routing import dijkstra_all, shortest_path_tree, tree_path
+
+
+@pytest.mark.parametrize("weight", ["time_min", "dist_km"])
+def test_tree_matches_dijkstra(rgraph, weight):
+    g = rgraph
+    for s in range(len(g.names)):
+        ref = dijkstra_all(g, s, weight)
+        dist, pred = shortest_path_tree(g, s, weight)
+        np.testing.assert_allclose(dist, ref)
+        for t in range(len(g.names)):
+            path = tree_path(dist, pred, t)
+            if np.isinf(ref[t]):
+                assert path is None and pred[t] == -1
+                continue
+            assert path[0] == s and path[-1] == t
+            assert path_cost(g, [g.names[i] for i in path], weight) == pytest.approx(ref[t])
+
+
+def test_tree_cutoff(rgraph):
+    g = rgraph
+    ref = dijkstra_all(g, 0, "time_min")
+    cutoff = float(np.median(ref[np.isfinite(ref)]))
+    dist, pred = shortest_path_tree(g, 0, "time_min", cutoff)
+    np.testing.assert_allclose(dist, np.where(ref <= cutoff, ref, np.inf))
+    assert (pred[np.isinf(dist)] == -1).all()
+
+
+def test_isochrone_bands_match_distances(rgraph):
+    g = rgraph
+    ref = dijkstra_all(g, 0, "time_min")
+    finite = np.sort(ref[np.isfinite(ref)])
+    # uma faixa termina exatamente na distância de um nó (limite incluso)
+    bands = (float(finite[len(finite) // 2]), float(finite[len(finite) // 4]) + 0.5, float(finite[-2]))
+    iso = isochrones(g, g.names[0], bands)
+    limits = sorted(bands)
+    assert iso["limites"] == tuple(limits)
+    for i, d in enumerate(ref.tolist()):
+        expected = next((b for b, hi in enumerate(limits) if d <= hi), len(limits))
+        assert iso["faixa"][i] == expected
+        if expected < len(limits):
+            assert g.names[i] in iso["nos"][expected] and iso["tempo_min"][i] == pytest.approx(d)
+        else:
+            assert g.names[i] in iso["fora"] and np.isinf(iso["tempo_min"][i])
+    assert sum(map(len, iso["nos"])) + len(iso["fora"]) == len(g.names)
+
+
+def test_eta_path_and_tree_cache(rgraph):
+    g = rgraph
+    ref = dijkstra_all(g, 0, "time_min")
+    top = float(np.nanmax(np.where(np.isfinite(ref), ref, np.nan)))
+    for t in range(len(g.names)):
+        path, minutes = eta_path(g, g.names[0], g.names[t], bands=(top,))
+        if np.isinf(ref[t]):
+            assert path is None and minutes is None
+        else:
+            assert minutes == pytest.approx(ref[t]) and path_cost(g, path, "time_min") == pytest.approx(ref[t])
+
+    dist, _ = get_tree(g, 0)
+    assert get_tree(g, 0)[0] is dist
+    u = int(g.indices[g.indptr[0]])
+    g.update_edge_weights([g.names[0]], [g.names[u]], [0.01])
+    np.testing.assert_allclose(get_tree(g, 0)[0], dijkstra_all(g, 0, "time_min"))
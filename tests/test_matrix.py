@@ -0,0 +1,40 @@
+import threading
+
+import numpy as np
+
+from matrix import PARALLEL_MIN_SOURCES, distance_matrix
+from routing import dijkstra_all
+
+
+def reference(g, sources, targets, weight="time_min"):
+    return np.array([dijkstra_all(g, g.index[s], weight)[[g.index[t] for t in targets]] for s in sources])
+
+
+def test_matrix_matches_dijkstra(rgraph):
+    names = rgraph.names
+    out = distance_matrix(rgraph, names, names[::2], workers=1, use_cache=False)
+    np.testing.assert_allclose(out, reference(rgraph, names, names[::2]))
+
+
+def test_matrix_cache_follows_weight_updates(rgraph):
+    g = rgraph
+    names = g.names
+    first = distance_matrix(g, names, names, workers=1)
+    assert distance_matrix(g, names, names, workers=1) is first
+    src = g.sources()
+    once = np.flatnonzero(src < g.indices)[::4]
+    g.update_edge_weights(src[once], g.indices[once], g.weights["time_min"][once] * 0.5)
+    again = distance_matrix(g, names, names, workers=1)
+    assert again is not first
+    np.testing.assert_allclose(again, reference(g, names, names))
+
+
+def test_parallel_rows_from_thread(graph):
+    # pool de processos aberto de dentro de uma thread, como nos estágios do pipeline
+    sources = graph.names * (PARALLEL_MIN_SOURCES // len(graph.names) + 1)
+    out = {}
+    th = threading.Thread(target=lambda: out.update(m=distance_matrix(graph, sources, graph.names, workers=2,
+                                                                      use_cache=False)))
+    th.start()
+    th.join(timeout=120)
+    np.testing.assert_allclose(out["m"], reference(graph, sources, graph.names))
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from orders import read_orders, validate_orders
+
+CSV = """order_id,node,lat,lon
+A,Centro,,
+B,,-23.5700,-46.6400
+C,Atlantida,,
+D,,95.0,-46.6
+E,Paraiso,-23.5747,-46.6407
+F,Atlantida,-23.5480,-46.6600
+G,Liberdade,123.0,0.0
+"""
+
+
+@pytest.fixture
+def orders_csv(tmp_path):
+    path = tmp_path / "pedidos.csv"
+    path.write_text(CSV)
+    return str(path)
+
+
+@pytest.mark.parametrize("chunksize", [1, 3, 100])
+def test_drop_and_snap(graph, orders_csv, chunksize):
+    df = read_orders(orders_csv, graph, chunksize=chunksize)
+    assert df["order_id"].tolist() == ["A", "B", "E", "F", "G"]
+    assert df["node"].astype(str).tolist() == ["Centro", "Paraiso", "Paraiso", "Higienopolis", "Liberdade"]
+    snap = dict(zip(df["order_id"], df["snap_km"]))
+    assert snap["A"] == snap["E"] == snap["G"] == 0.0
+    assert 0 < snap["B"] < 1 and 0 < snap["F"] < 1
+    # só com o nome do bairro (ou coordenada inválida): coordenadas do nó
+    g_idx = graph.index["Liberdade"]
+    assert df.loc[df["order_id"] == "G", "lat"].item() == pytest.approx(graph.lat[g_idx], abs=1e-4)
+
+    stats = df.attrs["validacao"]
+    assert stats["lidos"] == 7
+    assert stats["no_desconhecido"] == 2
+    assert stats["coord_invalida"] == 2
+    assert stats["ajustados"] == 2
+    assert stats["descartados"] == 2
+    assert stats["amostra_descartados"] == ["C", "D"]
+    assert stats["pedidos"] == 5
+
+
+def test_auto_ids_across_chunks(graph, tmp_path):
+    path = tmp_path / "sem_id.csv"
+    path.write_text("node\nCentro\nParaiso\nAtlantida\nCambuci\n")
+    df = read_orders(str(path), graph, chunksize=2)
+    assert df["order_id"].tolist() == ["P001", "P002", "P004"]
+    assert df.attrs["validacao"]["amostra_descartados"] == ["P003"]
+
+
+def test_missing_columns(graph, tmp_path):
+    path = tmp_path / "ruim.csv"
+    path.write_text("order_id,lat\nA,-23.55\n")
+    with pytest.raises(ValueError):
+        read_orders(str(path), graph)
+
+
+def test_validate_orders_matches_read_orders(graph, orders_csv):
+    frame = validate_orders(pd.read_csv(orders_csv, dtype={"order_id": str}), graph)
+    pd.testing.assert_frame_equal(frame, read_orders(orders_csv, graph, chunksize=2))
+
+
+class _NoSnap:
+    """Índice que não acha nó para pontos ao sul de -23.56 (como um raio máximo)."""
+
+    def snap(self, lat, lon, return_distance=False):
+        nodes = np.where(np.asarray(lat) < -23.56, -1, 0)
+        return nodes, np.where(nodes < 0, np.nan, 0.5)
+
+
+def test_failed_snap_is_dropped_without_distance(graph, orders_csv):
+    df = read_orders(orders_csv, graph, index=_NoSnap())
+    assert "B" not in df["order_id"].tolist()
+    assert not df["snap_km"].isna().any()
+    assert df.attrs["validacao"]["ajustados"] == 1
@@ -0,0 +1,46 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+from conftest import random_graph
+from metrics import path_cost
+from pareto import pareto_paths, weighted_sum_path
+
+CRITERIA = ("time_min", "dist_km")
+
+
+def brute_front(g, a, b):
+    """Custos não-dominados entre todos os caminhos simples (arredondados para comparar)."""
+    costs = {tuple(round(path_cost(g, p, c), 6) for c in CRITERIA)
+             for p in nx.all_simple_paths(g.to_networkx(), a, b)}
+    return {c for c in costs if not any(o != c and o[0] <= c[0] and o[1] <= c[1] for o in costs)}
+
+
+@pytest.fixture(params=range(4))
+def small(request):
+    return random_graph(request.param, n=9, extra=7)
+
+
+def test_pareto_matches_brute_force(small):
+    g = small
+    for a in g.names[:4]:
+        for b in g.names:
+            if a == b:
+                continue
+            front, _ = pareto_paths(g, a, b)
+            expected = brute_front(g, a, b)
+            got = {tuple(round(c, 6) for c in costs) for _, costs in front}
+            assert got == expected
+            for path, costs in front:
+                assert (path[0], path[-1]) == (a, b)
+                assert [path_cost(g, path, c) for c in CRITERIA] == pytest.approx(list(costs))
+
+
+@pytest.mark.parametrize("alpha", [0.0, 0.3, 1.0])
+def test_weighted_sum_is_not_dominated(small, alpha):
+    g = small
+    for b in g.names[1:-1]:
+        path, _, costs = weighted_sum_path(g, g.names[0], b, alpha)
+        front = np.array(sorted(brute_front(g, g.names[0], b)))
+        c = np.round(costs, 6)
+        assert not ((front <= c).all(axis=1) & (front < c).any(axis=1)).any()
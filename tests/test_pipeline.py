@@ -0,0 +1,138 @@
+import threading
+import time
+
+import pytest
+
+import pipeline
+from instrumentation import RunMetrics
+from pipeline import Cancelled, Pipeline
+
+
+@pytest.fixture
+def cpus(monkeypatch):
+    # o pool é limitado ao número de CPUs; nos testes o paralelismo não pode depender da máquina
+    monkeypatch.setattr(pipeline.os, "cpu_count", lambda: 4)
+
+
+class Log:
+    def __init__(self):
+        self.events = []
+        self.lock = threading.Lock()
+
+    def stage(self, name, value=None, delay=0.0):
+        def fn(**deps):
+            with self.lock:
+                self.events.append(("inicio", name))
+            time.sleep(delay)
+            with self.lock:
+                self.events.append(("fim", name))
+            return value if value is not None else (name, sorted(deps))
+        return fn
+
+    def index(self, kind, name):
+        return self.events.index((kind, name))
+
+
+def diamond(log, p):
+    p.add("a", log.stage("a", 1))
+    p.add("b", lambda a: a + 1, deps=("a",))
+    p.add("c", log.stage("c", delay=0.02), deps=("a",))
+    p.add("d", lambda b, c: (b, c), deps=("b", "c"))
+    return p
+
+
+def test_dependency_order(cpus):
+    log = Log()
+    p = diamond(log, Pipeline(workers=4))
+    p.add("pulada", log.stage("pulada"), deps=("a",), when=lambda r: r["a"] > 1)
+    p.add("depois", lambda pulada: pulada, deps=("pulada",))
+    res = p.run()
+    assert res["d"] == (2, ("c", ["a"]))
+    assert log.index("fim", "a") < log.index("inicio", "c")
+    assert res["pulada"] is None and res["depois"] is None
+    assert ("inicio", "pulada") not in log.events
+    assert set(p.timings) == {"a", "b", "c", "d", "depois"}
+    ms, chain = p.critical_path()
+    assert chain == ["a", "c", "d"] and ms >= p.timings["c"]
+
+
+def test_inputs_and_invalid_graphs():
+    p = Pipeline(workers=1)
+    p.add("dobro", lambda x: 2 * x, deps=("x",))
+    assert p.run(x=4)["dobro"] == 8
+    with pytest.raises(ValueError, match="repetida"):
+        p.add("dobro", lambda x: x, deps=("x",))
+    with pytest.raises(ValueError, match="desconhecidas"):
+        p.run()
+    loop = Pipeline(workers=1)
+    loop.add("a", lambda b: b, deps=("b",))
+    loop.add("b", lambda a: a, deps=("a",))
+    with pytest.raises(ValueError, match="circular"):
+        loop.run()
+
+
+def test_independent_stages_run_in_parallel(cpus):
+    # as duas só passam da barreira se estiverem rodando ao mesmo tempo
+    barrier = threading.Barrier(2, timeout=5)
+    p = Pipeline(workers=2)
+    p.add("x", barrier.wait)
+    p.add("y", barrier.wait)
+    res = p.run()
+    assert sorted([res["x"], res["y"]]) == [0, 1]
+
+
+def test_error_stops_dependents_and_waits_running(cpus):
+    log = Log()
+    metrics = RunMetrics()
+    p = Pipeline(metrics, workers=2)
+
+    def boom():
+        time.sleep(0.01)
+        raise KeyError("faltou")
+
+    p.add("falha", boom)
+    p.add("lenta", log.stage("lenta", delay=0.1))
+    p.add("depende", log.stage("depende"), deps=("falha",))
+    with pytest.raises(KeyError, match="faltou"):
+        p.run()
+    # a etapa que já rodava termina; a dependente nem começa
+    assert ("fim", "lenta") in log.events
+    assert ("inicio", "depende") not in log.events
+    rec = next(r for r in metrics.records if r.get("stage") == "falha")
+    assert rec["erro"].startswith("KeyError")
+    assert metrics.records[-1]["stage"] == "pipeline"
+
+
+def test_cancel_stops_new_stages():
+    log = Log()
+    cancel = threading.Event()
+    p = Pipeline(workers=1, cancel=cancel)
+    p.add("a", lambda: cancel.set())
+    p.add("b", log.stage("b"), deps=("a",))
+    with pytest.raises(Cancelled):
+        p.run()
+    assert log.events == []
+
+    cancel.clear()
+    assert p.run(a=None)["b"] == ("b", ["a"])
+
+
+def test_inline_executor_under_profile(cpus):
+    metrics = RunMetrics(profile=True)
+    try:
+        p = Pipeline(metrics, workers=4)
+        assert p.inline and p.workers == 1
+        p.add("x", threading.get_ident)
+        p.add("y", threading.get_ident)
+        p.add("z", lambda x, y: threading.get_ident(), deps=("x", "y"))
+        res = p.run()
+        # todas na thread de run(), a única que o cProfile enxerga
+        assert res["x"] == res["y"] == res["z"] == threading.get_ident()
+
+        p.add("falha", lambda z: 1 / 0, deps=("z",))
+        p.add("depois", lambda falha: falha, deps=("falha",))
+        with pytest.raises(ZeroDivisionError):
+            p.run()
+        assert "depois" not in p.timings
+    finally:
+        metrics.close()
@@ -0,0 +1,122 @@
+import os
+import pickle
+
+import pytest
+
+from conftest import DATA
+from graph import load_compact_graph, load_graph
+from pipeline import route_pipeline
+from route_cache import ROUTE_CACHE, RouteCache, graph_key
+from routing import bidirectional_astar_path, dijkstra_all
+
+
+def route(cache, g, a, b, weight="time_min"):
+    return cache.search("astar_bidir", bidirectional_astar_path, g, a, b, weight=weight)
+
+
+def test_hit_returns_copy(graph):
+    cache = RouteCache()
+    first = route(cache, graph, "Centro", "Paraiso")
+    first[0].append("lixo")
+    again = route(cache, graph, "Centro", "Paraiso")
+    assert cache.hits == 1
+    assert again[0] == ["Centro", "Bela Vista", "Paraiso"]
+
+
+def test_decrease_invalidates(graph):
+    cache = RouteCache()
+    assert route(cache, graph, "Centro", "Paraiso")[2] == pytest.approx(25.0)
+    graph.update_edge_weights(["Centro", "Liberdade"], ["Liberdade", "Bela Vista"], [1.0, 1.0])
+    path, _, cost = route(cache, graph, "Centro", "Paraiso")
+    assert path == ["Centro", "Liberdade", "Bela Vista", "Paraiso"]
+    assert cost == pytest.approx(17.0)
+    assert cache.hits == 0
+
+
+def test_increase_off_path_keeps_entry(graph):
+    cache = RouteCache()
+    route(cache, graph, "Centro", "Paraiso")
+    graph.update_edge_weights(["Aclimacao"], ["Cambuci"], [99.0])
+    assert route(cache, graph, "Centro", "Paraiso")[2] == pytest.approx(25.0)
+    assert cache.hits == 1
+
+
+def test_increase_on_path_invalidates(rgraph):
+    cache = RouteCache()
+    g = rgraph
+    a, b = g.names[0], g.names[-2]
+    path = route(cache, g, a, b)[0]
+    g.update_edge_weights(path[:1], path[1:2], [1e3])
+    cost = route(cache, g, a, b)[2]
+    assert cache.hits == 0
+    assert cost == pytest.approx(dijkstra_all(g, 0)[len(g.names) - 2])
+
+
+def test_other_weight_survives_update(graph):
+    cache = RouteCache()
+    route(cache, graph, "Centro", "Paraiso", "dist_km")
+    graph.update_edge_weights(["Centro"], ["Bela Vista"], [1.0])
+    route(cache, graph, "Centro", "Paraiso", "dist_km")
+    assert cache.hits == 1
+
+
+def test_instances_from_same_csvs_do_not_share(tmp_path):
+    def load():
+        return load_graph(os.path.join(DATA, "nodes.csv"), os.path.join(DATA, "edges.csv"),
+                          cache_dir=str(tmp_path / "graph"))
+
+    cache = RouteCache()
+    a, b = load(), load()
+    assert route(cache, a, "Centro", "Bela Vista")[2] == pytest.approx(10.0)
+    assert route(cache, b, "Centro", "Bela Vista")[2] == pytest.approx(10.0)
+    assert cache.hits == 1  # mesmos CSVs, mesmos pesos: divide a entrada
+    b.update_edge_weights(["Centro"], ["Bela Vista"], [30.0])
+    assert route(cache, b, "Centro", "Bela Vista")[2] == pytest.approx(15.0)
+    assert route(cache, a, "Centro", "Bela Vista")[2] == pytest.approx(10.0)
+
+
+def test_keys_follow_weight_content(graph):
+    copy = pickle.loads(pickle.dumps(graph))
+    assert graph_key(copy) == graph_key(graph)
+    copy.update_edge_weights(["Centro"], ["Bela Vista"], [30.0])
+    assert graph_key(copy) != graph_key(graph)
+    graph.update_edge_weights(["Centro"], ["Bela Vista"], [30.0])
+    assert graph_key(copy) == graph_key(graph)
+    other = load_compact_graph(os.path.join(DATA, "nodes.csv"), os.path.join(DATA, "edges.csv"))
+    assert graph_key(other) != graph_key(load_compact_graph(os.path.join(DATA, "nodes.csv"),
+                                                            os.path.join(DATA, "edges.csv")))
+    nxg = graph.to_networkx()
+    assert graph_key(nxg) == graph_key(nxg) != graph_key(graph.to_networkx())
+
+
+def test_pipeline_runs_share_routes(tmp_path):
+    def run():
+        pipe = route_pipeline(str(tmp_path), os.path.join(DATA, "nodes.csv"), os.path.join(DATA, "edges.csv"),
+                              os.path.join(DATA, "deliveries.csv"), graph_cache=str(tmp_path / "graph"),
+                              route_only=True, workers=1, log=lambda *a: None)
+        return pipe.run(start="Centro", goal="Paraiso")
+
+    first = run()
+    before = ROUTE_CACHE.stats()
+    second = run()
+    after = ROUTE_CACHE.stats()
+    assert after["falhas"] == before["falhas"]
+    assert after["acertos"] > before["acertos"]
+    assert second["astar"]["caminho"] == first["astar"]["caminho"]
+
+
+def test_route_only_skips_missing_indexes(tmp_path):
+    def run(**kw):
+        pipe = route_pipeline(str(tmp_path), os.path.join(DATA, "nodes.csv"), os.path.join(DATA, "edges.csv"),
+                              os.path.join(DATA, "deliveries.csv"), graph_cache=str(tmp_path / "graph"),
+                              route_only=True, workers=1, log=lambda *a: None, **kw)
+        return pipe.run(start="Centro", goal="Paraiso")
+
+    res = run()
+    assert res["landmarks"] is None and res["alt"] is None
+    assert res["ch_index"] is None and res["ch"] is None
+    # pedido explícito pré-processa e salva; o run seguinte carrega o ALT salvo
+    res = run(preprocessed=("alt",))
+    assert res["alt"]["caminho"] == res["astar"]["caminho"] and res["ch"] is None
+    res = run()
+    assert res["alt"] is not None and res["ch"] is None
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from contraction import build_ch, ch_path
+from landmarks import alt_path, build_landmarks
+from metrics import path_cost
+from routing import dijkstra_all, bidirectional_astar_path, bidirectional_dijkstra_path
+
+
+def check_engine(g, route, weight="time_min"):
+    """Compara route(g, a, b) -> (caminho, expandidos, custo) com Dijkstra em todos os pares."""
+    for s in range(len(g.names)):
+        dist = dijkstra_all(g, s, weight)
+        for t in range(len(g.names)):
+            path, _, cost = route(g, g.names[s], g.names[t])
+            if np.isinf(dist[t]):
+                assert path is None and cost is None
+                continue
+            assert path[0] == g.names[s] and path[-1] == g.names[t]
+            assert cost == pytest.approx(dist[t])
+            assert path_cost(g, path, weight) == pytest.approx(dist[t])
+
+
+@pytest.mark.parametrize("weight", ["time_min", "dist_km"])
+@pytest.mark.parametrize("engine", [bidirectional_astar_path, bidirectional_dijkstra_path])
+def test_bidirectional_matches_dijkstra(rgraph, engine, weight):
+    check_engine(rgraph, lambda g, a, b: engine(g, a, b, weight), weight)
+
+
+def test_bidirectional_after_weight_update(rgraph):
+    # reduções quebram a escala antiga da heurística: precisa ser recalculada
+    g = rgraph
+    src = g.sources()
+    once = np.flatnonzero(src < g.indices)[::3]
+    g.update_edge_weights(src[once], g.indices[once], g.weights["time_min"][once] * 0.2)
+    check_engine(g, bidirectional_astar_path)
+
+
+@pytest.mark.parametrize("method", ["farthest", "planar"])
+def test_alt_matches_dijkstra(rgraph, method):
+    lm = build_landmarks(rgraph, k=4, method=method)
+    check_engine(rgraph, lambda g, a, b: alt_path(g, a, b, landmarks=lm))
+
+
+def test_alt_after_weight_decrease(rgraph):
+    # landmarks de antes da redução superestimam: alt_path deve recalcular
+    g = rgraph
+    lm = build_landmarks(g, k=4)
+    src = g.sources()
+    once = np.flatnonzero(src < g.indices)[::2]
+    g.update_edge_weights(src[once], g.indices[once], g.weights["time_min"][once] * 0.3)
+    check_engine(g, lambda g, a, b: alt_path(g, a, b, landmarks=lm))
+
+
+@pytest.mark.parametrize("weight", ["time_min", "dist_km"])
+def test_ch_matches_dijkstra(rgraph, weight):
+    ch = build_ch(rgraph, weight)
+    check_engine(rgraph, lambda g, a, b: ch_path(g, a, b, weight, ch=ch), weight)
+
+
+def test_ch_after_weight_update(rgraph):
+    g = rgraph
+    ch = build_ch(g)
+    src = g.sources()
+    once = np.flatnonzero(src < g.indices)[1::3]
+    g.update_edge_weights(src[once], g.indices[once], g.weights["time_min"][once] * 2.5)
+    check_engine(g, lambda g, a, b: ch_path(g, a, b, ch=ch))
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from benchmarks import dfs_path_recursive
+from graph import graph_from_arrays
+from search_algorithms import bfs_path, dfs_path, iddfs_path
+
+
+class RecordingGraph:
+    """Repassa neighbors() para o grafo e anota a ordem em que os nós são abertos."""
+
+    def __init__(self, g):
+        self.g = g
+        self.opened = []
+
+    def neighbors(self, u):
+        self.opened.append(u)
+        return self.g.neighbors(u)
+
+
+def test_dfs_matches_recursive(rgraph):
+    names = rgraph.names
+    for a in names:
+        for b in names:
+            ref, got = RecordingGraph(rgraph), RecordingGraph(rgraph)
+            assert dfs_path(got, a, b) == dfs_path_recursive(ref, a, b)
+            if a != b:  # com a == b a pilha já começa com o iterador da origem
+                assert got.opened == ref.opened
+
+
+def test_dfs_deep_path_without_recursion_limit():
+    # corrente com 5000 nós: a versão recursiva estouraria a pilha do Python
+    n = 5000
+    u = np.arange(n - 1)
+    g = graph_from_arrays([f"n{i}" for i in range(n)], np.zeros(n), np.zeros(n), u, u + 1,
+                          {"time_min": np.ones(n - 1)})
+    path, expanded = dfs_path(g, "n0", f"n{n - 1}")
+    assert path == g.names and expanded == n
+
+
+def test_iddfs_finds_fewest_edges(rgraph):
+    names = rgraph.names
+    for b in names:
+        ref, _ = bfs_path(rgraph, names[0], b)
+        path, _ = iddfs_path(rgraph, names[0], b)
+        if ref is None:
+            assert path is None
+            continue
+        assert path[0] == names[0] and path[-1] == b and len(path) == len(ref)
+        assert all(v in rgraph.neighbors(u) for u, v in zip(path, path[1:]))
+
+
+def test_iddfs_depth_limit(rgraph):
+    names = rgraph.names
+    hops = {b: len(p) - 1 for b in names if (p := bfs_path(rgraph, names[0], b)[0]) is not None}
+    far = max(hops, key=hops.get)
+    assert iddfs_path(rgraph, names[0], far, max_depth=hops[far] - 1)[0] is None
+    assert len(iddfs_path(rgraph, names[0], far, max_depth=hops[far])[0]) == hops[far] + 1
+    # sem caminho (nó isolado): para no limite em vez de aprofundar para sempre
+    path, expanded = iddfs_path(rgraph, names[0], names[-1], max_depth=3)
+    assert path is None and expanded > 0
+
+
+@pytest.mark.parametrize("search", [dfs_path, iddfs_path])
+def test_start_is_goal(graph, search):
+    assert search(graph, "Centro", "Centro") == (["Centro"], 1)
@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+import service
+from service import DispatchService, InProcessClient
+
+
+def call(graph, method, *args, **kwargs):
+    """Abre o serviço (workers=1, sem processos) e faz uma requisição."""
+    async def run():
+        async with DispatchService(graph, workers=1) as svc:
+            return await getattr(InProcessClient(svc), method)(*args, **kwargs)
+    return asyncio.run(run())
+
+
+def test_route(graph):
+    status, body = call(graph, "post", "/route", {"start": "Centro", "goal": "Paraiso"})
+    assert status == 200
+    assert body["caminho"] == ["Centro", "Bela Vista", "Paraiso"]
+    assert body["custo"] == pytest.approx(25.0)
+
+
+def test_route_unknown_node(graph):
+    status, body = call(graph, "post", "/route", {"start": "Centro", "goal": "Atlantida"})
+    assert status == 400
+    assert "Atlantida" in body["erro"]
+
+
+def test_unknown_path(graph):
+    status, _ = call(graph, "post", "/rotas", {})
+    assert status == 404
+
+
+@pytest.mark.parametrize("data", [b"{nao e json", b"[1, 2]"])
+def test_malformed_body(graph, data):
+    status, body = call(graph, "send", "POST", "/route", data)
+    assert status == 400
+    assert body["erro"]
+
+
+@pytest.mark.parametrize("length", ["abc", "-5"])
+def test_bad_content_length(graph, length):
+    status, _ = call(graph, "send", "POST", "/route", b"{}", content_length=length)
+    assert status == 400
+
+
+def test_body_too_large(graph):
+    status, _ = call(graph, "send", "POST", "/route", b"", content_length=service.MAX_BODY_BYTES + 1)
+    assert status == 413
+
+
+def test_internal_error_is_500(graph, monkeypatch):
+    def boom(payload, g=None):
+        raise RuntimeError("falha")
+    monkeypatch.setattr(service, "run_isochrones", boom)
+    status, body = call(graph, "post", "/isochrones", {"origin": "Centro"})
+    assert status == 500
+    assert "falha" not in body["erro"]
+
+
+def test_plan_snaps_coordinates(graph):
+    orders = [{"node": "Paraiso"}, {"lat": -23.54, "lon": -46.65}]
+    status, body = call(graph, "post", "/plan", {"orders": orders})
+    assert status == 200
+    (tour,) = body["entregadores"]
+    assert set(tour["nos"]) == {"Centro", "Paraiso", "Santa Cecilia"}
+
+
+def test_plan_rejects_unusable_order(graph):
+    status, body = call(graph, "post", "/plan", {"orders": [{"node": "Paraiso"}, {"order_id": "X9", "lat": 99}]})
+    assert status == 400
+    assert "X9" in body["erro"]
+
+
+def test_plan_matrix_is_serial_and_index_reused(graph, monkeypatch):
+    import matrix
+    import spatial
+
+    def no_pool():
+        raise AssertionError("distance_matrix sem workers=1 dentro do worker")
+    monkeypatch.setattr(matrix, "default_workers", no_pool)
+    built = []
+    monkeypatch.setattr(spatial, "SpatialIndex", lambda g, cls=spatial.SpatialIndex: built.append(1) or cls(g))
+    orders = [{"node": "Paraiso"}, {"node": "Liberdade"}, {"lat": -23.54, "lon": -46.65}]
+    for _ in range(2):
+        status, body = call(graph, "post", "/plan", {"orders": orders, "k": 2})
+        assert status == 200 and len(body["entregadores"]) == 2
+    assert len(built) == 1
@@ -0,0 +1,82 @@
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+import spatial
+from conftest import DATA, random_graph
+from graph import graph_from_arrays, load_graph
+from routing import haversine_km
+from spatial import SpatialIndex, get_spatial_index, snap_orders
+
+
+def brute_force(g, lat, lon):
+    """Nó mais próximo de cada ponto pela haversine contra todos os nós com coordenadas."""
+    ok = np.flatnonzero(~(np.isnan(g.lat) | np.isnan(g.lon)))
+    d = haversine_km(lat[:, None], lon[:, None], np.asarray(g.lat)[ok][None, :], np.asarray(g.lon)[ok][None, :])
+    return ok[np.argmin(d, axis=1)], d
+
+
+def random_points(n, seed, spread=0.08):
+    rng = np.random.default_rng(seed)
+    return -23.55 + rng.uniform(-spread, spread, n), -46.63 + rng.uniform(-spread, spread, n)
+
+
+@pytest.mark.parametrize("g", [random_graph(1), random_graph(2, n=2000, extra=0)], ids=["24", "2000"])
+def test_snap_matches_brute_force_haversine(g):
+    lat, lon = random_points(500, 7)
+    nodes, dist = SpatialIndex(g).snap(lat, lon, return_distance=True)
+    ref, d = brute_force(g, lat, lon)
+    best = d.min(axis=1)
+    chosen = haversine_km(lat, lon, np.asarray(g.lat)[nodes], np.asarray(g.lon)[nodes])
+    # projeção local: só empates (diferença < 0,1%) podem trocar de nó
+    np.testing.assert_allclose(chosen, best, rtol=1e-3, atol=1e-6)
+    second = np.partition(d, 1, axis=1)[:, 1] if d.shape[1] > 1 else np.full(len(lat), np.inf)
+    clear = second > best * 1.001
+    assert (nodes[clear] == ref[clear]).all()
+    np.testing.assert_allclose(dist, chosen, rtol=1e-3)
+
+
+def test_snap_skips_nodes_without_coordinates():
+    lat = np.array([-23.55, np.nan, -23.56, -23.60])
+    lon = np.array([-46.63, np.nan, -46.64, -46.70])
+    g = graph_from_arrays(["a", "sem", "b", "c"], lat, lon, [0, 1], [1, 2], {"time_min": np.ones(2)})
+    qlat, qlon = random_points(200, 3, spread=0.1)
+    qlat[:5] = np.nan
+    nodes = SpatialIndex(g).snap(qlat, qlon)
+    assert (nodes[:5] == -1).all()
+    assert (nodes[5:] == brute_force(g, qlat[5:], qlon[5:])[0]).all()
+    assert 1 not in nodes
+
+
+def test_snap_orders_fills_nearest(graph):
+    import pandas as pd
+
+    lat, lon = random_points(30, 5, spread=0.03)
+    df = pd.DataFrame({"order_id": range(30), "lat": lat, "lon": lon})
+    df.loc[0, "node"] = "Paraiso"
+    out = snap_orders(df, graph)
+    ref, d = brute_force(graph, lat[1:], lon[1:])
+    assert out.loc[0, "node"] == "Paraiso" and out.loc[0, "snap_km"] == 0.0
+    assert out["node"].iloc[1:].tolist() == [graph.names[i] for i in ref]
+    np.testing.assert_allclose(out["snap_km"].iloc[1:], d.min(axis=1), rtol=1e-3)
+
+
+def test_index_saved_with_snapshot_and_cached(tmp_path, monkeypatch):
+    cache = str(tmp_path / "graph")
+    g = load_graph(os.path.join(DATA, "nodes.csv"), os.path.join(DATA, "edges.csv"), cache_dir=cache)
+    monkeypatch.setattr(spatial, "_BY_SOURCE", {})
+    idx = get_spatial_index(g)
+    assert os.path.exists(os.path.join(cache, "spatial.pkl"))
+    assert get_spatial_index(g) is idx
+    # outro processo (cache vazio) lê o arquivo; arquivo de outros CSVs é refeito
+    monkeypatch.setattr(spatial, "_BY_SOURCE", {})
+    again = get_spatial_index(g)
+    assert again is not idx and again.source_hash == g.source_hash
+    stale = SpatialIndex(g)
+    stale.source_hash = "outro"
+    with open(os.path.join(cache, "spatial.pkl"), "wb") as f:
+        pickle.dump(stale, f)
+    monkeypatch.setattr(spatial, "_BY_SOURCE", {})
+    assert get_spatial_index(g).source_hash == g.source_hash
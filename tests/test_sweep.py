@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+import sweep as sweep_mod
+from conftest import random_graph
+from graph import graph_from_arrays
+from sweep import SWEEP_ALGORITHMS, sweep, sweep_pairs, sweep_report
+
+
+def single_node_graph():
+    return graph_from_arrays(["a"], [-23.55], [-46.63], [], [], {"time_min": np.zeros(0), "dist_km": np.zeros(0)})
+
+
+def test_all_pairs(rgraph):
+    n = len(rgraph.names)
+    s, t = sweep_pairs(rgraph)
+    assert len(s) == n * (n - 1)
+    assert len(set(zip(s.tolist(), t.tolist()))) == len(s) and not (s == t).any()
+    assert (np.diff(s) >= 0).all()
+
+
+def test_sampled_pairs(rgraph):
+    n = len(rgraph.names)
+    s, t = sweep_pairs(rgraph, sample=50, seed=3)
+    assert len(s) == 50 and not (s == t).any()
+    assert s.min() >= 0 and max(s.max(), t.max()) < n and (np.diff(s) >= 0).all()
+    again = sweep_pairs(rgraph, sample=50, seed=3)
+    assert np.array_equal(s, again[0]) and np.array_equal(t, again[1])
+    with pytest.raises(ValueError):
+        sweep_pairs(rgraph, sample=-1)
+
+
+@pytest.mark.parametrize("sample", [None, 1, 5])
+def test_single_node(tmp_path, sample):
+    g = single_node_graph()
+    s, t = sweep_pairs(g, sample=sample)
+    assert len(s) == len(t) == 0
+    out = str(tmp_path / "sweep.npz")
+    res = sweep(g, sample=sample, workers=1, out_path=out)
+    assert res["meta"]["pares"] == 0
+    assert all(r["pares"] == 0 for r in res["resumo"])
+    assert sweep_report(res)
+    with np.load(out) as f:
+        assert len(f["origem"]) == 0 and f["nomes"].tolist() == ["a"]
+
+
+def test_npz_round_trip(rgraph, tmp_path):
+    out = str(tmp_path / "sweep.npz")
+    res = sweep(rgraph, sample=40, seed=1, workers=1, out_path=out)
+    cols = res["colunas"]
+    with np.load(out) as f:
+        assert f["nomes"].tolist() == rgraph.names
+        assert tuple(f["algoritmos"].tolist()) == SWEEP_ALGORITHMS
+        for k, v in cols.items():
+            np.testing.assert_array_equal(f[k], v)
+    # A* bidirecional é exato; BFS/DFS nunca ficam abaixo do ótimo
+    algo = list(SWEEP_ALGORITHMS)
+    exact = cols["algoritmo"] == algo.index("astar_bidir")
+    assert np.allclose(cols["gap"][exact], 0.0, atol=1e-5)
+    assert (cols["gap"][~np.isnan(cols["gap"])] >= -1e-5).all()
+    assert res["meta"]["pares"] - res["meta"]["sem_caminho"] == exact.sum()
+
+
+def test_parallel_matches_serial(monkeypatch):
+    g = random_graph(0)
+    serial = sweep(g, sample=60, workers=1)
+    monkeypatch.setattr(sweep_mod, "PARALLEL_MIN_QUERIES", 1)
+    par = sweep(g, sample=60, workers=2)
+    assert par["meta"]["workers"] == 2
+    for k in ("algoritmo", "origem", "destino", "otimo_min", "custo_min", "expandidos"):
+        np.testing.assert_array_equal(par["colunas"][k], serial["colunas"][k])
@@ -0,0 +1,103 @@
+import heapq
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from route_cache import RouteCache
+from routing import bidirectional_astar_path, dijkstra_all
+from time_profiles import apply_slot, parse_time_of_day, profiles_from_frame, td_astar, td_astar_path, td_heuristic
+
+
+def random_profiles(g, seed):
+    """Perfis FIFO: pontos a cada 2 h somando até 30 min ao tempo base (queda máx. 0,25 min/min)."""
+    rng = np.random.default_rng(seed)
+    src = g.sources()
+    once = np.flatnonzero(src < g.indices)
+    rows = []
+    for p in once.tolist():
+        for t in range(0, 1440, 120):
+            rows.append((g.names[src[p]], g.names[g.indices[p]], t, g.weights["time_min"][p] + rng.uniform(0, 30)))
+    return profiles_from_frame(g, pd.DataFrame(rows, columns=["u", "v", "time_of_day", "time_min"]))
+
+
+def td_dijkstra(g, s, t0, profiles):
+    """Chegada mais cedo em cada nó saindo de s no minuto t0 (referência sem heurística)."""
+    arrival = np.full(len(g.names), np.inf)
+    heap = [(t0, s)]
+    while heap:
+        au, u = heapq.heappop(heap)
+        if au >= arrival[u]:
+            continue
+        arrival[u] = au
+        for pos in range(g.indptr[u], g.indptr[u + 1]):
+            v = int(g.indices[pos])
+            av = au + profiles.travel_time(int(g.edge_ids[pos]), au)
+            if av < arrival[v]:
+                heapq.heappush(heap, (av, v))
+    return arrival - t0
+
+
+@pytest.mark.parametrize("depart", [0.0, 450.0, 1110.0, 1430.0])
+def test_td_astar_matches_td_dijkstra(rgraph, depart):
+    profiles = random_profiles(rgraph, 7)
+    for s in range(0, len(rgraph.names), 5):
+        ref = td_dijkstra(rgraph, s, depart, profiles)
+        for t in range(len(rgraph.names)):
+            path, _, minutes = td_astar(rgraph, s, t, depart, profiles)
+            if np.isinf(ref[t]):
+                assert path is None
+                continue
+            assert (path[0], path[-1]) == (s, t)
+            assert minutes == pytest.approx(ref[t])
+
+
+def test_constant_profiles_match_static(rgraph):
+    profiles = profiles_from_frame(rgraph, pd.DataFrame(columns=["u", "v", "time_of_day", "time_min"]))
+    dist = dijkstra_all(rgraph, 0)
+    for t in range(len(rgraph.names) - 1):
+        assert td_astar(rgraph, 0, t, "08:00", profiles)[2] == pytest.approx(dist[t])
+
+
+def test_td_heuristic_cached_per_profiles(rgraph):
+    a, b = random_profiles(rgraph, 1), random_profiles(rgraph, 2)
+    assert td_heuristic(rgraph, a) is td_heuristic(rgraph, a)
+    assert td_heuristic(rgraph, a) is not td_heuristic(rgraph, b)
+
+
+def test_apply_slot_invalidates_route_cache(rgraph):
+    g = rgraph
+    profiles = random_profiles(g, 3)
+    cache = RouteCache()
+    a, b = g.names[0], g.names[-2]
+    for slot in ("03:00", "18:30", "03:00"):
+        version = g.version
+        apply_slot(g, profiles, slot)
+        assert g.version == version + 1
+        cost = cache.search("astar_bidir", bidirectional_astar_path, g, a, b, weight="time_slot")[2]
+        assert cost == pytest.approx(dijkstra_all(g, 0, "time_slot")[len(g.names) - 2])
+
+
+def test_td_cache_key_follows_profiles_and_departure(rgraph):
+    g = rgraph
+    cache = RouteCache()
+    a, b = g.names[0], g.names[-2]
+
+    def td(profiles, depart):
+        return cache.search("td_astar", td_astar_path, g, a, b, key=(profiles.cache_token, parse_time_of_day(depart)),
+                            depart=depart, profiles=profiles)
+
+    p1 = random_profiles(g, 1)
+    assert random_profiles(g, 1).cache_token == p1.cache_token
+    assert random_profiles(g, 2).cache_token != p1.cache_token
+    td(p1, "08:00")
+    td(random_profiles(g, 1), "08:00")
+    assert (cache.hits, cache.misses) == (1, 1)
+    # outro minuto de saída ou outros perfis: outra entrada
+    assert td(p1, "08:01")[2] == pytest.approx(td_astar_path(g, a, b, "08:01", p1)[2])
+    assert td(random_profiles(g, 2), "08:00")[2] == pytest.approx(td_astar_path(g, a, b, "08:00", random_profiles(g, 2))[2])
+    assert (cache.hits, cache.misses) == (1, 3)
+    # atualização de pesos não leva a entrada para a versão nova
+    g.update_edge_weights([g.names[0]], [g.names[int(g.indices[g.indptr[0]])]], [1.0])
+    td(p1, "08:00")
+    assert (cache.hits, cache.misses) == (1, 4)
@@ -0,0 +1,47 @@
+from itertools import permutations
+
+import numpy as np
+import pytest
+
+from conftest import random_graph
+from matrix import distance_matrix
+from tours import nearest_neighbor, optimize_tour, route_cost
+
+
+def tour_matrix(seed, n):
+    g = random_graph(seed, n=n + 1, extra=n)
+    names = g.names[:-1]  # sem o nó isolado
+    return np.array(distance_matrix(g, names, names, workers=1, use_cache=False))
+
+
+@pytest.mark.parametrize("seed", range(6))
+@pytest.mark.parametrize("closed", [True, False])
+def test_tour_is_valid_and_not_worse_than_greedy(seed, closed):
+    D = tour_matrix(seed, 8)
+    order, cost = optimize_tour(D, depot=0, return_to_depot=closed, time_budget_s=5)
+    assert sorted(order) == list(range(1, len(D)))
+    route = [0] + order + ([0] if closed else [])
+    assert cost == pytest.approx(route_cost(D, route))
+
+    greedy = nearest_neighbor(D, 0, range(1, len(D))) + ([0] if closed else [])
+    assert cost <= route_cost(D, greedy) + 1e-9
+    best = min(route_cost(D, [0, *p] + ([0] if closed else [])) for p in permutations(range(1, len(D))))
+    assert cost >= best - 1e-9
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_tour_is_two_opt_local_optimum(seed):
+    # uma passada de two_opt não volta aos i anteriores; optimize_tour repete até parar de melhorar
+    D = tour_matrix(seed, 10)
+    order, _ = optimize_tour(D, time_budget_s=5)
+    r = np.asarray([0] + order + [0])
+    i, j = np.triu_indices(len(r) - 1, k=2)
+    delta = D[r[i], r[j]] + D[r[i + 1], r[j + 1]] - D[r[i], r[i + 1]] - D[r[j], r[j + 1]]
+    assert delta.min() >= -1e-9
+
+
+def test_single_stop_and_empty():
+    D = tour_matrix(0, 3)
+    assert optimize_tour(D, stops=[]) == ([], 0.0)
+    order, cost = optimize_tour(D, stops=[2])
+    assert order == [2] and cost == pytest.approx(D[0, 2] + D[2, 0])